@@ -0,0 +1,279 @@
+"""Durable storage for the in-memory repositories.
+
+Every mutation of a registered repository is appended to a journal as a
+length-prefixed, checksummed pickle record. Periodically the whole state is
+compacted into a single binary snapshot, and the journal is restarted. At
+startup the latest snapshot is memory-mapped and unpickled in one pass, then
+the journal tail written after it is replayed.
+
+Entities are stored as their plain attributes plus their references to other
+entities (a place's owner, a review's place, ...) as ``(kind, id)`` pairs,
+which are linked back to live objects on restore, so each entity is written
+once however many others point at it. Lists that only mirror such a
+reference, like a place's reviews, are not journaled when they change:
+replaying the referencing entity adds it to or removes it from the list.
+"""
+import gc
+import mmap
+import os
+import pickle
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from app.models.base_model import BaseModel
+
+SNAPSHOT_MAGIC = b'HBNBSNP1'
+# Each journal record is framed as <payload length><crc32 of payload>
+RECORD_HEADER = struct.Struct('<II')
+
+
+@contextmanager
+def _gc_paused():
+    """Pause the cyclic garbage collector while restoring.
+
+    Every object allocated while restoring stays alive, so the collector
+    would only rescan them over and over. The switch is process-wide, so
+    this is only used by ``open()``, before other threads use the store.
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
+class DurableStore:
+    """Append-only journal plus compacted snapshots for InMemoryRepository.
+
+    Repositories are registered with the model class they hold, then
+    ``open()`` restores their content and starts journaling. A snapshot is
+    taken in the background every ``snapshot_every`` journal records. With
+    ``fsync=True`` each record is forced to disk before the write returns;
+    otherwise records are flushed to the OS and survive a process crash but
+    not a power loss.
+    """
+
+    def __init__(self, directory, snapshot_every=100000, fsync=False):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, 'snapshot.bin')
+        self.journal_path = os.path.join(directory, 'journal.log')
+        # Journal being compacted into a snapshot that is not yet on disk
+        self.rotated_path = self.journal_path + '.old'
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._repositories = {}
+        self._models = {}
+        self._backrefs = {}
+        self._journal = None
+        self._records = 0
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+
+    def register(self, model, repository, backref=None):
+        """Persist ``repository``, which holds instances of ``model``
+
+        ``backref`` is a ``(link, name)`` pair for entities listed in the
+        ``name`` list of the entity their ``link`` points at, e.g.
+        ``('place', 'reviews')`` for reviews. Replaying an entity lists it
+        there again, and replaying its delete unlists it.
+        """
+        self._models[model.__name__] = model
+        self._repositories[model.__name__] = repository
+        if backref:
+            self._backrefs[model.__name__] = backref
+
+    def open(self):
+        """Restore the registered repositories and start journaling"""
+        self._load_snapshot()
+        self._replay(self.rotated_path)
+        self._replay(self.journal_path)
+        self._journal = open(self.journal_path, 'ab')
+        for kind, repository in self._repositories.items():
+            repository.journal = lambda op, value, kind=kind: self.append(op, kind, value)
+        if os.path.exists(self.rotated_path):
+            # A previous compaction did not finish, redo it before rotating again
+            self.snapshot()
+
+    def close(self):
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+        for repository in self._repositories.values():
+            repository.journal = None
+
+    def append(self, op, kind, value):
+        """Journal a ``put`` of an entity or a ``delete`` of an entity id"""
+        if op == 'put':
+            value = self._encode_entity(value)
+        payload = pickle.dumps((op, kind, value), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._journal is None:
+                return
+            self._journal.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._records += 1
+            due = self.snapshot_every and self._records >= self.snapshot_every
+            if due:
+                self._records = 0
+        if due:
+            threading.Thread(target=self.snapshot, daemon=True).start()
+
+    def snapshot(self):
+        """Write every registered entity to a new snapshot and drop the journal.
+
+        The entities are listed and the journal rotated under the journal
+        lock, so every later mutation goes to the fresh journal. Entities are
+        encoded after releasing it and may already include some of those
+        mutations, which is harmless since replaying a record rewrites the
+        whole entity. The rotated journal is only removed once the snapshot
+        is safely renamed into place.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                entities = {kind: repository.get_all()
+                            for kind, repository in self._repositories.items()}
+                if self._journal is not None:
+                    self._journal.close()
+                    os.replace(self.journal_path, self.rotated_path)
+                    self._journal = open(self.journal_path, 'ab')
+                self._records = 0
+
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'wb') as snapshot:
+                state = {kind: [self._encode_entity(entity) for entity in listed]
+                         for kind, listed in entities.items()}
+                snapshot.write(SNAPSHOT_MAGIC)
+                pickle.dump(state, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            self._fsync_directory()
+            if os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path) or not os.path.getsize(self.snapshot_path):
+            return
+        with _gc_paused():
+            with open(self.snapshot_path, 'rb') as snapshot:
+                with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                        raise ValueError(f"{self.snapshot_path} is not a snapshot")
+                    with memoryview(data) as view, view[len(SNAPSHOT_MAGIC):] as payload:
+                        state = pickle.loads(payload)
+
+            # Create every object first, so references can point in any direction
+            objects = {}
+            entities = {}
+            linked = []
+            for kind, records in state.items():
+                model = self._models[kind]
+                new = model.__new__
+                entities[kind] = created = []
+                for attributes, links in records:
+                    entity = new(model)
+                    entity.__dict__ = attributes
+                    objects[(kind, attributes['id'])] = entity
+                    created.append(entity)
+                    if links:
+                        linked.append((entity, links))
+            for entity, links in linked:
+                entity.__dict__.update(self._decode_links(links, objects.get))
+            for kind, created in entities.items():
+                self._repositories[kind].load(created)
+
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as journal:
+            data = journal.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) != length or zlib.crc32(payload) != checksum:
+                break
+            self._apply(*pickle.loads(payload))
+            offset += RECORD_HEADER.size + length
+        if offset != len(data):
+            # Torn write from a crash: drop the partial record
+            with open(path, 'r+b') as journal:
+                journal.truncate(offset)
+
+    def _apply(self, op, kind, value):
+        repository = self._repositories[kind]
+        if op == 'delete':
+            entity = repository.get(value)
+            listed = self._backref_list(kind, entity)
+            if listed and entity in listed:
+                listed.remove(entity)
+            repository.delete(value)
+            return
+
+        def lookup(key):
+            target = self._repositories.get(key[0])
+            return target.get(key[1]) if target else None
+
+        attributes, links = value
+        entity = repository.get(attributes['id'])
+        if entity is None:
+            model = self._models[kind]
+            entity = model.__new__(model)
+        else:
+            # Keep the same object so the entities pointing at it stay linked
+            repository.delete(entity.id)
+        entity.__dict__.update(attributes)
+        entity.__dict__.update(self._decode_links(links, lookup))
+        repository.load([entity])
+        listed = self._backref_list(kind, entity)
+        if listed is not None and entity not in listed:
+            listed.append(entity)
+
+    def _backref_list(self, kind, entity):
+        """The list ``entity`` belongs to through its backref, if any"""
+        if entity is None or kind not in self._backrefs:
+            return None
+        link, name = self._backrefs[kind]
+        return getattr(getattr(entity, link, None), name, None)
+
+    @staticmethod
+    def _encode_entity(entity):
+        """Split an entity into plain attributes and ``(kind, id)`` references"""
+        attributes = {}
+        links = {}
+        for name, value in vars(entity).copy().items():
+            if isinstance(value, BaseModel):
+                links[name] = (type(value).__name__, value.id)
+            elif (isinstance(value, list) and value
+                  and all(isinstance(item, BaseModel) for item in value)):
+                links[name] = [(type(item).__name__, item.id) for item in value]
+            else:
+                attributes[name] = value
+        return attributes, links
+
+    @staticmethod
+    def _decode_links(links, lookup):
+        decoded = {}
+        for name, value in links.items():
+            if isinstance(value, tuple):
+                decoded[name] = lookup(value)
+            else:
+                # References to entities deleted since are dropped from lists
+                items = [lookup(key) for key in value]
+                decoded[name] = [item for item in items if item is not None]
+        return decoded
+
+    def _fsync_directory(self):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        descriptor = os.open(os.path.dirname(self.snapshot_path), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
@@ -1,4 +1,7 @@
+import threading
+from types import MappingProxyType
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 
 class Repository(ABC):
     @abstractmethod
@@ -27,45 +30,277 @@ class Repository(ABC):
 
 
 class InMemoryRepository:
-    def __init__(self):
+    """Dict-backed repository with optional hash indexes on entity attributes.
+
+    ``unique_indexes`` are attribute names whose values identify at most one
+    entity (e.g. ``email``). ``indexes`` are non-unique and are given either as
+    attribute names or as a mapping of index name to a function computing the
+    key from an entity (e.g. ``{'owner_id': lambda place: place.owner.id}``).
+    Indexes are maintained on add/update/delete, so equality lookups on an
+    indexed attribute no longer scan the whole storage.
+
+    When ``journal`` is set (see ``app.persistence.durable``) it is called as
+    ``journal('put', entity)`` or ``journal('delete', entity_id)`` after each
+    mutation.
+    """
+
+    def __init__(self, indexes=(), unique_indexes=()):
         self._storage = {}
-    
+        if not isinstance(indexes, dict):
+            indexes = {name: None for name in indexes}
+        self._key_functions = {
+            name: key or (lambda entity, name=name: getattr(entity, name, None))
+            for name, key in indexes.items()
+        }
+        for name in unique_indexes:
+            self._key_functions[name] = lambda entity, name=name: getattr(entity, name, None)
+        self._unique = {name: {} for name in unique_indexes}
+        # Non-unique indexes map a key to an insertion-ordered {id: entity} dict
+        self._indexes = {name: {} for name in indexes}
+        self._indexed_keys = {}
+        self.journal = None
+
     def add(self, entity):
+        keys = self._index_keys(entity)
+        self._check_unique(entity.id, keys)
         self._storage[entity.id] = entity
-    
+        self._index(entity, keys)
+        if self.journal:
+            self.journal('put', entity)
+
+    def load(self, entities):
+        """Add many entities without journaling them, e.g. when restoring.
+
+        Unique values are not checked: a snapshot may briefly give the same
+        value to two entities, which the journal replayed after it resolves.
+        """
+        for entity in entities:
+            self._storage[entity.id] = entity
+            self._index(entity, self._index_keys(entity))
+
     def get(self, entity_id):
         return self._storage.get(entity_id)
-    
+
     def get_all(self):
         """Get all entities"""
         return list(self._storage.values())
 
     def update(self, obj_id, data):
+        """Apply ``data`` to an entity and refresh its index entries.
+
+        Also picks up changes made directly on the entity since it was last
+        indexed, such as a reassigned owner.
+        """
         obj = self.get(obj_id)
-        if obj:
-            obj.update(data)
-            return obj
-        return None
+        if not obj:
+            return None
+        self._check_unique(obj_id, {name: data[name] for name in self._unique if name in data})
+        obj.update(data)
+        self._unindex(obj_id)
+        self._index(obj, self._index_keys(obj))
+        if self.journal:
+            self.journal('put', obj)
+        return obj
 
     def delete(self, obj_id):
         if obj_id in self._storage:
+            self._unindex(obj_id)
             del self._storage[obj_id]
+            if self.journal:
+                self.journal('delete', obj_id)
+            return True
+        return False
 
     def get_by_attribute(self, attr_name, attr_value):
+        """Return the first entity whose attribute equals the value, or None"""
+        if attr_name in self._unique:
+            return self.get(self._unique[attr_name].get(attr_value))
+        if attr_name in self._indexes:
+            entities = self._indexes[attr_name].get(attr_value)
+            return next(iter(entities.values())) if entities else None
         for entity in self._storage.values():
             if hasattr(entity, attr_name) and getattr(entity, attr_name) == attr_value:
                 return entity
         return None
-    
-    def update(self, entity_id, updated_entity):
-        if entity_id in self._storage:
-            self._storage[entity_id] = updated_entity
-            return True
-        return False
-    
-    def delete(self, entity_id):
-        if entity_id in self._storage:
-            del self._storage[entity_id]
+
+    def get_all_by_attribute(self, attr_name, attr_value):
+        """Return every entity whose attribute equals the value"""
+        if attr_name in self._unique:
+            entity = self.get_by_attribute(attr_name, attr_value)
+            return [entity] if entity else []
+        if attr_name in self._indexes:
+            return list(self._indexes[attr_name].get(attr_value, {}).values())
+        return [entity for entity in self._storage.values()
+                if hasattr(entity, attr_name) and getattr(entity, attr_name) == attr_value]
+
+    def _index_keys(self, entity):
+        return {name: key(entity) for name, key in self._key_functions.items()}
+
+    def _check_unique(self, entity_id, keys):
+        for name, value in keys.items():
+            if name not in self._unique or value is None:
+                continue
+            owner_id = self._unique[name].get(value)
+            if owner_id is not None and owner_id != entity_id:
+                raise ValueError(f"{name} already exists")
+
+    def _index(self, entity, keys):
+        for name, value in keys.items():
+            if value is None:
+                continue
+            if name in self._unique:
+                self._unique[name][value] = entity.id
+            else:
+                self._indexes[name].setdefault(value, {})[entity.id] = entity
+        self._indexed_keys[entity.id] = keys
+
+    def _unindex(self, entity_id):
+        for name, value in self._indexed_keys.pop(entity_id, {}).items():
+            if value is None:
+                continue
+            if name in self._unique:
+                if self._unique[name].get(value) == entity_id:
+                    del self._unique[name][value]
+            else:
+                ids = self._indexes[name].get(value)
+                if ids is not None:
+                    ids.pop(entity_id, None)
+                    if not ids:
+                        del self._indexes[name][value]
+
+
+class ConcurrentInMemoryRepository(InMemoryRepository):
+    """Thread-safe InMemoryRepository for multi-threaded servers.
+
+    Entities are spread over ``stripes`` shards, each guarded by its own lock
+    chosen by the hash of the entity id, so writers on different ids rarely
+    wait for each other. Index entries are guarded by a second set of locks
+    chosen by the hash of the indexed value, which keeps unique checks atomic.
+    A writer takes its entity lock first and value locks in stripe order, so
+    writers cannot deadlock. Reads never lock: ``get`` is a single dict
+    lookup and ``get_all`` copies each shard, which CPython does atomically.
+    """
+
+    def __init__(self, indexes=(), unique_indexes=(), stripes=16):
+        self._shards = [{} for _ in range(stripes)]
+        super().__init__(indexes, unique_indexes)
+        self._entity_locks = [threading.Lock() for _ in range(stripes)]
+        self._value_locks = [threading.Lock() for _ in range(stripes)]
+
+    @property
+    def _storage(self):
+        """Read-only copy of every shard, merged into one mapping"""
+        return MappingProxyType({entity_id: entity for shard in self._shards
+                                 for entity_id, entity in shard.copy().items()})
+
+    @_storage.setter
+    def _storage(self, entities):
+        for shard in self._shards:
+            shard.clear()
+        for entity_id, entity in entities.items():
+            self._shards[self._stripe(entity_id)][entity_id] = entity
+
+    def _stripe(self, key):
+        return hash(key) % len(self._shards)
+
+    @contextmanager
+    def _values_locked(self, *key_sets):
+        stripes = sorted({self._stripe((name, value))
+                          for keys in key_sets for name, value in keys.items()})
+        for stripe in stripes:
+            self._value_locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._value_locks[stripe].release()
+
+    def add(self, entity):
+        keys = self._index_keys(entity)
+        with self._entity_locks[self._stripe(entity.id)], self._values_locked(keys):
+            self._check_unique(entity.id, keys)
+            self._shards[self._stripe(entity.id)][entity.id] = entity
+            self._index(entity, keys)
+            if self.journal:
+                self.journal('put', entity)
+
+    def load(self, entities):
+        """Add many entities without locking, checking or journaling.
+
+        Only safe before the repository is shared between threads, which is
+        how the durable store restores it at startup.
+        """
+        shards = self._shards
+        key_functions = list(self._key_functions.items())
+        for entity in entities:
+            shards[hash(entity.id) % len(shards)][entity.id] = entity
+            self._index(entity, {name: key(entity) for name, key in key_functions})
+
+    def get(self, entity_id):
+        if entity_id is None:
+            return None
+        return self._shards[self._stripe(entity_id)].get(entity_id)
+
+    def get_all(self):
+        """Get a snapshot of all entities without taking any lock"""
+        return [entity for shard in self._shards for entity in shard.copy().values()]
+
+    def update(self, obj_id, data):
+        obj = self.get(obj_id)
+        if not obj:
+            return None
+        with self._entity_locks[self._stripe(obj_id)]:
+            if self.get(obj_id) is not obj:
+                return None
+            old_keys = self._indexed_keys.get(obj_id, {})
+            claimed = self._claim_unique(obj_id, {name: data[name] for name in self._unique
+                                                  if data.get(name) is not None})
+            try:
+                obj.update(data)
+            finally:
+                new_keys = self._index_keys(obj)
+                with self._values_locked(old_keys, new_keys, claimed):
+                    self._unindex(obj_id)
+                    for name, value in claimed.items():
+                        if new_keys.get(name) != value and self._unique[name].get(value) == obj_id:
+                            del self._unique[name][value]
+                    self._index(obj, new_keys)
+            if self.journal:
+                self.journal('put', obj)
+        return obj
+
+    def _claim_unique(self, entity_id, values):
+        """Check and reserve new unique values before they are applied."""
+        with self._values_locked(values):
+            self._check_unique(entity_id, values)
+            claimed = {name: value for name, value in values.items()
+                       if self._unique[name].get(value) is None}
+            for name, value in claimed.items():
+                self._unique[name][value] = entity_id
+        return claimed
+
+    def delete(self, obj_id):
+        with self._entity_locks[self._stripe(obj_id)]:
+            shard = self._shards[self._stripe(obj_id)]
+            if obj_id not in shard:
+                return False
+            with self._values_locked(self._indexed_keys.get(obj_id, {})):
+                self._unindex(obj_id)
+                del shard[obj_id]
+            if self.journal:
+                self.journal('delete', obj_id)
             return True
-        return False
-    
\ No newline at end of file
+
+    def get_by_attribute(self, attr_name, attr_value):
+        matches = self.get_all_by_attribute(attr_name, attr_value)
+        return matches[0] if matches else None
+
+    def get_all_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._unique:
+            entity = self.get(self._unique[attr_name].get(attr_value))
+            return [entity] if entity else []
+        if attr_name in self._indexes:
+            # list() copies the entries atomically
+            return list(self._indexes[attr_name].get(attr_value, {}).values())
+        return [entity for entity in self.get_all()
+                if hasattr(entity, attr_name) and getattr(entity, attr_name) == attr_value]
@@ -1,3 +1,5 @@
+import os
+
 from app.services.facade import HBnBFacade
 
-facade = HBnBFacade()
\ No newline at end of file
+facade = HBnBFacade(data_dir=os.getenv('HBNB_DATA_DIR'))
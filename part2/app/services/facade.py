@@ -1,15 +1,31 @@
-from app.persistence.repository import InMemoryRepository
+from app.persistence.durable import DurableStore
+from app.persistence.repository import ConcurrentInMemoryRepository
 from app.models.user import User
 from app.models.place import Place
 from app.models.review import Review
 from app.models.amenity import Amenity
 
 class HBnBFacade:
-    def __init__(self):
-        self.user_repo = InMemoryRepository()
-        self.amenity_repo = InMemoryRepository()
-        self.place_repo = InMemoryRepository()
-        self.review_repo = InMemoryRepository()
+    def __init__(self, data_dir=None):
+        self.user_repo = ConcurrentInMemoryRepository(unique_indexes=('email',))
+        self.amenity_repo = ConcurrentInMemoryRepository(indexes=('name',))
+        self.place_repo = ConcurrentInMemoryRepository(indexes={
+            'owner_id': lambda place: place.owner.id
+        })
+        self.review_repo = ConcurrentInMemoryRepository(indexes={
+            'place_id': lambda review: review.place.id,
+            'user_id': lambda review: review.user.id
+        })
+
+        # Without a data directory everything is lost when the process exits
+        self.store = None
+        if data_dir:
+            self.store = DurableStore(data_dir)
+            self.store.register(User, self.user_repo)
+            self.store.register(Amenity, self.amenity_repo)
+            self.store.register(Place, self.place_repo)
+            self.store.register(Review, self.review_repo, backref=('place', 'reviews'))
+            self.store.open()
 
     def create_user(self, user_data):
         user = User(**user_data)
@@ -28,11 +44,7 @@ class HBnBFacade:
         return []
     
     def update_user(self, user_id, data):
-        user = self.user_repo.get(user_id)
-        if user:
-            user.update(data)
-            return user
-        return None
+        return self.user_repo.update(user_id, data)
 
     def delete_user(self, user_id):
         self.user_repo.delete(user_id)
@@ -49,11 +61,7 @@ class HBnBFacade:
         return self.amenity_repo.get_all()
 
     def update_amenity(self, amenity_id, amenity_data):
-        amenity = self.amenity_repo.get(amenity_id)
-        if amenity:
-            amenity.update(amenity_data)
-            return amenity
-        return None
+        return self.amenity_repo.update(amenity_id, amenity_data)
 
     def create_place(self, place_data):
         owner_id = place_data.get('owner_id')
@@ -73,15 +81,15 @@ class HBnBFacade:
         }
 
         place = Place(**place_kwargs)
-        self.place_repo.add(place)
 
+        # Attach amenities before adding, so the place is stored complete
         for amenity_id in amenities_ids:
             amenity = self.amenity_repo.get(amenity_id)
             if not amenity:
-                self.place_repo.delete(place.id)
                 raise ValueError(f"Amenity with ID {amenity_id} not found")
             place.add_amenity(amenity)
 
+        self.place_repo.add(place)
         return place
 
     def get_place(self, place_id):
@@ -90,6 +98,9 @@ class HBnBFacade:
     def get_all_places(self):
         return self.place_repo.get_all()
 
+    def get_places_by_owner(self, owner_id):
+        return self.place_repo.get_all_by_attribute('owner_id', owner_id)
+
     def update_place(self, place_id, place_data):
         place = self.place_repo.get(place_id)
         if not place:
@@ -116,8 +127,7 @@ class HBnBFacade:
 
         # Update other fields (excluding owner_id and amenities)
         updated_data = {k: v for k, v in place_data.items() if k not in ['owner_id', 'amenities']}
-        place.update(updated_data)
-        return place
+        return self.place_repo.update(place_id, updated_data)
     
     def create_review(self, review_data):
         user_id = review_data.get('user_id')
@@ -153,7 +163,10 @@ class HBnBFacade:
         place = self.place_repo.get(place_id)
         if not place:
             raise ValueError("Place not found")
-        return place.reviews
+        return self.review_repo.get_all_by_attribute('place_id', place_id)
+
+    def get_reviews_by_user(self, user_id):
+        return self.review_repo.get_all_by_attribute('user_id', user_id)
 
     def update_review(self, review_id, review_data):
         review = self.review_repo.get(review_id)
@@ -176,8 +189,7 @@ class HBnBFacade:
             review.place = place
             review_data.pop('place_id')
 
-        review.update(review_data)
-        return review
+        return self.review_repo.update(review_id, review_data)
 
     def delete_review(self, review_id):
         review = self.review_repo.get(review_id)
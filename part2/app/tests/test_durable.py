@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Tests for the journal and snapshots of the in-memory backend using unittest"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.facade import HBnBFacade
+
+
+class TestDurableStore(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.facade = HBnBFacade(data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.facade.store.close()
+        shutil.rmtree(self.data_dir)
+
+    def _reopen(self):
+        self.facade.store.close()
+        self.facade = HBnBFacade(data_dir=self.data_dir)
+        return self.facade
+
+    def _populate(self):
+        owner = self.facade.create_user({'first_name': "Alice", 'last_name': "Smith",
+                                         'email': "alice@example.com"})
+        wifi = self.facade.create_amenity({'name': "Wi-Fi"})
+        place = self.facade.create_place({'title': "Loft", 'description': "", 'price': 80,
+                                          'latitude': 48.8, 'longitude': 2.3,
+                                          'owner_id': owner.id, 'amenities': [wifi.id]})
+        review = self.facade.create_review({'text': "Great", 'rating': 5,
+                                            'user_id': owner.id, 'place_id': place.id})
+        return owner, wifi, place, review
+
+    def test_restore_from_journal(self):
+        """Test entities and their links survive a restart through the journal"""
+        owner, wifi, place, review = self._populate()
+        facade = self._reopen()
+
+        restored = facade.get_place(place.id)
+        self.assertEqual(restored.title, "Loft")
+        self.assertIs(restored.owner, facade.get_user(owner.id))
+        self.assertEqual([amenity.id for amenity in restored.amenities], [wifi.id])
+        self.assertEqual([r.id for r in restored.reviews], [review.id])
+        self.assertIs(facade.get_review(review.id).place, restored)
+        self.assertEqual(facade.get_user_by_email("alice@example.com").id, owner.id)
+        self.assertEqual(facade.get_places_by_owner(owner.id), [restored])
+
+    def test_restore_updates_and_deletes(self):
+        """Test the journal replays updates and deletes in order"""
+        owner, _, place, review = self._populate()
+        self.facade.update_user(owner.id, {'email': "alice@hbnb.io"})
+        self.facade.update_place(place.id, {'price': 95})
+        self.facade.delete_review(review.id)
+        facade = self._reopen()
+
+        self.assertEqual(facade.get_user(owner.id).email, "alice@hbnb.io")
+        self.assertIsNone(facade.get_user_by_email("alice@example.com"))
+        self.assertEqual(facade.get_place(place.id).price, 95)
+        self.assertIsNone(facade.get_review(review.id))
+        self.assertEqual(facade.get_place(place.id).reviews, [])
+
+    def test_restore_from_snapshot_and_tail(self):
+        """Test a snapshot is loaded and the records written after it replayed"""
+        owner, _, place, _ = self._populate()
+        self.facade.store.snapshot()
+        self.assertEqual(os.path.getsize(self.facade.store.journal_path), 0)
+        self.facade.update_place(place.id, {'title': "Penthouse"})
+        facade = self._reopen()
+
+        self.assertEqual(facade.get_place(place.id).title, "Penthouse")
+        self.assertIs(facade.get_place(place.id).owner, facade.get_user(owner.id))
+        self.assertEqual(len(facade.get_all_reviews()), 1)
+
+    def test_review_changes_journal_only_the_review(self):
+        """Test a place's review list is rebuilt from the journaled reviews"""
+        owner, _, place, review = self._populate()
+        self.facade.store.snapshot()
+        records = self.facade.store._records
+        other = self.facade.create_review({'text': "Quiet", 'rating': 4,
+                                           'user_id': owner.id, 'place_id': place.id})
+        self.facade.delete_review(review.id)
+        self.assertEqual(self.facade.store._records, records + 2)
+        facade = self._reopen()
+
+        self.assertEqual([r.id for r in facade.get_place(place.id).reviews], [other.id])
+
+    def test_restore_moved_unique_value(self):
+        """Test an email released by one user and taken by another restores"""
+        owner, _, _, _ = self._populate()
+        self.facade.store.snapshot()
+        self.facade.update_user(owner.id, {'email': "alice@hbnb.io"})
+        other = self.facade.create_user({'first_name': "Eve", 'last_name': "Doe",
+                                         'email': "alice@example.com"})
+        facade = self._reopen()
+
+        self.assertEqual(facade.get_user_by_email("alice@example.com").id, other.id)
+        self.assertEqual(facade.get_user_by_email("alice@hbnb.io").id, owner.id)
+
+    def test_torn_journal_tail_is_dropped(self):
+        """Test a partially written record does not prevent the restore"""
+        owner, _, _, _ = self._populate()
+        journal_path = self.facade.store.journal_path
+        self.facade.store.close()
+        with open(journal_path, 'ab') as journal:
+            journal.write(b'\x40\x00\x00\x00\x00')
+        facade = HBnBFacade(data_dir=self.data_dir)
+        self.facade = facade
+
+        self.assertEqual(facade.get_user(owner.id).first_name, "Alice")
+        self.assertEqual(len(facade.get_all_places()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
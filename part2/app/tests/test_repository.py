@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Tests for the indexed in-memory repository using unittest"""
+
+import sys
+import os
+import threading
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.user import User
+from app.models.place import Place
+from app.persistence.repository import InMemoryRepository, ConcurrentInMemoryRepository
+
+
+class TestInMemoryRepositoryIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.users = InMemoryRepository(unique_indexes=('email',))
+        self.places = InMemoryRepository(indexes={'owner_id': lambda place: place.owner.id})
+        self.alice = User(first_name="Alice", last_name="Smith", email="alice@example.com")
+        self.bob = User(first_name="Bob", last_name="Brown", email="bob@example.com")
+        self.users.add(self.alice)
+        self.users.add(self.bob)
+
+    def _place(self, title, owner):
+        place = Place(title=title, description="", price=10, latitude=0, longitude=0, owner=owner)
+        self.places.add(place)
+        return place
+
+    def test_unique_lookup(self):
+        """Test lookup through a unique index"""
+        self.assertIs(self.users.get_by_attribute('email', "bob@example.com"), self.bob)
+        self.assertIsNone(self.users.get_by_attribute('email', "nobody@example.com"))
+
+    def test_unique_violation_on_add(self):
+        """Test adding a second entity with the same unique value fails"""
+        duplicate = User(first_name="Other", last_name="Alice", email="alice@example.com")
+        with self.assertRaises(ValueError):
+            self.users.add(duplicate)
+        self.assertIsNone(self.users.get(duplicate.id))
+
+    def test_update_moves_unique_entry(self):
+        """Test updating an indexed attribute re-keys the index"""
+        self.users.update(self.alice.id, {'email': "alice@new.example.com"})
+        self.assertIsNone(self.users.get_by_attribute('email', "alice@example.com"))
+        self.assertIs(self.users.get_by_attribute('email', "alice@new.example.com"), self.alice)
+        with self.assertRaises(ValueError):
+            self.users.update(self.bob.id, {'email': "alice@new.example.com"})
+        self.assertEqual(self.bob.email, "bob@example.com")
+
+    def test_delete_releases_unique_value(self):
+        """Test deleting an entity frees its unique value"""
+        self.users.delete(self.alice.id)
+        self.assertIsNone(self.users.get_by_attribute('email', "alice@example.com"))
+        self.users.add(User(first_name="New", last_name="Alice", email="alice@example.com"))
+
+    def test_multi_valued_lookup(self):
+        """Test a non-unique index returns every match in insertion order"""
+        first = self._place("First", self.alice)
+        second = self._place("Second", self.alice)
+        self._place("Third", self.bob)
+        self.assertEqual(self.places.get_all_by_attribute('owner_id', self.alice.id), [first, second])
+        self.assertIs(self.places.get_by_attribute('owner_id', self.alice.id), first)
+
+    def test_update_picks_up_direct_changes(self):
+        """Test update re-indexes changes made directly on the entity"""
+        place = self._place("Moved", self.alice)
+        place.owner = self.bob
+        self.places.update(place.id, {})
+        self.assertEqual(self.places.get_all_by_attribute('owner_id', self.alice.id), [])
+        self.assertEqual(self.places.get_all_by_attribute('owner_id', self.bob.id), [place])
+
+    def test_unindexed_attribute_falls_back_to_scan(self):
+        """Test lookups on attributes without an index still work"""
+        self.assertIs(self.users.get_by_attribute('first_name', "Bob"), self.bob)
+        self.assertEqual(self.users.get_all_by_attribute('last_name', "Nobody"), [])
+
+
+class TestConcurrentInMemoryRepositoryIndexes(TestInMemoryRepositoryIndexes):
+    """Run the index tests against the lock-striped variant"""
+
+    def setUp(self):
+        super().setUp()
+        self.users = ConcurrentInMemoryRepository(unique_indexes=('email',), stripes=4)
+        self.places = ConcurrentInMemoryRepository(
+            indexes={'owner_id': lambda place: place.owner.id}, stripes=4)
+        self.users.add(self.alice)
+        self.users.add(self.bob)
+
+    def test_storage_spans_the_shards(self):
+        """Test the storage mapping holds the entities of every shard"""
+        self.assertEqual(dict(self.users._storage), {self.alice.id: self.alice, self.bob.id: self.bob})
+        self.users.delete(self.alice.id)
+        self.assertEqual(list(self.users._storage), [self.bob.id])
+
+
+class TestConcurrentInMemoryRepositoryThreads(unittest.TestCase):
+
+    def _run(self, target, count):
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_unique_value_is_claimed_once(self):
+        """Test concurrent adds with the same email let exactly one through"""
+        repo = ConcurrentInMemoryRepository(unique_indexes=('email',))
+        barrier = threading.Barrier(8)
+        winners = []
+
+        def register(i):
+            user = User(first_name="User", last_name=str(i), email="same@example.com")
+            barrier.wait()
+            try:
+                repo.add(user)
+                winners.append(user)
+            except ValueError:
+                pass
+
+        self._run(register, 8)
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(repo.get_all(), winners)
+
+    def test_snapshot_reads_during_writes(self):
+        """Test get_all and index lookups stay consistent while writers run"""
+        repo = ConcurrentInMemoryRepository(indexes=('last_name',))
+        errors = []
+
+        def churn(i):
+            try:
+                for n in range(300):
+                    user = User(first_name="User", last_name=f"group{n % 3}",
+                                email=f"u{i}-{n}@example.com")
+                    repo.add(user)
+                    repo.get_all()
+                    repo.get_all_by_attribute('last_name', "group1")
+                    if n % 2:
+                        repo.delete(user.id)
+            except Exception as e:
+                errors.append(e)
+
+        self._run(churn, 6)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(repo.get_all()), 6 * 150)
+        self.assertEqual(len(repo.get_all_by_attribute('last_name', "group1")),
+                         len([u for u in repo.get_all() if u.last_name == "group1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
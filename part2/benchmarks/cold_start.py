@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the durable in-memory backend.
+
+Fills a data directory with users and places, compacts it into a snapshot
+with a journal tail on top, then times how long a new facade takes to
+restore it.
+
+Usage: python benchmarks/cold_start.py [--entities 1000000] [--tail 10000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.facade import HBnBFacade
+
+
+def populate(data_dir, entities, tail):
+    facade = HBnBFacade(data_dir=data_dir)
+    facade.store.snapshot_every = 0
+    owners = []
+    for i in range(entities // 2):
+        owners.append(facade.create_user({'first_name': "User", 'last_name': str(i),
+                                          'email': f"user{i}@example.com"}))
+    for i in range(entities - len(owners)):
+        facade.create_place({'title': f"Place {i}", 'description': "", 'price': 50,
+                             'latitude': 0, 'longitude': 0,
+                             'owner_id': owners[i % len(owners)].id})
+    started = time.perf_counter()
+    facade.store.snapshot()
+    print(f"snapshot of {entities} entities: {time.perf_counter() - started:.2f}s")
+    for i in range(tail):
+        facade.update_user(owners[i % len(owners)].id, {'first_name': f"Renamed {i}"})
+    facade.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entities', type=int, default=1000000)
+    parser.add_argument('--tail', type=int, default=10000)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        populate(data_dir, args.entities, args.tail)
+        started = time.perf_counter()
+        facade = HBnBFacade(data_dir=data_dir)
+        elapsed = time.perf_counter() - started
+        restored = len(facade.get_all_users()) + len(facade.get_all_places())
+        print(f"restored {restored} entities and {args.tail} journal records: {elapsed:.2f}s")
+        facade.store.close()
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == '__main__':
+    main()
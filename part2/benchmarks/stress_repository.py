@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Stress benchmark for the in-memory repositories.
+
+Runs a mixed read/write workload against ConcurrentInMemoryRepository and
+against InMemoryRepository behind a single global lock, for an increasing
+number of threads, and prints the throughput of each.
+
+Usage: python benchmarks/stress_repository.py [--threads 1 2 4 8] [--ops 20000]
+
+On a GIL build of CPython, threads never run Python code in parallel, so
+the striped repository mostly shows that it does not degrade as threads
+are added, while the global lock loses throughput to lock convoys. On a
+free-threaded build (python3.13t) the striped repository scales with the
+thread count.
+"""
+import argparse
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.user import User
+from app.persistence.repository import InMemoryRepository, ConcurrentInMemoryRepository
+
+
+class GlobalLockRepository:
+    """InMemoryRepository serialized by one lock, the naive thread-safe baseline"""
+
+    def __init__(self, **kwargs):
+        self._repo = InMemoryRepository(**kwargs)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self._repo, name)
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return method(*args, **kwargs)
+        return locked
+
+
+def make_user(key, group):
+    return User(first_name="Bench", last_name=f"group{group}", email=f"user{key}@example.com")
+
+
+def worker(repo, ids, ops, read_ratio, seed):
+    rng = random.Random(seed)
+    for n in range(ops):
+        roll = rng.random()
+        if roll < read_ratio * 0.6:
+            repo.get(rng.choice(ids))
+        elif roll < read_ratio * 0.9:
+            repo.get_by_attribute('email', f"user{rng.randrange(len(ids))}@example.com")
+        elif roll < read_ratio:
+            repo.get_all_by_attribute('last_name', f"group{rng.randrange(50)}")
+        elif roll < read_ratio + (1 - read_ratio) / 2:
+            repo.add(make_user(f"{seed}-{n}", n % 50))
+        else:
+            repo.update(rng.choice(ids), {'first_name': f"Bench{n}"})
+
+
+def run(repo_class, threads, ops, read_ratio, population):
+    repo = repo_class(indexes=('last_name',), unique_indexes=('email',))
+    users = [make_user(n, n % 50) for n in range(population)]
+    for user in users:
+        repo.add(user)
+    ids = [user.id for user in users]
+
+    per_thread = ops // threads
+    pool = [threading.Thread(target=worker, args=(repo, ids, per_thread, read_ratio, i))
+            for i in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--ops', type=int, default=20000, help='operations per run')
+    parser.add_argument('--read-ratio', type=float, default=0.9)
+    parser.add_argument('--population', type=int, default=10000)
+    args = parser.parse_args()
+
+    gil = sysconfig.get_config_var('Py_GIL_DISABLED') != 1
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    print(f"{'threads':>8} {'global lock ops/s':>18} {'striped ops/s':>14} {'striped scaling':>16}")
+    baseline = None
+    for threads in args.threads:
+        single = run(GlobalLockRepository, threads, args.ops, args.read_ratio, args.population)
+        striped = run(ConcurrentInMemoryRepository, threads, args.ops, args.read_ratio, args.population)
+        baseline = baseline or striped
+        print(f"{threads:>8} {single:>18,.0f} {striped:>14,.0f} {striped / baseline:>15.2f}x")
+
+
+if __name__ == '__main__':
+    main()
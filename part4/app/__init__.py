@@ -18,14 +18,15 @@ authorizations = {
     }
 }
 
-def create_app():
+def create_app(config_class='config.DevelopmentConfig'):
     app = Flask(__name__)
     CORS(app, resources={
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD"],
-            "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Origin"],
-            "expose_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Origin",
+                              "If-None-Match"],
+            "expose_headers": ["Content-Type", "Authorization", "ETag"],
             "supports_credentials": True,
             "max_age": 600
         }
@@ -40,7 +41,7 @@ def create_app():
             response.headers.add("Access-Control-Allow-Methods", "*")
             return response
 
-    app.config.from_object('config.DevelopmentConfig')
+    app.config.from_object(config_class)
 
     api = Api(app, 
               version='1.0', 
@@ -55,20 +56,42 @@ def create_app():
     jwt.init_app(app)
     db.init_app(app)
 
+    from app.persistence.cache import entity_cache
+    from app.persistence import unit_of_work
+    from app.persistence.routing import read_router
+    from app.persistence.response_cache import response_cache
+    entity_cache.init_app(app)
+    response_cache.init_app(app)
+    unit_of_work.init_app(app)
+    read_router.init_app(app)
+
     with app.app_context():
+        from app import models
+        from app.persistence import leaderboard, ratings, versions
+        from app.persistence.schema import upgrade_schema
+        ratings.init_app(app)
+        leaderboard.init_app(app)
+        versions.init_app(app)
         db.create_all()
+        upgrade_schema()
         print("✅ Tables créées avec succès!")
 
+    # After the schema upgrade, its writer may drain leftover jobs right away
+    from app.services.review_queue import review_queue
+    review_queue.init_app(app)
+
     from app.api.v1.users import user_namespace as users_ns
     from app.api.v1.amenities import amenity_namespace
     from app.api.v1.places import place_namespace
     from app.api.v1.reviews import review_namespace
     from app.api.v1.auth import api as auth_ns
+    from app.api.v1.exports import export_namespace
 
     api.add_namespace(users_ns, path='/api/v1/users')
     api.add_namespace(auth_ns, path='/api/v1/auth')
     api.add_namespace(amenity_namespace, path='/api/v1/amenities')
     api.add_namespace(place_namespace, path='/api/v1/places')
     api.add_namespace(review_namespace, path='/api/v1/reviews')
+    api.add_namespace(export_namespace, path='/api/v1/exports')
     
     return app
\ No newline at end of file
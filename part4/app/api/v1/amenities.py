@@ -1,12 +1,24 @@
 from flask_restx import Namespace, Resource, fields
 from app.services import facade
+from app.api.v1.pagination import ids_arg, ids_params, multi_get, page_args, page_params
+from app.api.v1.conditional import entity_tag, is_fresh, not_modified, validators
+from app.persistence.response_cache import response_cache
 
 amenity_namespace = Namespace('amenities', description='Amenity operations')
 
+# Columns read by the list endpoint, the other ones are never loaded
+AMENITY_LIST_COLUMNS = ('id', 'name')
+
 amenity_model = amenity_namespace.model('Amenity', {
     'name': fields.String(required=True, description='Name of the amenity')
 })
 
+def amenity_item(amenity):
+    return {
+        'id': amenity.id,
+        'name': amenity.name
+    }
+
 @amenity_namespace.route('/')
 class AmenityList(Resource):
     @amenity_namespace.expect(amenity_model, validate=True)
@@ -30,28 +42,51 @@ class AmenityList(Resource):
         except Exception as e:
             return {'error': f'Internal server error: {str(e)}'}, 500
 
+    @amenity_namespace.doc(params={**page_params, **ids_params})
     @amenity_namespace.response(200, 'List of amenities retrieved successfully')
+    @amenity_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @amenity_namespace.response(400, 'Invalid pagination or ids parameters')
+    @response_cache.cached('amenities')
     def get(self):
-        """Retrieve a list of all amenities"""
-        amenities = facade.get_all_amenities()
-        return [{
-            'id': amenity.id,
-            'name': amenity.name
-        } for amenity in amenities], 200
+        """Retrieve a page of amenities, or amenities by ids"""
+        try:
+            ids = ids_arg()
+            if ids is not None:
+                amenities = facade.get_many_amenities(ids)
+                etag = entity_tag(*[(amenity.id, amenity.updated_at)
+                                    for amenity in amenities.values()])
+                if is_fresh(etag):
+                    return not_modified(etag)
+                return multi_get(ids, amenities, amenity_item), 200, validators(etag)
+            limit, cursor = page_args()
+            etag = entity_tag(facade.get_table_versions('amenities'))
+            if is_fresh(etag):
+                return not_modified(etag)
+            amenities, next_cursor = facade.get_amenities_page(limit, cursor, AMENITY_LIST_COLUMNS)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return {
+            'items': [amenity_item(amenity) for amenity in amenities],
+            'next_cursor': next_cursor
+        }, 200, validators(etag)
 
 @amenity_namespace.route('/<amenity_id>')
 class AmenityResource(Resource):
     @amenity_namespace.response(200, 'Amenity details retrieved successfully')
+    @amenity_namespace.response(304, 'Not modified since the If-None-Match ETag')
     @amenity_namespace.response(404, 'Amenity not found')
     def get(self, amenity_id):
         """Get amenity details by ID"""
         amenity = facade.get_amenity(amenity_id)
         if not amenity:
             return {'error': 'Amenity not found'}, 404
+        etag = entity_tag(amenity.id, amenity.updated_at)
+        if is_fresh(etag):
+            return not_modified(etag)
         return {
             'id': amenity.id,
             'name': amenity.name
-        }, 200
+        }, 200, validators(etag)
 
     @amenity_namespace.expect(amenity_model, validate=True)
     @amenity_namespace.response(200, 'Amenity updated successfully')
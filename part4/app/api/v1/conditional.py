@@ -0,0 +1,39 @@
+import hashlib
+import json
+from flask import request
+
+# Clients may keep responses but must revalidate them with If-None-Match
+CACHE_CONTROL = 'no-cache'
+
+
+def entity_tag(*parts):
+    """Strong ETag of the values a response is built from.
+
+    ``parts`` are the validators of the response, such as ids, updated_at
+    timestamps or table versions. The path and the query parameters of the
+    request are always included, so two pages never share a tag.
+    """
+    arguments = sorted(request.args.items(multi=True))
+    raw = json.dumps([request.path, arguments, *parts], default=str, separators=(',', ':'))
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest() + '"'
+
+
+def is_fresh(etag):
+    """Whether the client copy matches ``etag``, per its If-None-Match header."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # If-None-Match uses the weak comparison: a W/ prefix is ignored
+    tags = [tag.strip() for tag in header.split(',')]
+    return etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+
+def validators(etag):
+    return {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+
+
+def not_modified(etag):
+    """A 304 response for ``etag``; Werkzeug sends no body with it."""
+    return None, 304, validators(etag)
@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from flask import Response, stream_with_context
+from flask_restx import Namespace, Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.services.facade import facade
+from app.persistence.repository import chunked
+
+export_namespace = Namespace('exports', description='Bulk exports (Admin only)')
+
+# Rows buffered per database round trip and per chunk of the response body
+EXPORT_BATCH_SIZE = 1000
+
+# Columns written for each exported table; passwords are never exported
+EXPORTS = {
+    'users': (facade.iter_users, ('id', 'first_name', 'last_name', 'email', 'is_admin',
+                                  'created_at', 'updated_at')),
+    'places': (facade.iter_places, ('id', 'title', 'description', 'price', 'latitude',
+                                    'longitude', 'owner_id', 'rating_sum', 'review_count',
+                                    'created_at', 'updated_at')),
+    'reviews': (facade.iter_reviews, ('id', 'text', 'rating', 'user_id', 'place_id',
+                                      'created_at', 'updated_at')),
+    'amenities': (facade.iter_amenities, ('id', 'name', 'created_at', 'updated_at')),
+}
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_lines(rows, columns, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the rows as newline-delimited JSON, one string per batch of rows."""
+    for batch in chunked(rows, batch_size):
+        yield ''.join(json.dumps({column: getattr(row, column) for column in columns},
+                                 default=_json_value, separators=(',', ':')) + '\n'
+                      for row in batch)
+
+
+@export_namespace.route('/<string:table>')
+@export_namespace.param('table', 'One of: ' + ', '.join(EXPORTS))
+class Export(Resource):
+    @jwt_required()
+    @export_namespace.response(200, 'Rows streamed as application/x-ndjson')
+    @export_namespace.response(403, 'Admin privileges required')
+    @export_namespace.response(404, 'Unknown export')
+    def get(self, table):
+        """Stream every row of a table as NDJSON, one object per line (Admin only)"""
+        current_user = facade.get_user(get_jwt_identity())
+        if not current_user or not current_user.is_admin:
+            return {'error': 'Admin privileges required'}, 403
+        if table not in EXPORTS:
+            return {'error': 'Unknown export'}, 404
+
+        iter_rows, columns = EXPORTS[table]
+        # The query runs lazily while the body is sent, inside the request context
+        rows = iter_rows(EXPORT_BATCH_SIZE, columns)
+        return Response(stream_with_context(ndjson_lines(rows, columns)),
+                        mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': f'attachment; filename={table}.ndjson'})
@@ -0,0 +1,51 @@
+"""Readers of the request bodies accepted by the import endpoints.
+
+Each reader consumes the body as a stream and yields (line, row) pairs,
+so an import never holds the whole upload in memory. A line that cannot
+be parsed is yielded with a ValueError in place of the row, to be
+reported along with the rows that fail validation.
+"""
+import csv
+import io
+import json
+
+
+def read_csv(stream):
+    """Rows of a UTF-8 CSV body with a header line.
+
+    The ``amenities`` cell holds amenity ids separated by semicolons.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        for row in reader:
+            if None in row:
+                yield reader.line_num, ValueError("Row has more cells than the header")
+                continue
+            if 'amenities' in row:
+                row['amenities'] = [amenity_id.strip() for amenity_id in
+                                    (row['amenities'] or '').split(';') if amenity_id.strip()]
+            yield reader.line_num, row
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield reader.line_num, ValueError(f"Unreadable CSV: {e}")
+
+
+def read_ndjson(stream):
+    """Rows of a newline-delimited JSON body, one object per line."""
+    lines = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    try:
+        for number, text in enumerate(lines, 1):
+            if not text.strip():
+                continue
+            try:
+                yield number, json.loads(text)
+            except ValueError:
+                yield number, ValueError("Invalid JSON")
+    except UnicodeDecodeError as e:
+        yield None, ValueError(f"Unreadable body: {e}")
+
+
+# Readers by the Content-Type of the request
+READERS = {
+    'text/csv': read_csv,
+    'application/x-ndjson': read_ndjson,
+}
@@ -0,0 +1,47 @@
+from flask import request
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+page_params = {
+    'limit': f'Maximum number of items to return (1-{MAX_LIMIT}, default {DEFAULT_LIMIT})',
+    'cursor': 'Opaque cursor taken from the next_cursor of the previous page'
+}
+
+
+def page_args():
+    """Read the ``limit`` and ``cursor`` query parameters of a list request."""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit, request.args.get('cursor') or None
+
+
+MAX_IDS = 100
+
+ids_params = {
+    'ids': f'Comma-separated ids (at most {MAX_IDS}) to fetch at once, instead of a page: '
+           'returns the items keyed by id and the missing ids'
+}
+
+
+def ids_arg():
+    """Read the ``ids`` query parameter of a multi-get, None when it is absent."""
+    value = request.args.get('ids')
+    if value is None:
+        return None
+    ids = list(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+    if not 1 <= len(ids) <= MAX_IDS:
+        raise ValueError(f"ids must hold between 1 and {MAX_IDS} ids")
+    return ids
+
+
+def multi_get(ids, found, serialize):
+    """Body of a multi-get: the ``found`` objects keyed by id and the missing ids."""
+    return {
+        'items': {obj_id: serialize(found[obj_id]) for obj_id in ids if obj_id in found},
+        'missing': [obj_id for obj_id in ids if obj_id not in found]
+    }
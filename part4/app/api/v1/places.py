@@ -1,9 +1,26 @@
+import math
+from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services import facade
+from app.api.v1.pagination import (MAX_LIMIT, ids_arg, ids_params, multi_get, page_args,
+                                   page_params)
+from app.api.v1.conditional import entity_tag, is_fresh, not_modified, validators
+from app.api.v1.sparse import names_arg, sparse_params
+from app.api.v1.imports import READERS
+from app.api.v1.reviews import place_review_params, place_reviews
+from app.persistence.response_cache import response_cache
+from app.persistence.geo import boxes_around, split_bbox
+from app.models.place import average_rating
+from app.services.facade import IMPORT_FIELDS
+from app.services.repositories.place_repository import DETAIL_EMBEDS
 
 place_namespace = Namespace('places', description='Place operations')
 
+# Columns read by the list endpoint, the other ones are never loaded
+PLACE_LIST_COLUMNS = ('id', 'title', 'latitude', 'longitude', 'price',
+                      'rating_sum', 'review_count')
+
 amenity_model = place_namespace.model('PlaceAmenity', {
     'id': fields.String(description='Amenity ID'),
     'name': fields.String(description='Name of the amenity')
@@ -40,7 +57,8 @@ review_model = place_namespace.model('PlaceReview', {
     'id': fields.String(description='Review ID'),
     'text': fields.String(description='Text of the review'),
     'rating': fields.Integer(description='Rating of the place (1-5)'),
-    'user_id': fields.String(description='ID of the user')
+    'user_id': fields.String(description='ID of the user'),
+    'user_name': fields.String(description='Full name of the author')
 })
 
 place_response_model = place_namespace.model('PlaceResponse', {
@@ -53,17 +71,148 @@ place_response_model = place_namespace.model('PlaceResponse', {
     'owner_id': fields.String(description='ID of the owner'),
     'owner': fields.Nested(user_model, description='Owner details'),
     'amenities': fields.List(fields.Nested(amenity_model), description='List of amenities'),
-    'reviews': fields.List(fields.Nested(review_model), description='List of reviews')
+    'reviews': fields.List(fields.Nested(review_model), description='List of reviews'),
+    'average_rating': fields.Float(description='Average rating, null without reviews'),
+    'review_count': fields.Integer(description='Number of reviews'),
+    'rating_histogram': fields.Raw(description='Number of reviews per rating, "1" to "5"')
 })
 
+area_params = {
+    'bbox': 'Only places inside minLon,minLat,maxLon,maxLat, nearest to its center first',
+    'near': 'Only places around lat,lon, nearest first (requires radius_km)',
+    'radius_km': 'Search radius around near, in kilometres'
+}
+
+
+def _floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValueError(f"{name} must be {count} comma-separated numbers")
+    return numbers
+
+
+def area_args():
+    """Read the ``bbox`` or ``near``/``radius_km`` query parameters.
+
+    Returns (boxes, origin, radius_km), or None when the request has no
+    geographic filter.
+    """
+    bbox, near = request.args.get('bbox'), request.args.get('near')
+    if bbox and near:
+        raise ValueError("use either bbox or near, not both")
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = _floats(bbox, 4, 'bbox')
+        if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180
+                and -90 <= min_lat <= max_lat <= 90):
+            raise ValueError("bbox must be minLon,minLat,maxLon,maxLat in degrees")
+        # Center of the box, across the antimeridian when it wraps around
+        center_lon = (min_lon + max_lon + (360 if min_lon > max_lon else 0)) / 2
+        origin = ((min_lat + max_lat) / 2, (center_lon + 540) % 360 - 180)
+        return split_bbox(min_lon, min_lat, max_lon, max_lat), origin, None
+    if near:
+        lat, lon = _floats(near, 2, 'near')
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("near must be lat,lon in degrees")
+        try:
+            radius_km = float(request.args['radius_km'])
+        except (KeyError, ValueError):
+            raise ValueError("radius_km is required with near and must be a number")
+        # nan passes any comparison and inf leaves no box to search
+        if not math.isfinite(radius_km) or radius_km <= 0:
+            raise ValueError("radius_km must be a positive number")
+        return boxes_around(lat, lon, radius_km), (lat, lon), radius_km
+    return None
+
+filter_params = {
+    'min_price': 'Only places costing at least this much per night',
+    'max_price': 'Only places costing at most this much per night',
+    'amenities': 'Comma-separated amenity IDs the places must all have',
+    'min_rating': 'Only places whose average review rating is at least this (1-5)'
+}
+
+
+def _number(name, low=None, high=None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+    # nan passes every range check below
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f"{name} must be between {low} and {high}" if high is not None
+                         else f"{name} must be at least {low}")
+    return number
+
+
+def filter_args():
+    """Read the ``min_price``, ``max_price``, ``amenities`` and ``min_rating`` filters."""
+    filters = {
+        'min_price': _number('min_price', 0),
+        'max_price': _number('max_price', 0),
+        'min_rating': _number('min_rating', 1, 5),
+        'amenities': [amenity_id.strip()
+                      for amenity_id in request.args.get('amenities', '').split(',')
+                      if amenity_id.strip()]
+    }
+    if filters['min_price'] is not None and filters['max_price'] is not None \
+            and filters['min_price'] > filters['max_price']:
+        raise ValueError("min_price must not be greater than max_price")
+    return filters
+
 place_list_model = place_namespace.model('PlaceList', {
     'id': fields.String(description='Place ID'),
     'title': fields.String(description='Title of the place'),
     'latitude': fields.Float(description='Latitude of the place'),
     'longitude': fields.Float(description='Longitude of the place'),
-    'price': fields.Float(description='Price per night')
+    'price': fields.Float(description='Price per night'),
+    'average_rating': fields.Float(description='Average rating, null without reviews'),
+    'review_count': fields.Integer(description='Number of reviews'),
+    'distance_km': fields.Float(description='Distance from near, or the bbox center')
+})
+
+amenity_facet_model = place_namespace.model('AmenityFacet', {
+    'id': fields.String(description='Amenity ID'),
+    'name': fields.String(description='Name of the amenity'),
+    'count': fields.Integer(description='Matching places having this amenity')
+})
+
+price_facet_model = place_namespace.model('PriceFacet', {
+    'min': fields.Integer(description='Lowest price of the bucket, included'),
+    'max': fields.Integer(description='Highest price of the bucket, excluded'),
+    'count': fields.Integer(description='Places priced within the bucket')
+})
+
+facets_model = place_namespace.model('PlaceFacets', {
+    'amenities': fields.List(fields.Nested(amenity_facet_model), description='Amenity counts'),
+    'price': fields.List(fields.Nested(price_facet_model),
+                         description='Price histogram, ignoring min_price and max_price')
+})
+
+place_page_model = place_namespace.model('PlacePage', {
+    'items': fields.List(fields.Nested(place_list_model), description='Places of this page'),
+    'next_cursor': fields.String(description='Cursor of the next page, null on the last page'),
+    'facets': fields.Nested(facets_model, description='Facet counts, on the first page of a non-area list')
 })
 
+def place_item(place):
+    """A place as listed, from its PLACE_LIST_COLUMNS."""
+    return {
+        'id': place.id,
+        'title': place.title,
+        'latitude': place.latitude,
+        'longitude': place.longitude,
+        'price': float(place.price) if place.price else 0,
+        'average_rating': average_rating(place.rating_sum, place.review_count),
+        'review_count': place.review_count
+    }
+
 @place_namespace.route('/')
 class PlaceList(Resource):
     @place_namespace.expect(place_model, validate=True)
@@ -104,80 +253,277 @@ class PlaceList(Resource):
             traceback.print_exc()
             return {'error': f'Internal server error: {str(e)}'}, 500
 
-    @place_namespace.response(200, 'List of places retrieved successfully')
-    @place_namespace.marshal_list_with(place_list_model)
+    @place_namespace.doc(params={**page_params, **area_params, **filter_params, **ids_params})
+    @place_namespace.response(200, 'List of places retrieved successfully', place_page_model)
+    @place_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @place_namespace.response(400, 'Invalid pagination, area or filter parameters')
+    @response_cache.cached('places', 'amenities')
     def get(self):
-        """Retrieve a list of all places"""
+        """Retrieve a page of places, optionally within an area and filtered, or places by ids"""
         try:
-            places = facade.get_all_places()
-            return [{
-                'id': place.id,
-                'title': place.title,
-                'latitude': place.latitude,
-                'longitude': place.longitude,
-                'price': float(place.price) if place.price else 0,
-            } for place in places], 200
+            ids = ids_arg()
+            if ids is not None:
+                places = facade.get_many_places(ids)
+                etag = entity_tag(*[(place.id, place.updated_at, place.rating_sum,
+                                     place.review_count) for place in places.values()])
+                if is_fresh(etag):
+                    return not_modified(etag)
+                return multi_get(ids, places, place_item), 200, validators(etag)
+            limit, cursor = page_args()
+            area = area_args()
+            filters = filter_args()
+            # Reviews carry the ratings, amenities the facet names
+            etag = entity_tag(facade.get_table_versions('places', 'reviews', 'amenities'))
+            if is_fresh(etag):
+                return not_modified(etag)
+            if area:
+                boxes, origin, radius_km = area
+                results, next_cursor = facade.search_places(boxes, origin, limit, cursor,
+                                                            radius_km, PLACE_LIST_COLUMNS,
+                                                            filters)
+            else:
+                places, next_cursor = facade.get_places_page(limit, cursor, PLACE_LIST_COLUMNS,
+                                                             filters)
+                results = [(place, None) for place in places]
+            page = {
+                'items': [{
+                    **place_item(place),
+                    **({'distance_km': round(distance, 3)} if distance is not None else {})
+                } for place, distance in results],
+                'next_cursor': next_cursor
+            }
+            # Facets count the whole filtered catalogue, not an area
+            if not cursor and not area:
+                page['facets'] = facade.get_place_facets(filters)
+            return page, 200, validators(etag)
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': f'Internal server error: {str(e)}'}, 500
 
+# Rejected rows listed in an import report, the total is always given
+MAX_IMPORT_ERRORS = 1000
+
+import_error_model = place_namespace.model('PlaceImportError', {
+    'line': fields.Integer(description='Line of the row in the uploaded body'),
+    'error': fields.String(description='Why the row was rejected')
+})
+
+import_report_model = place_namespace.model('PlaceImportReport', {
+    'created': fields.Integer(description='Number of created places'),
+    'failed': fields.Integer(description='Number of rejected rows'),
+    'errors': fields.List(fields.Nested(import_error_model),
+                          description=f'The first {MAX_IMPORT_ERRORS} rejected rows')
+})
+
+@place_namespace.route('/import')
+class PlaceImport(Resource):
+    @jwt_required()
+    @place_namespace.doc(description='Send text/csv with a header line, amenities separated by '
+                                     'semicolons, or application/x-ndjson with one place per '
+                                     'line. Fields: ' + ', '.join(IMPORT_FIELDS) + '. '
+                                     'owner_id may name another owner for admins only.')
+    @place_namespace.response(200, 'Rows imported, invalid ones reported', import_report_model)
+    @place_namespace.response(415, 'Unsupported Content-Type')
+    def post(self):
+        """Import places in bulk from a CSV or NDJSON body
+
+        The body is streamed, not buffered: each chunk of rows is committed
+        in its own transaction as soon as it is read, outside the unit of
+        work of the request, so the database is never locked for the whole
+        upload. A failed chunk is reported on its rows, earlier chunks stay.
+        """
+        reader = READERS.get(request.mimetype)
+        if reader is None:
+            return {'error': f"Content-Type must be one of: {', '.join(READERS)}"}, 415
+        current_user_id = get_jwt_identity()
+        current_user = facade.get_user(current_user_id)
+        if not current_user:
+            return {'error': 'User not found'}, 404
+        try:
+            created, errors = facade.import_places(reader(request.stream), current_user_id,
+                                                   any_owner=current_user.is_admin)
+        except Exception as e:
+            return {'error': f'Internal server error: {str(e)}'}, 500
+        return {
+            'created': created,
+            'failed': len(errors),
+            'errors': [{'line': line, 'error': error}
+                       for line, error in errors[:MAX_IMPORT_ERRORS]]
+        }, 200
+
+search_params = {
+    'q': 'Words that must all appear in the title or description; end a word with * '
+         'to match it as a prefix'
+}
+
+place_search_model = place_namespace.model('PlaceSearchResult', {
+    'id': fields.String(description='Place ID'),
+    'title': fields.String(description='Title of the place'),
+    'price': fields.Float(description='Price per night'),
+    'latitude': fields.Float(description='Latitude of the place'),
+    'longitude': fields.Float(description='Longitude of the place'),
+    'rank': fields.Float(description='bm25 rank, lower is a better match'),
+    'title_html': fields.String(description='HTML-escaped title, matches wrapped in <mark>'),
+    'snippet': fields.String(description='HTML-escaped description excerpt around the matches')
+})
+
+place_search_page_model = place_namespace.model('PlaceSearchPage', {
+    'items': fields.List(fields.Nested(place_search_model), description='Best matches first'),
+    'next_cursor': fields.String(description='Cursor of the next page, null on the last page')
+})
+
+@place_namespace.route('/search')
+class PlaceSearch(Resource):
+    @place_namespace.doc(params={**search_params, **page_params})
+    @place_namespace.response(200, 'Matching places retrieved successfully',
+                              place_search_page_model)
+    @place_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @place_namespace.response(400, 'Missing query or invalid pagination parameters')
+    @response_cache.cached('places')
+    def get(self):
+        """Full-text search of places, best match first"""
+        try:
+            limit, cursor = page_args()
+            etag = entity_tag(facade.get_table_versions('places'))
+            if is_fresh(etag):
+                return not_modified(etag)
+            results, next_cursor = facade.search_places_text(
+                request.args.get('q', ''), limit, cursor, PLACE_LIST_COLUMNS)
+            return {
+                'items': [{
+                    'id': place.id,
+                    'title': place.title,
+                    'price': float(place.price) if place.price else 0,
+                    'latitude': place.latitude,
+                    'longitude': place.longitude,
+                    'rank': rank,
+                    'title_html': title_html,
+                    'snippet': snippet
+                } for place, rank, title_html, snippet in results],
+                'next_cursor': next_cursor
+            }, 200, validators(etag)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            return {'error': f'Internal server error: {str(e)}'}, 500
+
+DEFAULT_TOP = 10
+
+top_params = {
+    'limit': f'Number of places to return (1-{MAX_LIMIT}, default {DEFAULT_TOP})',
+    'amenity_id': 'Rank only the places having this amenity'
+}
+
+place_top_model = place_namespace.inherit('PlaceTop', place_list_model, {
+    'score': fields.Float(description='Bayesian average rating the places are ranked by')
+})
+
+place_top_list_model = place_namespace.model('PlaceTopList', {
+    'items': fields.List(fields.Nested(place_top_model), description='Best ranked first')
+})
+
+@place_namespace.route('/top')
+class PlaceTop(Resource):
+    @place_namespace.doc(params=top_params)
+    @place_namespace.response(200, 'Best rated places retrieved successfully',
+                              place_top_list_model)
+    @place_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @place_namespace.response(400, 'Invalid limit')
+    @place_namespace.response(404, 'Amenity not found')
+    @response_cache.cached('places')
+    def get(self):
+        """Best rated places by Bayesian average, optionally having an amenity"""
+        try:
+            limit = int(_number('limit', 1, MAX_LIMIT) or DEFAULT_TOP)
+            amenity_id = request.args.get('amenity_id') or None
+            if amenity_id is not None:
+                if not facade.get_amenity(amenity_id):
+                    return {'error': 'Amenity not found'}, 404
+                response_cache.add_tags(f'amenity:{amenity_id}')
+            etag = entity_tag(facade.get_table_versions('leaderboard', 'places'))
+            if is_fresh(etag):
+                return not_modified(etag)
+            top = facade.get_top_places(limit, amenity_id, PLACE_LIST_COLUMNS)
+            return {
+                'items': [{**place_item(place), 'score': round(score, 4)}
+                          for place, score in top]
+            }, 200, validators(etag)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            return {'error': f'Internal server error: {str(e)}'}, 500
+
+# Fields of the place detail, with the columns each one reads and its value
+DETAIL_FIELDS = {
+    'id': (('id',), lambda place: place.id),
+    'title': (('title',), lambda place: place.title),
+    'description': (('description',), lambda place: place.description),
+    'price': (('price',), lambda place: float(place.price) if place.price else None),
+    'latitude': (('latitude',), lambda place: place.latitude),
+    'longitude': (('longitude',), lambda place: place.longitude),
+    'owner_id': (('owner_id',), lambda place: place.owner_id),
+    'average_rating': (('rating_sum', 'review_count'), lambda place: place.average_rating),
+    'review_count': (('review_count',), lambda place: place.review_count),
+    'rating_histogram': (tuple(f'rating_{n}' for n in range(1, 6)),
+                         lambda place: place.rating_histogram)
+}
+
 @place_namespace.route('/<place_id>')
 class PlaceResource(Resource):
     # @jwt_required()
+    @place_namespace.doc(params=sparse_params(DETAIL_FIELDS, DETAIL_EMBEDS))
     @place_namespace.response(200, 'Place details retrieved successfully')
+    @place_namespace.response(304, 'Not modified since the If-None-Match ETag')
     @place_namespace.response(404, 'Place not found')
-    @place_namespace.response(400, 'Invalid input data')
+    @place_namespace.response(400, 'Invalid fields or include parameters')
+    @response_cache.cached()
     def get(self, place_id):
-        """Get place details by ID"""
-        print(f"🔍 Looking for place: {place_id}")
-        place = facade.get_place(place_id)
-        print(f"📦 Place found: {place is not None}")
-        if not place:
-            print("❌ Place NOT found in database!")
-            return {'error': 'Place not found'}, 404
+        """Get place details by ID, all fields and embeds unless fields or include is given"""
         try:
-            place = facade.get_place(place_id)
+            selected = names_arg('fields', DETAIL_FIELDS, DETAIL_FIELDS)
+            include = names_arg('include', DETAIL_EMBEDS, DETAIL_EMBEDS)
+            # Checked before the place and the embedded objects are loaded
+            version = facade.get_place_details_version(place_id, include)
+            etag = entity_tag(place_id, version)
+            if version and is_fresh(etag):
+                return not_modified(etag)
+            # The owner is loaded through owner_id, the cache tags name it
+            columns = [column for name in selected for column in DETAIL_FIELDS[name][0]]
+            columns += ['owner_id'] if 'owner' in include else []
+            place = facade.get_place_details(place_id, columns, include)
             if not place:
                 return {'error': 'Place not found'}, 404
 
-            owner = facade.get_user(place.owner_id)
-            if not owner:
-                return {'error': 'Owner not found'}, 404
-
-            amenities_data = []
-            for amenity in place.amenities:
-                amenities_data.append({
+            response = {'id': place.id}
+            response.update((name, DETAIL_FIELDS[name][1](place)) for name in selected)
+            response_cache.add_tags(f'place:{place.id}')
+            if 'owner' in include:
+                owner = place.owner
+                response_cache.add_tags(f'user:{place.owner_id}')
+                response['owner'] = {
+                    'id': owner.id,
+                    'first_name': owner.first_name,
+                    'last_name': owner.last_name,
+                    'email': owner.email
+                } if owner else None
+            if 'amenities' in include:
+                response_cache.add_tags(*[f'amenity:{amenity.id}' for amenity in place.amenities])
+                response['amenities'] = [{
                     'id': amenity.id,
                     'name': amenity.name
-                })
-
-            reviews_data = []
-            for review in place.reviews:
-                review_user = facade.get_user(review.user_id)
-                reviews_data.append({
+                } for amenity in place.amenities]
+            if 'reviews' in include:
+                response_cache.add_tags(*[f'user:{review.user_id}' for review in place.reviews])
+                response['reviews'] = [{
                     'id': review.id,
                     'text': review.text,
                     'rating': review.rating,
-                    'user_name': f"{review_user.first_name} {review_user.last_name}" if review_user else 'Unknown'
-                })
-            
-            response = {
-                'id': place.id,
-                'title': place.title,
-                'description': place.description,
-                'price': float(place.price) if place.price else None,
-                'latitude': place.latitude,
-                'longitude': place.longitude,
-                'owner_id': place.owner_id,
-                'owner': {
-                    'id': owner.id,
-                    'first_name': owner.first_name,
-                    'last_name': owner.last_name,
-                    'email': owner.email
-                } if owner else None,
-                'amenities': amenities_data,
-                'reviews': reviews_data
-            }
-            return response, 200
+                    'user_name': f"{review.author.first_name} {review.author.last_name}" if review.author else 'Unknown'
+                } for review in place.reviews]
+            return response, 200, validators(etag)
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': f'Internal server error: {str(e)}'}, 500
 
@@ -213,22 +559,15 @@ class PlaceResource(Resource):
 
 @place_namespace.route('/<place_id>/reviews')
 class PlaceReviews(Resource):
-    @place_namespace.response(200, 'List of reviews for the place retrieved successfully')
+    @place_namespace.doc(params=place_review_params)
+    @place_namespace.response(200, 'Reviews of the place retrieved successfully')
+    @place_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @place_namespace.response(400, 'Invalid pagination, sort or include parameters')
     @place_namespace.response(404, 'Place not found')
+    @response_cache.cached()
     def get(self, place_id):
-        """Get all reviews for a specific place"""
-        try:
-            reviews = facade.get_reviews_by_place(place_id)
-            return [{
-                'id': review.id,
-                'text': review.text,
-                'rating': review.rating,
-                'user_id': review.user.id
-            } for review in reviews], 200
-        except ValueError as e:
-            return {'error': str(e)}, 404
-        except Exception as e:
-            return {'error': f'Internal server error: {str(e)}'}, 500
+        """Retrieve a page of the reviews of a place, newest or best rated first"""
+        return place_reviews(place_id)
 
     @jwt_required()
     @place_namespace.response(200, 'Place deleted successfully')
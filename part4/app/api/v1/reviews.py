@@ -1,9 +1,34 @@
+from datetime import datetime
+from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services import facade
+from app.api.v1.pagination import page_args, page_params
+from app.api.v1.conditional import entity_tag, is_fresh, not_modified, validators
+from app.api.v1.sparse import names_arg, sparse_params
+from app.persistence.repository import ConflictError
+from app.persistence.job_queue import DONE
+from app.persistence.response_cache import response_cache
+from app.services.review_queue import review_queue
 
 review_namespace = Namespace('reviews', description='Review operations')
 
+# Columns read by the list endpoint, the other ones are never loaded
+REVIEW_LIST_COLUMNS = ('id', 'text', 'rating')
+
+# Columns the list endpoint may be asked for with ``fields``, and its embeds
+REVIEW_FIELDS = ('id', 'text', 'rating', 'user_id', 'place_id', 'created_at')
+REVIEW_EMBEDS = ('author',)
+
+# Columns read for the reviews of a place
+PLACE_REVIEW_COLUMNS = ('id', 'text', 'rating', 'user_id', 'created_at')
+
+place_review_params = {
+    **page_params,
+    'sort': 'newest (default) or rating, the best rated first',
+    'include': 'author to embed the name of each author'
+}
+
 review_model = review_namespace.model('Review', {
     'text': fields.String(required=True, description='Text of the review'),
     'rating': fields.Integer(required=True, description='Rating of the place (1-5)'),
@@ -26,33 +51,129 @@ review_response_model = review_namespace.model('ReviewResponse', {
     'place_id': fields.String(description='ID of the place')
 })
 
+review_author_model = review_namespace.model('ReviewAuthor', {
+    'first_name': fields.String(description='First name of the author'),
+    'last_name': fields.String(description='Last name of the author')
+})
+
 review_list_model = review_namespace.model('ReviewList', {
     'id': fields.String(description='Review ID'),
     'text': fields.String(description='Text of the review'),
-    'rating': fields.Integer(description='Rating of the place (1-5)')
+    'rating': fields.Integer(description='Rating of the place (1-5)'),
+    'user_id': fields.String(description='ID of the author, when requested in fields'),
+    'place_id': fields.String(description='ID of the place, when requested in fields'),
+    'created_at': fields.String(description='Creation time, when requested in fields'),
+    'author': fields.Nested(review_author_model, description='With include=author')
+})
+
+review_page_model = review_namespace.model('ReviewPage', {
+    'items': fields.List(fields.Nested(review_list_model), description='Reviews of this page'),
+    'next_cursor': fields.String(description='Cursor of the next page, null on the last page')
+})
+
+place_review_model = review_namespace.model('PlaceReviewItem', {
+    'id': fields.String(description='Review ID'),
+    'text': fields.String(description='Text of the review'),
+    'rating': fields.Integer(description='Rating of the place (1-5)'),
+    'user_id': fields.String(description='ID of the author'),
+    'created_at': fields.String(description='Creation time'),
+    'author': fields.Nested(review_author_model, description='With include=author')
+})
+
+place_review_page_model = review_namespace.model('PlaceReviewPage', {
+    'items': fields.List(fields.Nested(place_review_model), description='Reviews of this page'),
+    'next_cursor': fields.String(description='Cursor of the next page, null on the last page')
+})
+
+review_submission_model = review_namespace.model('ReviewSubmission', {
+    'id': fields.String(description='ID the review is written under'),
+    'status': fields.String(description='pending, running, done or failed'),
+    'status_url': fields.String(description='URL of this status'),
+    'review_url': fields.String(description='URL of the review, once done'),
+    'error': fields.String(description='Why the review was not written, once failed')
 })
 
+
+def place_reviews(place_id):
+    """Page of the reviews of a place, shared by both routes serving it."""
+    try:
+        limit, cursor = page_args()
+        sort = request.args.get('sort', 'newest')
+        include = names_arg('include', REVIEW_EMBEDS, ())
+        # Single-row validator query, None for an unknown place
+        version = facade.get_place_details_version(place_id, ('reviews',))
+        if version is None:
+            return {'error': 'Place not found'}, 404
+        etag = entity_tag(place_id, version)
+        if is_fresh(etag):
+            return not_modified(etag)
+        reviews, next_cursor = facade.get_place_reviews_page(
+            place_id, limit, cursor, sort, PLACE_REVIEW_COLUMNS, include)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        return {'error': f'Internal server error: {str(e)}'}, 500
+
+    response_cache.add_tags(f'place:{place_id}')
+    if 'author' in include:
+        response_cache.add_tags(*[f'user:{review.user_id}' for review in reviews])
+    return {
+        'items': [{
+            'id': review.id,
+            'text': review.text,
+            'rating': review.rating,
+            'user_id': review.user_id,
+            'created_at': review.created_at.isoformat(),
+            **({'author': {
+                'first_name': review.author_first_name,
+                'last_name': review.author_last_name
+            }} if 'author' in include else {})
+        } for review in reviews],
+        'next_cursor': next_cursor
+    }, 200, validators(etag)
+
+def submission(job):
+    """Status of a queued review, with the URL of the review once written."""
+    data = {
+        'id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/v1/reviews/submissions/{job['id']}"
+    }
+    if job['status'] == DONE:
+        data['review_url'] = f"/api/v1/reviews/{job['id']}"
+    elif job['error']:
+        data['error'] = job['error']
+    return data
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
 @review_namespace.route('/')
 class ReviewList(Resource):
     @review_namespace.expect(review_model, validate=True)
     @jwt_required()
     @review_namespace.response(201, 'Review successfully created')
+    @review_namespace.response(202, 'Review queued, see its status_url',
+                               review_submission_model)
     @review_namespace.response(400, 'Invalid input data')
     @review_namespace.response(404, 'User or place not found')
+    @review_namespace.response(409, 'Place already reviewed by this user')
     def post(self):
-        """Register a new review"""
+        """Register a new review, or queue it when the review queue is enabled"""
         current_user_id = get_jwt_identity()
         
         review_data = review_namespace.payload
         review_data['user_id'] = current_user_id
-        
-        place = facade.get_place(review_data['place_id'])
-        if place.owner_id == current_user_id:
-            return {'error': 'You cannot review your own place'}, 400
-        
+
         try:
+            if review_queue.enabled:
+                job = review_queue.get(review_queue.submit(review_data))
+                data = submission(job)
+                return data, 202, {'Location': data['status_url']}
             new_review = facade.create_review(review_data)
             return new_review.to_dict(), 201
+        except ConflictError as e:
+            return {'error': str(e)}, 409
         except ValueError as e:
             if "not found" in str(e).lower():
                 return {'error': str(e)}, 404
@@ -61,17 +182,57 @@ class ReviewList(Resource):
         except Exception as e:
             return {'error': f'Internal server error: {str(e)}'}, 500
 
-    @review_namespace.response(200, 'List of reviews retrieved successfully')
-    @review_namespace.marshal_list_with(review_list_model)
+    @review_namespace.doc(params={**page_params, **sparse_params(REVIEW_FIELDS, REVIEW_EMBEDS)})
+    @review_namespace.response(200, 'List of reviews retrieved successfully', review_page_model)
+    @review_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @review_namespace.response(400, 'Invalid pagination, fields or include parameters')
     def get(self):
-        """Retrieve a list of all reviews"""
+        """Retrieve a page of reviews, with only the requested fields"""
         try:
-            reviews = facade.get_all_reviews()
-            return [{
-                'id': review.id,
-                'text': review.text,
-                'rating': review.rating
-            } for review in reviews], 200
+            limit, cursor = page_args()
+            selected = names_arg('fields', REVIEW_FIELDS, REVIEW_LIST_COLUMNS)
+            include = names_arg('include', REVIEW_EMBEDS, ())
+            # Authors are embedded with their names, which are not in reviews
+            tables = ('reviews', 'users') if 'author' in include else ('reviews',)
+            etag = entity_tag(facade.get_table_versions(*tables))
+            if is_fresh(etag):
+                return not_modified(etag)
+            reviews, next_cursor = facade.get_reviews_page(limit, cursor, selected or ('id',),
+                                                           include)
+            return {
+                'items': [{
+                    'id': review.id,
+                    **{name: _json_value(getattr(review, name)) for name in selected},
+                    **({'author': {
+                        'first_name': review.author_first_name,
+                        'last_name': review.author_last_name
+                    }} if 'author' in include else {})
+                } for review in reviews],
+                'next_cursor': next_cursor
+            }, 200, validators(etag)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            return {'error': f'Internal server error: {str(e)}'}, 500
+
+@review_namespace.route('/submissions/<review_id>')
+class ReviewSubmission(Resource):
+    @jwt_required()
+    @review_namespace.response(200, 'Status of the queued review', review_submission_model)
+    @review_namespace.response(403, 'Review submitted by another user')
+    @review_namespace.response(404, 'Submission not found')
+    def get(self, review_id):
+        """Get the status of a review queued by POST /reviews/"""
+        try:
+            job = review_queue.get(review_id) if review_queue.enabled else None
+            if not job:
+                return {'error': 'Submission not found'}, 404
+            current_user_id = get_jwt_identity()
+            if job['payload']['user_id'] != current_user_id:
+                current_user = facade.get_user(current_user_id)
+                if not current_user or not current_user.is_admin:
+                    return {'error': 'You can only see your own submissions'}, 403
+            return submission(job), 200
         except Exception as e:
             return {'error': f'Internal server error: {str(e)}'}, 500
 
@@ -140,20 +301,13 @@ class ReviewResource(Resource):
 
 @review_namespace.route('/places/<place_id>/reviews')
 class PlaceReviewList(Resource):
-    @review_namespace.response(200, 'List of reviews for the place retrieved successfully')
+    @review_namespace.doc(params=place_review_params)
+    @review_namespace.response(200, 'Reviews of the place retrieved successfully',
+                               place_review_page_model)
+    @review_namespace.response(304, 'Not modified since the If-None-Match ETag')
+    @review_namespace.response(400, 'Invalid pagination, sort or include parameters')
     @review_namespace.response(404, 'Place not found')
-    @review_namespace.marshal_list_with(review_list_model)
-
+    @response_cache.cached()
     def get(self, place_id):
-        """Get all reviews for a specific place"""
-        try:
-            reviews = facade.get_reviews_by_place(place_id)
-            return [{
-                'id': review.id,
-                'text': review.text,
-                'rating': review.rating
-            } for review in reviews], 200
-        except ValueError as e:
-            return {'error': str(e)}, 404
-        except Exception as e:
-            return {'error': f'Internal server error: {str(e)}'}, 500
+        """Retrieve a page of the reviews of a place, same as /places/<place_id>/reviews"""
+        return place_reviews(place_id)
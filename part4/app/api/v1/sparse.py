@@ -0,0 +1,26 @@
+from flask import request
+
+
+def sparse_params(fields, include=()):
+    """Swagger descriptions of the ``fields`` and ``include`` parameters."""
+    params = {'fields': 'Comma-separated fields to return, among: ' + ', '.join(fields)}
+    if include:
+        params['include'] = 'Comma-separated related objects to embed, among: ' + \
+            ', '.join(include)
+    return params
+
+
+def names_arg(name, allowed, default):
+    """Read a comma-separated list parameter such as ``fields`` or ``include``.
+
+    Returns ``default`` when the parameter is absent, while an empty value
+    selects nothing. Raises ValueError for names outside ``allowed``.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return tuple(default)
+    names = tuple(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+    unknown = [part for part in names if part not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+    return names
@@ -1,9 +1,13 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.facade import facade
+from app.api.v1.pagination import ids_arg, ids_params, multi_get, page_args, page_params
 
 user_namespace = Namespace('users', description='User operations')
 
+# Columns read by the list endpoint, the other ones are never loaded
+USER_LIST_COLUMNS = ('id', 'first_name', 'last_name', 'email')
+
 user_model = user_namespace.model('User', {
     'first_name': fields.String(required=True, description='First name of the user'),
     'last_name': fields.String(required=True, description='Last name of the user'),
@@ -18,6 +22,14 @@ user_update_model = user_namespace.model('UserUpdate', {
     'password': fields.String(required=False, description='Password of the user')
 })
 
+def user_item(user):
+    return {
+        'id': user.id,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email
+    }
+
 @user_namespace.route('/')
 class UserList(Resource):
     @user_namespace.expect(user_model, validate=True)
@@ -42,12 +54,8 @@ class UserList(Resource):
             return {'error': 'Email already registered'}, 400
         
         try:
-            user_data_copy = user_data.copy()
-            password = user_data_copy.pop('password')
-            new_user = facade.create_user(user_data_copy)
-            new_user.hash_password(password)
-            facade.update_user(new_user.id, {'password': new_user.password})
-            
+            new_user = facade.create_user(user_data)
+
             return {
                 'id': new_user.id, 
                 'first_name': new_user.first_name, 
@@ -60,15 +68,22 @@ class UserList(Resource):
             return {'error': f'Internal server error: {str(e)}'}, 500
     
     @jwt_required()
+    @user_namespace.doc(params={**page_params, **ids_params})
+    @user_namespace.response(400, 'Invalid pagination or ids parameters')
     def get(self):
-        """Get all users"""
-        users = facade.get_all_users()
-        return [{
-            'id': user.id,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'email': user.email
-        } for user in users], 200
+        """Get a page of users, or users by ids"""
+        try:
+            ids = ids_arg()
+            if ids is not None:
+                return multi_get(ids, facade.get_many_users(ids), user_item), 200
+            limit, cursor = page_args()
+            users, next_cursor = facade.get_users_page(limit, cursor, USER_LIST_COLUMNS)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return {
+            'items': [user_item(user) for user in users],
+            'next_cursor': next_cursor
+        }, 200
 
 @user_namespace.route('/<string:user_id>')
 class UserResource(Resource):
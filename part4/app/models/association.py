@@ -4,5 +4,7 @@ from app import db
 place_amenity = db.Table('place_amenity',
     db.Column('place_id', db.String(36), db.ForeignKey('places.id'), primary_key=True),
     db.Column('amenity_id', db.String(36), db.ForeignKey('amenities.id'), primary_key=True),
-    db.Column('created_at', db.DateTime, default=db.func.now())
+    db.Column('created_at', db.DateTime, default=db.func.now()),
+    # The primary key leads with place_id; this one serves lookups by amenity
+    db.Index('idx_place_amenity_amenity_id_place_id', 'amenity_id', 'place_id')
 )
@@ -1,13 +1,20 @@
 from app import db
 import uuid
 from datetime import datetime
+from sqlalchemy.orm import declared_attr
 
 class BaseModel(db.Model):
     __abstract__ = True
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # ← ID ici
-    created_at = db.Column(db.DateTime, default=db.func.now())
-    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+    # Python-side timestamps keep microsecond precision and a single storage
+    # format, which the (created_at, id) keyset pagination relies on
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (db.Index(f'idx_{cls.__tablename__}_created_at_id', 'created_at', 'id'),)
 
     def to_dict(self):
         return {
@@ -1,11 +1,22 @@
-from flask_restx import fields
 from app import db
 from .base_model import BaseModel
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import validates
+from app.persistence.geo import PLACES_RTREE_DDL
+from app.persistence.text_search import PLACES_FTS_DDL
 from .association import place_amenity
 
+def average_rating(rating_sum, review_count):
+    """Average of the ratings rounded to 2 decimals, None without reviews."""
+    return round(rating_sum / review_count, 2) if review_count else None
+
+
 class Place(BaseModel):
     __tablename__ = 'places'
+    __table_args__ = (
+        db.Index('idx_places_created_at_id', 'created_at', 'id'),
+        db.Index('idx_places_price', 'price'),
+    )
 
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -14,6 +25,15 @@ class Place(BaseModel):
     longitude = db.Column(db.Float, nullable=False)
     owner_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
 
+    # Rating aggregates, maintained on every review write by app.persistence.ratings
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     reviews = db.relationship('Review', backref='place', lazy=True, cascade='all, delete-orphan')
     amenities = db.relationship('Amenity', secondary=place_amenity, 
                                backref=db.backref('places', lazy=True), lazy=True)
@@ -44,6 +64,14 @@ class Place(BaseModel):
             raise ValueError("Longitude must be between -180 and 180")
         return longitude
 
+    @property
+    def average_rating(self):
+        return average_rating(self.rating_sum, self.review_count)
+
+    @property
+    def rating_histogram(self):
+        return {str(n): getattr(self, f'rating_{n}') for n in range(1, 6)}
+
     def to_dict(self):
         base_dict = super().to_dict()
         base_dict.update({
@@ -52,8 +80,19 @@ class Place(BaseModel):
             'price': float(self.price) if self.price else None,
             'latitude': self.latitude,
             'longitude': self.longitude,
-            'price': fields.Float(description='Price per night'),
             'owner_id': self.owner_id,
+            'average_rating': self.average_rating,
+            'review_count': self.review_count,
+            'rating_histogram': self.rating_histogram,
             'amenities': [amenity.to_dict() for amenity in self.amenities] if self.amenities else []
         })
         return base_dict
+
+
+# Keep the R*Tree of coordinates and the full-text index alongside the table,
+# see app.persistence.geo and app.persistence.text_search
+for statement in PLACES_RTREE_DDL + PLACES_FTS_DDL:
+    event.listen(Place.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for index_table in ('places_rtree', 'places_fts'):
+    event.listen(Place.__table__, 'before_drop',
+                 DDL(f"DROP TABLE IF EXISTS {index_table}").execute_if(dialect='sqlite'))
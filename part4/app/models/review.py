@@ -4,6 +4,15 @@ from sqlalchemy.orm import validates
 
 class Review(BaseModel):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('idx_reviews_created_at_id', 'created_at', 'id'),
+        # The sort keys of the reviews of a place, newest or best rated first;
+        # the second also covers the per-place counts of repair_ratings
+        db.Index('idx_reviews_place_id_created_at_id', 'place_id', 'created_at', 'id'),
+        db.Index('idx_reviews_place_id_rating_id', 'place_id', 'rating', 'id'),
+        # One review per user and place; an index so upgrade_schema can add it
+        db.Index('uq_reviews_user_id_place_id', 'user_id', 'place_id', unique=True),
+    )
 
     text = db.Column(db.Text, nullable=False)
     rating = db.Column(db.Integer, nullable=False)
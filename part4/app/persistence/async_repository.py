@@ -0,0 +1,243 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from app.persistence.cache import entity_cache
+from app.persistence.repository import (
+    DEFAULT_CHUNK_SIZE, chunked, decode_cursor, encode_cursor, keyset_after
+)
+
+# Session of the async unit of work running in the current task, if any
+_current_session = ContextVar('hbnb_async_session', default=None)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_database_uri(uri):
+    """Turn a sync database URI into its asyncio driver equivalent.
+
+    ``sqlite:///hbnb.db`` becomes ``sqlite+aiosqlite:///hbnb.db``; URIs that
+    already name a driver are returned unchanged.
+    """
+    scheme, separator, rest = uri.partition('://')
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+def async_session_factory(engine):
+    """Return a sessionmaker producing AsyncSessions bound to ``engine``.
+
+    Objects are not expired on commit: an AsyncSession cannot lazily refresh
+    them afterwards, so they must stay readable once returned to the caller.
+    """
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def after_commit(session, callback):
+    """Call ``callback`` once the unit of work of ``session`` committed.
+
+    Callbacks of a unit of work that rolls back are dropped.
+    """
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+@asynccontextmanager
+async def async_unit_of_work(session_factory):
+    """Run the enclosed repository calls in one AsyncSession and one commit.
+
+    The session is bound to the current task through a context variable, so
+    nested units of work and repository calls join it and only flush. The
+    transaction is rolled back if the block raises; otherwise the callbacks
+    registered with ``after_commit`` run after the commit.
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        await session.flush()
+        return
+    async with session_factory() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            session.info.pop('after_commit', None)
+            await session.rollback()
+            raise
+        finally:
+            _current_session.reset(token)
+        for callback in session.info.pop('after_commit', ()):
+            callback()
+
+
+class AsyncSQLAlchemyRepository:
+    """Asyncio counterpart of SQLAlchemyRepository built on AsyncSession.
+
+    Every call runs in its own unit of work unless one is already open. Lazy
+    loading is not available on an AsyncSession, so relationships the callers
+    read must be listed in ``options`` (e.g. ``selectinload`` loaders) and are
+    loaded together with the objects. Once their unit of work commits, writes
+    invalidate the entries of the written objects in the process-local
+    ``cache`` read by the synchronous repositories.
+    """
+
+    def __init__(self, model, session_factory, options=(), cache=entity_cache):
+        self.model = model
+        self.session_factory = session_factory
+        self.options = tuple(options)
+        self.cache = cache
+
+    def session(self):
+        return async_unit_of_work(self.session_factory)
+
+    def select(self):
+        return select(self.model).options(*self.options)
+
+    async def add(self, obj):
+        async with self.session() as session:
+            session.add(obj)
+        return obj
+
+    async def get(self, obj_id):
+        async with self.session() as session:
+            return await session.get(self.model, obj_id, options=self.options)
+
+    async def get_all(self):
+        async with self.session() as session:
+            return (await session.scalars(self.select())).all()
+
+    async def get_page(self, limit, cursor=None, columns=None):
+        """Return up to ``limit`` objects ordered by (created_at, id) and the next cursor.
+
+        With ``columns``, named rows holding only those columns are returned
+        instead of ORM instances.
+        """
+        keys = [(self.model.created_at, False), (self.model.id, False)]
+        return await self.paginate(self.project(columns), keys, limit, cursor)
+
+    def project(self, columns=None):
+        """Select the model, or only the given column names when ``columns`` is set."""
+        if not columns:
+            return self.select()
+        names = dict.fromkeys([*columns, 'id', 'created_at'])
+        return select(*[getattr(self.model, name) for name in names])
+
+    async def paginate(self, statement, keys, limit, cursor=None):
+        """Keyset-paginate ``statement`` on ``keys``, a list of (column, descending) pairs."""
+        if cursor:
+            values = decode_cursor(cursor, [column for column, _ in keys])
+            statement = statement.where(keyset_after(keys, values))
+        order = [column.desc() if descending else column.asc() for column, descending in keys]
+        statement = statement.order_by(*order).limit(limit + 1)
+        async with self.session() as session:
+            result = await session.execute(statement)
+            # Whole entities come back as instances, projected columns as named rows
+            selected = statement.column_descriptions
+            entities = len(selected) == 1 and selected[0]['expr'] is selected[0]['entity']
+            rows = result.scalars().all() if entities else result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([getattr(rows[-1], column.key) for column, _ in keys])
+        return rows, next_cursor
+
+    async def update(self, obj_id, data):
+        async with self.session() as session:
+            obj = await session.get(self.model, obj_id, options=self.options)
+            if obj:
+                for key, value in data.items():
+                    if hasattr(obj, key):
+                        setattr(obj, key, value)
+            self._invalidate(session, [obj_id])
+        return obj
+
+    async def delete(self, obj_id):
+        async with self.session() as session:
+            obj = await session.get(self.model, obj_id, options=self._cascades())
+            if obj:
+                await session.delete(obj)
+            self._invalidate(session, [obj_id])
+        return obj is not None
+
+    async def get_by_attribute(self, attr_name, attr_value):
+        async with self.session() as session:
+            statement = self.select().filter_by(**{attr_name: attr_value}).limit(1)
+            return (await session.scalars(statement)).first()
+
+    async def get_all_by_attribute(self, attr_name, attr_value):
+        """Return every object whose ``attr_name`` equals ``attr_value``."""
+        async with self.session() as session:
+            statement = self.select().filter_by(**{attr_name: attr_value})
+            return (await session.scalars(statement)).all()
+
+    async def get_many(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Return a dict of the objects found for ``obj_ids``, keyed by id."""
+        found = {}
+        async with self.session() as session:
+            for chunk in chunked(set(obj_ids), chunk_size):
+                statement = self.select().where(self.model.id.in_(chunk))
+                for obj in await session.scalars(statement):
+                    found[obj.id] = obj
+        return found
+
+    async def add_many(self, objs, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Insert ``objs`` chunk by chunk inside a single transaction."""
+        objs = list(objs)
+        async with self.session() as session:
+            for chunk in chunked(objs, chunk_size):
+                session.add_all(chunk)
+                await session.flush()
+        return objs
+
+    async def update_many(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Apply ``updates``, a dict of id to data, inside a single transaction."""
+        updated = []
+        async with self.session() as session:
+            for chunk in chunked(updates, chunk_size):
+                statement = self.select().where(self.model.id.in_(chunk))
+                for obj in await session.scalars(statement):
+                    for key, value in updates[obj.id].items():
+                        if hasattr(obj, key):
+                            setattr(obj, key, value)
+                    updated.append(obj)
+                await session.flush()
+            self._invalidate(session, updates)
+        return updated
+
+    async def delete_many(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Delete the objects of ``obj_ids`` inside a single transaction.
+
+        Returns the number of deleted objects.
+        """
+        obj_ids = list(obj_ids)
+        deleted = 0
+        async with self.session() as session:
+            for chunk in chunked(set(obj_ids), chunk_size):
+                statement = select(self.model).options(*self._cascades()) \
+                    .where(self.model.id.in_(chunk))
+                for obj in await session.scalars(statement):
+                    await session.delete(obj)
+                    deleted += 1
+                await session.flush()
+            self._invalidate(session, obj_ids)
+        return deleted
+
+    def _invalidate(self, session, obj_ids):
+        # Once the outermost unit of work commits: until then the old rows
+        # are still the committed ones, and may be cached again by readers
+        keys = [(self.model.__name__, obj_id) for obj_id in obj_ids]
+
+        def invalidate():
+            for key in keys:
+                self.cache.invalidate(key)
+        after_commit(session, invalidate)
+
+    def _cascades(self):
+        # Collections a delete cascades to must be loaded up front
+        return [selectinload(getattr(self.model, rel.key))
+                for rel in self.model.__mapper__.relationships if rel.cascade.delete]
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class FrequencySketch:
+    """Count-min sketch estimating how often keys were requested recently.
+
+    Counters are halved every ``sample_size`` increments so that popularity
+    fades out and the sketch keeps a fixed memory footprint.
+    """
+
+    DEPTH = 4
+
+    def __init__(self, width, sample_size):
+        self.width = max(16, width)
+        self.sample_size = max(1, sample_size)
+        self._rows = [[0] * self.width for _ in range(self.DEPTH)]
+        self._additions = 0
+
+    def _slots(self, key):
+        return [(row, hash((row, key)) % self.width) for row in range(self.DEPTH)]
+
+    def increment(self, key):
+        for row, slot in self._slots(key):
+            self._rows[row][slot] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key):
+        return min(self._rows[row][slot] for row, slot in self._slots(key))
+
+    def _age(self):
+        self._rows = [[count // 2 for count in row] for row in self._rows]
+        self._additions //= 2
+
+
+class EntityCache:
+    """Process-local LRU cache with TTL and frequency-aware admission.
+
+    When the cache is full, a new key only replaces the least recently used
+    entry if it has been requested more often than that entry (TinyLFU), so a
+    scan over cold ids cannot flush the hot ones out.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60, enabled=False):
+        self._lock = threading.Lock()
+        self.configure(maxsize, ttl, enabled)
+
+    def init_app(self, app):
+        self.configure(app.config.get('ENTITY_CACHE_SIZE', 10000),
+                       app.config.get('ENTITY_CACHE_TTL', 60),
+                       app.config.get('ENTITY_CACHE_ENABLED', False))
+        if not event.contains(Session, 'after_flush', _record_flushed):
+            event.listen(Session, 'after_flush', _record_flushed)
+            event.listen(Session, 'after_commit', _invalidate_committed)
+            event.listen(Session, 'after_soft_rollback', _invalidate_rolled_back)
+
+    def configure(self, maxsize, ttl, enabled=True):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self.enabled = enabled
+            self._entries = OrderedDict()
+            self._sketch = FrequencySketch(maxsize, maxsize * 10)
+            self.hits = self.misses = self.evictions = self.rejections = 0
+
+    def get(self, key):
+        """Return the cached value of ``key``, or None on a miss"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sketch.increment(key)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            if key in self._entries:
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+                return
+            if len(self._entries) >= self.maxsize:
+                victim = next(iter(self._entries))
+                if self._sketch.estimate(key) <= self._sketch.estimate(victim):
+                    self.rejections += 1
+                    return
+                del self._entries[victim]
+                self.evictions += 1
+            self._entries[key] = (value, expires_at)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # Until its transaction commits, a write is only flushed: another thread
+    # may still read the old row and cache it, and rows read back by the
+    # writer are not committed. The keys written and stored by a session are
+    # kept in its info and dropped again when the transaction ends.
+    def invalidate_written(self, session, key):
+        """Drop ``key``, written by ``session``, now and again once its transaction ends."""
+        self.invalidate(key)
+        session.info.setdefault('entity_cache_written', set()).add(key)
+
+    def put_read(self, session, key, value):
+        """Store ``value`` read by ``session``, unless the session wrote ``key``.
+
+        Dropped again if the transaction rolls back.
+        """
+        if key in session.info.get('entity_cache_written', ()):
+            return
+        self.put(key, value)
+        session.info.setdefault('entity_cache_stored', set()).add(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'rejections': self.rejections
+            }
+
+
+entity_cache = EntityCache()
+
+
+def _record_flushed(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        identity = inspect(obj).mapper.primary_key_from_instance(obj)
+        if len(identity) == 1:
+            entity_cache.invalidate_written(session, (type(obj).__name__, identity[0]))
+
+
+def _invalidate_committed(session):
+    session.info.pop('entity_cache_stored', None)
+    for key in session.info.pop('entity_cache_written', ()):
+        entity_cache.invalidate(key)
+
+
+def _invalidate_rolled_back(session, previous_transaction):
+    # A savepoint rollback leaves the keys to the end of the outer transaction
+    if previous_transaction.nested:
+        return
+    for key in (*session.info.pop('entity_cache_written', ()),
+                *session.info.pop('entity_cache_stored', ())):
+        entity_cache.invalidate(key)
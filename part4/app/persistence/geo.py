@@ -0,0 +1,97 @@
+"""Geographic helpers and the SQLite R*Tree index of place coordinates.
+
+``places_rtree`` holds one zero-area box per place, keyed by the rowid of
+the ``places`` row and carrying the place id as an auxiliary column. It is
+kept in sync by triggers on ``places``, so a bounding-box search touches
+only the R*Tree nodes overlapping the box instead of scanning every place.
+
+``haversine_km`` is also registered as an SQL function on every SQLite
+connection, so searches order, filter and page by distance in the query.
+"""
+import math
+import sqlite3
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, event, func
+from sqlalchemy.engine import Engine
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Not part of db.metadata: create_all cannot create virtual tables
+places_rtree = Table(
+    'places_rtree', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('min_lat', Float), Column('max_lat', Float),
+    Column('min_lon', Float), Column('max_lon', Float),
+    Column('place_id', String(36))
+)
+
+PLACES_RTREE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree "
+    "USING rtree(id, min_lat, max_lat, min_lon, max_lon, +place_id)",
+    "CREATE TRIGGER IF NOT EXISTS places_rtree_insert AFTER INSERT ON places BEGIN "
+    "INSERT INTO places_rtree VALUES "
+    "(new.rowid, new.latitude, new.latitude, new.longitude, new.longitude, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS places_rtree_update AFTER UPDATE OF latitude, longitude "
+    "ON places BEGIN UPDATE places_rtree SET min_lat = new.latitude, max_lat = new.latitude, "
+    "min_lon = new.longitude, max_lon = new.longitude WHERE id = new.rowid; END",
+    "CREATE TRIGGER IF NOT EXISTS places_rtree_delete AFTER DELETE ON places BEGIN "
+    "DELETE FROM places_rtree WHERE id = old.rowid; END",
+)
+
+# VACUUM may renumber the rowids of places, run this afterwards
+REBUILD_PLACES_RTREE = (
+    "DELETE FROM places_rtree",
+    "INSERT INTO places_rtree SELECT rowid, latitude, latitude, longitude, longitude, id "
+    "FROM places",
+)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres between two points given in degrees."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('haversine_km', 4, haversine_km, deterministic=True)
+
+
+def distance_km(dialect_name, lat, lon, latitude, longitude):
+    """SQL expression of ``haversine_km`` from the point (lat, lon) to the given columns."""
+    if dialect_name == 'sqlite':
+        return func.haversine_km(lat, lon, latitude, longitude)
+    phi1, phi2 = math.radians(lat), func.radians(latitude)
+    a = func.power(func.sin((phi2 - phi1) / 2), 2) + math.cos(phi1) * func.cos(phi2) \
+        * func.power(func.sin(func.radians(longitude - lon) / 2), 2)
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def split_bbox(min_lon, min_lat, max_lon, max_lat):
+    """Return (min_lat, max_lat, min_lon, max_lon) boxes covering a bbox.
+
+    A box whose west edge is east of its east edge crosses the antimeridian
+    and is split in two.
+    """
+    if min_lon <= max_lon:
+        return [(min_lat, max_lat, min_lon, max_lon)]
+    return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+
+
+def boxes_around(lat, lon, radius_km):
+    """Return boxes, as split_bbox does, that contain the circle around a point."""
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle covers a pole: every longitude is in range
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+    delta_lon = math.degrees(math.asin(math.sin(radius_km / EARTH_RADIUS_KM)
+                                       / math.cos(math.radians(lat))))
+    if delta_lon >= 180:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    west = (lon - delta_lon + 540) % 360 - 180
+    east = (lon + delta_lon + 540) % 360 - 180
+    return split_bbox(west, min_lat, east, max_lat)
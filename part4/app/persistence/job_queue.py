@@ -0,0 +1,116 @@
+"""Durable queue of jobs in a local SQLite journal.
+
+A job is a JSON payload under a caller-chosen id. Jobs are claimed in
+the order they were enqueued, in batches, by setting them ``running``
+with a lease: a claim whose writer died is taken again once the lease
+expired, so a job is processed at least once. Finished jobs stay in the
+journal as ``done`` or ``failed`` for their status to be read, and are
+pruned after a retention delay.
+
+The file is shared by the worker processes of a host, like the SQLite
+backend of the response cache; each thread uses its own connection.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+
+class JobQueue:
+    """Jobs journaled in the SQLite file at ``path``."""
+
+    SCHEMA = (
+        "PRAGMA journal_mode = WAL",
+        "CREATE TABLE IF NOT EXISTS jobs (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "id TEXT NOT NULL UNIQUE, payload TEXT NOT NULL, status TEXT NOT NULL, "
+        "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, enqueued_at REAL NOT NULL, "
+        "claimed_at REAL, finished_at REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_seq ON jobs(status, seq)",
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # An accepted job must survive a crash of the host
+            connection.execute("PRAGMA synchronous = FULL")
+            self._local.connection = connection
+        return connection
+
+    def enqueue(self, job_id, payload):
+        self._connect().execute(
+            "INSERT INTO jobs (id, payload, status, enqueued_at) VALUES (?, ?, ?, ?)",
+            (job_id, json.dumps(payload), PENDING, time.time()))
+
+    def claim(self, limit, lease):
+        """Mark up to ``limit`` jobs running, the oldest first, and return them.
+
+        Jobs still running after ``lease`` seconds are claimed again.
+        Returns (id, payload, attempts) tuples in enqueue order.
+        """
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(
+                "UPDATE jobs SET status = ?, claimed_at = ?, attempts = attempts + 1 "
+                "WHERE seq IN (SELECT seq FROM jobs WHERE status = ? "
+                "OR (status = ? AND claimed_at < ?) ORDER BY seq LIMIT ?) "
+                "RETURNING seq, id, payload, attempts",
+                (RUNNING, now, PENDING, RUNNING, now - lease, limit)).fetchall()
+        return [(job_id, json.loads(payload), attempts)
+                for _, job_id, payload, attempts in sorted(rows)]
+
+    def finish(self, done, failed):
+        """Record the outcome of claimed jobs: ``done`` ids and {id: error} ``failed``."""
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "UPDATE jobs SET status = ?, error = NULL, finished_at = ? WHERE id = ?",
+                [(DONE, now, job_id) for job_id in done])
+            connection.executemany(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                [(FAILED, error, now, job_id) for job_id, error in failed.items()])
+
+    def release(self, job_ids, error, max_attempts):
+        """Put claimed jobs back to pending, or fail those out of attempts."""
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, finished_at = CASE WHEN attempts >= ? THEN ? END WHERE id = ?",
+                [(max_attempts, FAILED, PENDING, error, max_attempts, now, job_id)
+                 for job_id in job_ids])
+
+    def get(self, job_id):
+        """The status of a job as a dict, or None if it is unknown."""
+        row = self._connect().execute(
+            "SELECT id, payload, status, attempts, error FROM jobs WHERE id = ?",
+            (job_id,)).fetchone()
+        if row is None:
+            return None
+        job_id, payload, status, attempts, error = row
+        return {'id': job_id, 'payload': json.loads(payload), 'status': status,
+                'attempts': attempts, 'error': error}
+
+    def prune(self, retention):
+        """Delete the jobs finished more than ``retention`` seconds ago."""
+        self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - retention))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM jobs")
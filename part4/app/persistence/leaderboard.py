@@ -0,0 +1,118 @@
+"""Leaderboard of the best rated places, overall and per amenity.
+
+``leaderboard`` holds one row per reviewed place and scope: the scope ''
+ranks every place, and a scope per amenity ranks the places having it.
+Each row carries the Bayesian average of the place,
+
+    (weight * mean + rating_sum) / (weight + review_count)
+
+which pulls the average of places with few reviews towards a prior
+``mean``, as if each had ``weight`` extra reviews of that rating. The
+prior is fixed by configuration rather than taken from the live mean of
+all reviews, so a new review only rewrites the rows of its own place.
+
+The rows of a place are rewritten whenever ``app.persistence.ratings``
+changes its aggregates, and when its amenities change, in the same
+transaction. The top k of a scope is then a read of k entries of the
+(scope, score, place_id) index. ``rebuild`` recomputes everything, to
+be run after changing the prior.
+"""
+import click
+from sqlalchemy import Float, cast, delete, event, insert, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+from app import db
+from app.models.amenity import Amenity
+from app.models.association import place_amenity
+from app.models.place import Place
+from app.persistence.repository import DEFAULT_CHUNK_SIZE, chunked
+from app.persistence.versions import bump
+
+# Scope of the ranking of all places
+ALL_PLACES = ''
+
+# Derived from places and place_amenity, like the text and R*Tree indexes:
+# no foreign keys, so deleting a place never waits on its entries
+leaderboard = db.Table(
+    'leaderboard',
+    db.Column('scope', db.String(36), primary_key=True),
+    db.Column('place_id', db.String(36), primary_key=True),
+    db.Column('score', db.Float, nullable=False),
+    db.Column('review_count', db.Integer, nullable=False),
+    db.Index('idx_leaderboard_scope_score_place_id', 'scope', 'score', 'place_id'),
+    db.Index('idx_leaderboard_place_id', 'place_id')
+)
+
+places = Place.__table__
+
+# Prior of the Bayesian average, set from the configuration by init_app
+prior = {'mean': 3.0, 'weight': 5}
+
+
+def bayesian_score(rating_sum, review_count):
+    weight, mean = prior['weight'], prior['mean']
+    return (cast(rating_sum, Float) + weight * mean) / (review_count + float(weight))
+
+
+def _entries(place_ids=None):
+    """Select the leaderboard rows of the reviewed places of ``place_ids``, or of all."""
+    score = bayesian_score(places.c.rating_sum, places.c.review_count)
+    rated = [places.c.review_count > 0]
+    if place_ids is not None:
+        rated.append(places.c.id.in_(place_ids))
+    overall = select(literal(ALL_PLACES), places.c.id, score, places.c.review_count) \
+        .where(*rated)
+    per_amenity = select(place_amenity.c.amenity_id, places.c.id, score, places.c.review_count) \
+        .join_from(places, place_amenity, place_amenity.c.place_id == places.c.id) \
+        .where(*rated)
+    return insert(leaderboard).from_select(['scope', 'place_id', 'score', 'review_count'],
+                                           union_all(overall, per_amenity))
+
+
+def refresh(session, place_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Rewrite the leaderboard rows of ``place_ids`` from their stored aggregates."""
+    place_ids = set(place_ids)
+    if not place_ids:
+        return
+    connection = session.connection()
+    for chunk in chunked(place_ids, chunk_size):
+        connection.execute(delete(leaderboard).where(leaderboard.c.place_id.in_(chunk)))
+        connection.execute(_entries(chunk))
+    bump(session, ['leaderboard'])
+
+
+def rebuild(session=None):
+    """Recompute the whole leaderboard, returning its number of rows."""
+    session = session or db.session
+    connection = session.connection()
+    connection.execute(delete(leaderboard))
+    result = connection.execute(_entries())
+    bump(session, ['leaderboard'])
+    return result.rowcount
+
+
+def _record_ranking_changes(session, flush_context):
+    # Rating changes refresh their places from ratings._apply; this covers
+    # the places whose amenities, and so whose scopes, changed
+    changed = {place.id for place in session.dirty if isinstance(place, Place)
+               and inspect(place).attrs.amenities.history.has_changes()}
+    changed.update(place.id for place in session.deleted if isinstance(place, Place))
+    refresh(session, changed)
+    amenity_ids = [amenity.id for amenity in session.deleted if isinstance(amenity, Amenity)]
+    if amenity_ids:
+        session.connection().execute(delete(leaderboard)
+                                     .where(leaderboard.c.scope.in_(amenity_ids)))
+
+
+def init_app(app):
+    """Read the prior, listen to every session and add the CLI command."""
+    prior['mean'] = app.config.get('LEADERBOARD_PRIOR_MEAN', 3.0)
+    prior['weight'] = app.config.get('LEADERBOARD_PRIOR_WEIGHT', 5)
+    if not event.contains(Session, 'after_flush', _record_ranking_changes):
+        event.listen(Session, 'after_flush', _record_ranking_changes)
+
+    @app.cli.command('rebuild-leaderboard')
+    def rebuild_leaderboard_command():
+        """Recompute the leaderboard of places, e.g. after changing its prior."""
+        count = rebuild()
+        db.session.commit()
+        click.echo(f"Ranked places in {count} leaderboard rows")
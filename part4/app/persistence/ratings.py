@@ -0,0 +1,133 @@
+"""Rating aggregates stored on ``places`` and kept in step with its reviews.
+
+Each place carries ``rating_sum``, ``review_count`` and the ``rating_1`` to
+``rating_5`` histogram. Every flush that inserts, deletes or re-rates
+reviews applies the matching deltas with ``col = col + delta`` UPDATEs in
+the same transaction, so listing places with their rating costs no
+aggregate query and concurrent writers cannot lose an increment. The
+leaderboard rows of the places are rewritten along, see
+``app.persistence.leaderboard``. ``repair_ratings`` recomputes everything
+from the reviews in bulk.
+"""
+from collections import Counter, defaultdict
+import click
+from sqlalchemy import bindparam, event, func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from app import db
+from app.models.place import Place
+from app.models.review import Review
+from app.persistence import leaderboard
+from app.persistence.cache import entity_cache
+from app.persistence.versions import bump
+
+RATINGS = range(1, 6)
+RATING_COLUMNS = ('rating_sum', 'review_count', *[f'rating_{n}' for n in RATINGS])
+
+places = Place.__table__
+reviews = Review.__table__
+
+# One executemany for all the places touched by a flush
+_apply_deltas = update(places).where(places.c.id == bindparam('place')).values(
+    rating_sum=places.c.rating_sum + bindparam('delta_sum'),
+    review_count=places.c.review_count + bindparam('delta_count'),
+    **{f'rating_{n}': places.c[f'rating_{n}'] + bindparam(f'delta_{n}') for n in RATINGS}
+)
+
+
+def _committed(obj, key):
+    """Value of ``key`` as it is in the database, before this flush."""
+    history = get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, key)
+
+
+def _rating_deltas(session):
+    """Count, per place, the reviews added (+1) and removed (-1) for each rating."""
+    deltas = defaultdict(Counter)
+    for review in session.new:
+        if isinstance(review, Review):
+            deltas[review.place_id][review.rating] += 1
+    for review in session.deleted:
+        if isinstance(review, Review):
+            deltas[_committed(review, 'place_id')][_committed(review, 'rating')] -= 1
+    for review in session.dirty:
+        if isinstance(review, Review) and (get_history(review, 'rating').has_changes()
+                                           or get_history(review, 'place_id').has_changes()):
+            deltas[_committed(review, 'place_id')][_committed(review, 'rating')] -= 1
+            deltas[review.place_id][review.rating] += 1
+    return deltas
+
+
+def _record_rating_changes(session, flush_context):
+    _apply(session, _rating_deltas(session))
+
+
+def _apply(session, deltas):
+    params = []
+    for place_id, counts in deltas.items():
+        if not any(counts.values()):
+            continue
+        params.append({
+            'place': place_id,
+            'delta_sum': sum(rating * count for rating, count in counts.items()),
+            'delta_count': sum(counts.values()),
+            **{f'delta_{n}': counts[n] for n in RATINGS}
+        })
+    if params:
+        session.connection().execute(_apply_deltas, params)
+        session.info.setdefault('rated_places', set()).update(p['place'] for p in params)
+        leaderboard.refresh(session, [p['place'] for p in params])
+
+
+def _expire_rated_places(session, flush_context):
+    # The aggregates changed behind the ORM: reload them on next access
+    for place_id in session.info.pop('rated_places', ()):
+        place = session.identity_map.get(Place.__mapper__.identity_key_from_primary_key((place_id,)))
+        if place is not None:
+            session.expire(place, RATING_COLUMNS)
+        entity_cache.invalidate_written(session, ('Place', place_id))
+
+
+def record_inserted_review(session, place_id, rating):
+    """Count a review inserted by a Core statement, which the flush hooks do not see."""
+    _apply(session, {place_id: Counter({rating: 1})})
+    _expire_rated_places(session, None)
+
+
+def repair_ratings(session=None):
+    """Recompute the aggregates of every place from its reviews.
+
+    Runs as a single UPDATE with correlated subqueries, each answered from
+    the (place_id, rating) index of reviews. Returns the number of places.
+    """
+    session = session or db.session
+    of_place = reviews.c.place_id == places.c.id
+    result = session.execute(update(places).values(
+        rating_sum=select(func.coalesce(func.sum(reviews.c.rating), 0))
+        .where(of_place).scalar_subquery(),
+        review_count=select(func.count()).where(of_place).scalar_subquery(),
+        **{f'rating_{n}': select(func.count()).where(of_place, reviews.c.rating == n)
+           .scalar_subquery() for n in RATINGS}
+    ))
+    bump(session, ['places'])
+    leaderboard.rebuild(session)
+    entity_cache.clear()
+    return result.rowcount
+
+
+def init_app(app):
+    """Listen to every session, the async facade's included, and add the CLI command."""
+    if not event.contains(Session, 'after_flush', _record_rating_changes):
+        event.listen(Session, 'after_flush', _record_rating_changes)
+        event.listen(Session, 'after_flush_postexec', _expire_rated_places)
+
+    @app.cli.command('repair-ratings')
+    def repair_ratings_command():
+        """Recompute the rating aggregates of every place from its reviews."""
+        count = repair_ratings()
+        db.session.commit()
+        click.echo(f"Recomputed the ratings of {count} places")
@@ -1,5 +1,72 @@
+import base64
+import binascii
+import json
 from abc import ABC, abstractmethod
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import and_, insert, or_, tuple_
+from sqlalchemy.orm import selectinload, make_transient_to_detached, object_session
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
+from app.persistence.cache import entity_cache
+from app.persistence.routing import read_router
+from app.persistence.unit_of_work import commit, rollback
+from app.persistence.versions import bump
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class ConflictError(ValueError):
+    """A write collided with a unique constraint, such as a second review of a place."""
+
+
+def chunked(iterable, size):
+    """Yield successive lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor back into sort key values typed like ``columns``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_after(keys, values):
+    """Build the WHERE clause selecting rows that sort after ``values``."""
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1:
+        # Row-value comparison lets SQLite seek straight into the composite index
+        columns = tuple_(*[column for column, _ in keys])
+        bound = tuple_(*values)
+        return columns < bound if directions.pop() else columns > bound
+
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
 
 class Repository(ABC):
     @abstractmethod
@@ -76,31 +143,296 @@ class SQLAlchemyRepository(Repository):
 
     def add(self, obj):
         db.session.add(obj)
-        db.session.commit()
+        commit()
         return obj
 
+    def read_session(self):
+        """Session for reads: a replica when routing allows it, else db.session."""
+        return read_router.read_session()
+
+    def query(self):
+        """Query the model on the read session."""
+        return self.read_session().query(self.model)
+
     def get(self, obj_id):
-        return self.model.query.get(obj_id)
+        return self.read_session().get(self.model, obj_id)
 
     def get_all(self):
-        return self.model.query.all()
+        return self.query().all()
 
+    def get_page(self, limit, cursor=None, columns=None):
+        """Return up to ``limit`` objects ordered by (created_at, id) and the next cursor.
+
+        With ``columns``, named rows holding only those columns are returned
+        instead of ORM instances (see ``project``).
+        """
+        keys = [(self.model.created_at, False), (self.model.id, False)]
+        return self.paginate(self.project(columns), keys, limit, cursor)
+
+    def iter_all(self, batch_size=DEFAULT_CHUNK_SIZE, columns=None):
+        """Yield every object, or named rows of ``columns``, ordered by (created_at, id).
+
+        Rows are streamed from a server-side cursor with ``yield_per``: only
+        ``batch_size`` of them are buffered at a time, so memory stays flat
+        whatever the size of the table. Prefer ``columns`` for large scans,
+        projected rows are not tracked by the session at all.
+        """
+        query = self.project(columns).order_by(self.model.created_at, self.model.id)
+        yield from query.yield_per(batch_size)
+
+    def project(self, columns=None):
+        """Query the model, or only the given column names when ``columns`` is set.
+
+        Projected queries return lightweight named rows: no ORM instance is
+        built or registered in the identity map and unselected columns, such
+        as large TEXT fields, are never read. The primary key and created_at
+        are always included so the rows can be paginated.
+        """
+        if not columns:
+            return self.query()
+        names = dict.fromkeys([*columns, 'id', 'created_at'])
+        return self.read_session().query(*[getattr(self.model, name) for name in names])
+
+    def paginate(self, query, keys, limit, cursor=None):
+        """Keyset-paginate ``query`` on ``keys``, a list of (column, descending) pairs.
+
+        Pages are selected with a seek on the sort key rather than OFFSET, so
+        fetching a deep page costs the same as fetching the first one.
+        """
+        if cursor:
+            values = decode_cursor(cursor, [column for column, _ in keys])
+            query = query.filter(keyset_after(keys, values))
+        order = [column.desc() if descending else column.asc() for column, descending in keys]
+        rows = query.order_by(*order).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([getattr(rows[-1], column.key) for column, _ in keys])
+        return rows, next_cursor
+
+    # Writes always load from the primary session
     def update(self, obj_id, data):
-        obj = self.get(obj_id)
+        obj = db.session.get(self.model, obj_id)
         if obj:
             for key, value in data.items():
                 if hasattr(obj, key):
                     setattr(obj, key, value)
-            db.session.commit()
+            commit()
         return obj
 
     def delete(self, obj_id):
-        obj = self.get(obj_id)
+        obj = db.session.get(self.model, obj_id)
         if obj:
             db.session.delete(obj)
-            db.session.commit()
+            commit()
             return True
         return False
 
     def get_by_attribute(self, attr_name, attr_value):
-        return self.model.query.filter_by(**{attr_name: attr_value}).first()
+        return self.query().filter_by(**{attr_name: attr_value}).first()
+
+    def get_many(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Return a dict of the objects found for ``obj_ids``, keyed by id."""
+        found = {}
+        query = self.query()
+        for chunk in chunked(set(obj_ids), chunk_size):
+            for obj in query.filter(self.model.id.in_(chunk)):
+                found[obj.id] = obj
+        return found
+
+    def add_many(self, objs, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Insert ``objs`` chunk by chunk inside a single transaction.
+
+        Each chunk is flushed as one batched INSERT and the whole batch is
+        committed once, so a bulk load costs a single fsync.
+        """
+        objs = list(objs)
+        try:
+            for chunk in chunked(objs, chunk_size):
+                db.session.add_all(chunk)
+                db.session.flush()
+            commit()
+        except Exception:
+            rollback()
+            raise
+        return objs
+
+    def insert_many(self, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Insert ``rows``, dicts of column values, with one batched INSERT per chunk.
+
+        Cheaper than ``add_many`` for large loads: no ORM instance is built,
+        tracked or flushed. Python-side column defaults still apply. The flush
+        hooks do not see these rows, so the table version is bumped here.
+        """
+        inserted = 0
+        try:
+            for chunk in chunked(rows, chunk_size):
+                db.session.execute(insert(self.model), chunk)
+                inserted += len(chunk)
+            if inserted:
+                bump(db.session, [self.model.__tablename__])
+            commit()
+        except Exception:
+            rollback()
+            raise
+        return inserted
+
+    def existing_ids(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Return the set of ``obj_ids`` that exist, with one IN query per chunk."""
+        found = set()
+        for chunk in chunked(set(obj_ids), chunk_size):
+            found.update(db.session.scalars(
+                db.select(self.model.id).where(self.model.id.in_(chunk))))
+        return found
+
+    def update_many(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Apply ``updates``, a dict of id to data, inside a single transaction.
+
+        Objects are loaded with one IN query per chunk and go through the model
+        validators; the flushed UPDATEs sharing the same columns are batched.
+        """
+        updated = []
+        try:
+            for chunk in chunked(updates, chunk_size):
+                for obj in self.model.query.filter(self.model.id.in_(chunk)):
+                    for key, value in updates[obj.id].items():
+                        if hasattr(obj, key):
+                            setattr(obj, key, value)
+                    updated.append(obj)
+                db.session.flush()
+            commit()
+        except Exception:
+            rollback()
+            raise
+        return updated
+
+    def delete_many(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Delete the objects of ``obj_ids`` inside a single transaction.
+
+        Relationships that cascade on delete are loaded per chunk with
+        ``selectinload`` so the cascade does not issue one query per object.
+        Returns the number of deleted objects.
+        """
+        cascades = [selectinload(getattr(self.model, rel.key))
+                    for rel in self.model.__mapper__.relationships if rel.cascade.delete]
+        deleted = 0
+        try:
+            for chunk in chunked(set(obj_ids), chunk_size):
+                for obj in self.model.query.options(*cascades).filter(self.model.id.in_(chunk)):
+                    db.session.delete(obj)
+                    deleted += 1
+                db.session.flush()
+            commit()
+        except Exception:
+            rollback()
+            raise
+        return deleted
+
+
+class CachedSQLAlchemyRepository(SQLAlchemyRepository):
+    """SQLAlchemyRepository with a read-through cache in front of get/get_by_attribute.
+
+    The cache holds detached snapshots of the column values, never live ORM
+    instances, and a hit is merged back into the current session without a
+    query. Entries are invalidated on update and delete. The cache is a no-op
+    unless ``ENTITY_CACHE_ENABLED`` is set.
+    """
+
+    def __init__(self, model, cache=entity_cache):
+        super().__init__(model)
+        self.cache = cache
+
+    def get(self, obj_id):
+        key = (self.model.__name__, obj_id)
+        session = self.read_session()
+        existing = session.identity_map.get(self.model.__mapper__.identity_key_from_primary_key((obj_id,)))
+        if existing is not None:
+            return existing
+        snapshot = self.cache.get(key)
+        if snapshot is not None:
+            return self._restore(session, snapshot)
+        obj = super().get(obj_id)
+        if obj is not None:
+            self._store(obj)
+        return obj
+
+    def get_by_attribute(self, attr_name, attr_value):
+        key = (self.model.__name__, attr_name, attr_value)
+        obj_id = self.cache.get(key)
+        if obj_id is not None:
+            obj = self.get(obj_id)
+            if obj is not None and getattr(obj, attr_name) == attr_value:
+                return obj
+            self.cache.invalidate(key)
+        obj = super().get_by_attribute(attr_name, attr_value)
+        if obj is not None:
+            self.cache.put_read(self.read_session(), key, obj.id)
+            self._store(obj)
+        return obj
+
+    def get_many(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Return a dict of the objects found for ``obj_ids``, keyed by id.
+
+        Objects already in the session or the cache are served from there;
+        the others are loaded with one IN query per chunk and cached.
+        """
+        session = self.read_session()
+        found, missing = {}, []
+        for obj_id in set(obj_ids):
+            identity = self.model.__mapper__.identity_key_from_primary_key((obj_id,))
+            obj = session.identity_map.get(identity)
+            if obj is None:
+                snapshot = self.cache.get((self.model.__name__, obj_id))
+                obj = self._restore(session, snapshot) if snapshot is not None else None
+            if obj is None:
+                missing.append(obj_id)
+            else:
+                found[obj_id] = obj
+        loaded = super().get_many(missing, chunk_size)
+        for obj in loaded.values():
+            self._store(obj)
+        found.update(loaded)
+        return found
+
+    # Entries are dropped after the write: loading the object for the write
+    # may itself have cached the pre-write snapshot. Within a unit of work
+    # the write is only flushed, so they are dropped again on commit.
+    def update(self, obj_id, data):
+        obj = super().update(obj_id, data)
+        self.cache.invalidate_written(db.session, (self.model.__name__, obj_id))
+        return obj
+
+    def delete(self, obj_id):
+        deleted = super().delete(obj_id)
+        self.cache.invalidate_written(db.session, (self.model.__name__, obj_id))
+        return deleted
+
+    def update_many(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        updated = super().update_many(updates, chunk_size)
+        for obj_id in updates:
+            self.cache.invalidate_written(db.session, (self.model.__name__, obj_id))
+        return updated
+
+    def delete_many(self, obj_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        obj_ids = list(obj_ids)
+        deleted = super().delete_many(obj_ids, chunk_size)
+        for obj_id in obj_ids:
+            self.cache.invalidate_written(db.session, (self.model.__name__, obj_id))
+        return deleted
+
+    def _store(self, obj):
+        # Pending changes are not committed yet and must not leak to other requests
+        session = object_session(obj)
+        if session is not None and (obj in session.new or session.is_modified(obj)):
+            return
+        snapshot = {attr.key: getattr(obj, attr.key) for attr in self.model.__mapper__.column_attrs}
+        self.cache.put_read(session or self.read_session(), (self.model.__name__, obj.id),
+                            snapshot)
+
+    def _restore(self, session, snapshot):
+        obj = self.model.__mapper__.class_manager.new_instance()
+        for key, value in snapshot.items():
+            set_committed_value(obj, key, value)
+        make_transient_to_detached(obj)
+        return session.merge(obj, load=False)
@@ -0,0 +1,278 @@
+"""Cache of whole JSON responses of hot GET endpoints.
+
+Entries are keyed by the request path and its normalized query string and
+carry tags naming what they show, such as ``places`` for the place list or
+``place:<id>`` and ``user:<id>`` for a place detail. The facade purges the
+tags of what it writes, so only the affected entries are dropped.
+
+Two backends: ``memory``, a per-process LRU, and ``sqlite``, a local file
+shared by every worker of the host so that a purge in one worker is seen by
+all of them. The cache is off unless ``RESPONSE_CACHE_BACKEND`` is set.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from app import db
+
+
+class MemoryBackend:
+    """Per-process LRU of entries, with an index from tag to keys."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, tags = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags, ttl):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.time() + ttl, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def purge(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+class SQLiteBackend:
+    """Entries in a local SQLite file, shared by the worker processes of a host.
+
+    Each thread uses its own connection; WAL lets readers proceed while a
+    worker stores or purges. Expired entries are pruned every ``prune_every``
+    stores, and the oldest ones beyond ``maxsize``.
+    """
+
+    SCHEMA = (
+        "PRAGMA journal_mode = WAL",
+        "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+        "expires_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS entry_tags (tag TEXT NOT NULL, key TEXT NOT NULL, "
+        "PRIMARY KEY (tag, key)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_entry_tags_key ON entry_tags(key)",
+        "CREATE INDEX IF NOT EXISTS idx_entries_expires_at ON entries(expires_at)",
+    )
+
+    def __init__(self, path, maxsize=10000, prune_every=500):
+        self.path = path
+        self.maxsize = maxsize
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._stores = 0
+        with self._connect() as connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at >= ?",
+            (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, tags, ttl):
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM entry_tags WHERE key = ?", (key,))
+            connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                               (key, json.dumps(value), time.time() + ttl))
+            connection.executemany("INSERT OR IGNORE INTO entry_tags VALUES (?, ?)",
+                                   [(tag, key) for tag in tags])
+        self._stores += 1
+        if self._stores % self.prune_every == 0:
+            self.prune()
+
+    def purge(self, tags):
+        tags = list(tags)
+        if not tags:
+            return
+        marks = ','.join('?' * len(tags))
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(f"DELETE FROM entries WHERE key IN "
+                               f"(SELECT key FROM entry_tags WHERE tag IN ({marks}))", tags)
+            connection.execute(f"DELETE FROM entry_tags WHERE key IN "
+                               f"(SELECT key FROM entry_tags WHERE tag IN ({marks}))", tags)
+
+    def prune(self):
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM entries WHERE expires_at < ? OR key IN "
+                               "(SELECT key FROM entries ORDER BY expires_at DESC "
+                               "LIMIT -1 OFFSET ?)", (time.time(), self.maxsize))
+            connection.execute("DELETE FROM entry_tags WHERE key NOT IN (SELECT key FROM entries)")
+
+    def clear(self):
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM entry_tags")
+
+
+class ResponseCache:
+    """Cache the 200 responses of the decorated GET views, see ``cached``."""
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 60
+
+    def init_app(self, app):
+        name = app.config.get('RESPONSE_CACHE_BACKEND')
+        size = app.config.get('RESPONSE_CACHE_SIZE', 1024)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        if name == 'memory':
+            self.backend = MemoryBackend(size)
+        elif name == 'sqlite':
+            path = app.config.get('RESPONSE_CACHE_PATH', 'response_cache.db')
+            if not os.path.isabs(path):
+                os.makedirs(app.instance_path, exist_ok=True)
+                path = os.path.join(app.instance_path, path)
+            self.backend = SQLiteBackend(path, size)
+        elif name:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {name}")
+        else:
+            self.backend = None
+        if not event.contains(db.session, 'after_commit', _purge_committed):
+            event.listen(db.session, 'after_commit', _purge_committed)
+            event.listen(db.session, 'after_soft_rollback', _forget_pending)
+
+    @staticmethod
+    def key():
+        arguments = sorted(request.args.items(multi=True))
+        return f"{request.path}?{urlencode(arguments)}"
+
+    def add_tags(self, *tags):
+        """Tag the response being built with what it shows, besides the view's tags."""
+        if has_request_context():
+            g.setdefault('response_cache_tags', set()).update(tags)
+
+    def purge(self, *tags):
+        """Drop the entries carrying any of ``tags``.
+
+        Inside a transaction the purge is repeated after the commit, so a
+        response cached from the old rows in between does not survive.
+        """
+        if self.backend is None or not tags:
+            return
+        self.backend.purge(tags)
+        session = db.session()
+        if session.in_transaction():
+            session.info.setdefault('purged_tags', set()).update(tags)
+
+    def purge_now(self, *tags):
+        """Drop the entries carrying any of ``tags``, leaving ``db.session`` alone.
+
+        For writers committing through sessions of their own, such as the
+        async facade, which call it again once their transaction committed.
+        """
+        if self.backend is not None and tags:
+            self.backend.purge(tags)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def cached(self, *tags):
+        """Serve a GET view from the cache, storing its 200 JSON responses.
+
+        A hit is answered without calling the view. If the stored response
+        had an ETag matching the request's If-None-Match, it is a 304.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+                key = self.key()
+                entry = self.backend.get(key)
+                if entry is not None:
+                    return self._respond(*entry)
+
+                g.response_cache_tags = set(tags)
+                result = view(*args, **kwargs)
+                data, status, headers = _unpack(result)
+                if status == 200 and isinstance(data, (dict, list)):
+                    body = json.dumps(data, separators=(',', ':'))
+                    self.backend.set(key, [body, dict(headers)], g.response_cache_tags, self.ttl)
+                return result
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _respond(body, headers):
+        headers = {**headers, 'X-Cache': 'HIT'}
+        etag = headers.get('ETag')
+        if etag and request.if_none_match.contains_weak(etag.strip('"')):
+            return Response(status=304, headers=headers)
+        return Response(body, 200, headers, mimetype='application/json')
+
+
+def _unpack(result):
+    if isinstance(result, tuple):
+        data, status, headers = (*result, None, None)[:3]
+        return data, status or 200, headers or {}
+    return result, 200, {}
+
+
+def _purge_committed(session):
+    tags = session.info.pop('purged_tags', None)
+    if tags and response_cache.backend is not None:
+        response_cache.backend.purge(tags)
+
+
+def _forget_pending(session, previous_transaction):
+    session.info.pop('purged_tags', None)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,82 @@
+import itertools
+import os
+from flask import g, has_request_context, request
+from flask.globals import app_ctx
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, scoped_session
+from app import db
+from app.persistence.unit_of_work import WRITE_METHODS
+
+
+def _app_context_id():
+    # Read sessions live as long as the app context, like db.session
+    return id(app_ctx._get_current_object())
+
+
+def _mark_written(session, flush_context):
+    if has_request_context():
+        g.wrote = True
+
+
+class ReadRouter:
+    """Send repository reads to read-only replica engines.
+
+    Replica URIs are listed in ``SQLALCHEMY_READ_REPLICAS``. Reads issued
+    during a GET/HEAD/OPTIONS request run on a session bound to one of the
+    replicas, picked round robin. Write requests, requests that already
+    flushed a change and code running outside a request keep reading from
+    ``db.session``, so they always see their own writes. SQLite replicas are
+    opened with ``PRAGMA query_only`` so they cannot be written by mistake.
+    Without replicas every read goes to ``db.session``.
+    """
+
+    def __init__(self):
+        self.engines = []
+        self._turn = itertools.count()
+        self.session = scoped_session(self._new_session, scopefunc=_app_context_id)
+
+    def init_app(self, app):
+        for engine in self.engines:
+            engine.dispose()
+        self.engines = [self._create_engine(app, uri)
+                        for uri in app.config.get('SQLALCHEMY_READ_REPLICAS', [])]
+        if not event.contains(db.session, 'after_flush', _mark_written):
+            event.listen(db.session, 'after_flush', _mark_written)
+        app.teardown_appcontext(self.remove)
+
+    def routes_reads(self):
+        return (bool(self.engines) and has_request_context()
+                and request.method not in WRITE_METHODS and not g.get('wrote', False))
+
+    def read_session(self):
+        """Return the session repository reads should use right now."""
+        return self.session() if self.routes_reads() else db.session
+
+    def remove(self, exc=None):
+        self.session.remove()
+
+    def _new_session(self):
+        engine = self.engines[next(self._turn) % len(self.engines)]
+        return Session(bind=engine, autoflush=False)
+
+    @staticmethod
+    def _create_engine(app, uri):
+        url = make_url(uri)
+        if url.get_backend_name() != 'sqlite':
+            return create_engine(url)
+        # Relative paths resolve to the instance folder, as Flask-SQLAlchemy does
+        database = url.database
+        if database and database != ':memory:' and not url.query.get('uri') \
+                and not os.path.isabs(database):
+            url = url.set(database=os.path.join(app.instance_path, database))
+        engine = create_engine(url)
+
+        @event.listens_for(engine, 'connect')
+        def read_only(dbapi_connection, connection_record):
+            dbapi_connection.execute('PRAGMA query_only = ON')
+
+        return engine
+
+
+read_router = ReadRouter()
@@ -0,0 +1,72 @@
+from flask import current_app
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+from app import db
+from app.persistence.geo import PLACES_RTREE_DDL, REBUILD_PLACES_RTREE
+from app.persistence.text_search import PLACES_FTS_DDL, REBUILD_PLACES_FTS
+
+# Indexes superseded by wider ones declared on the models
+OBSOLETE_INDEXES = ('idx_reviews_place_id_rating',)
+
+# Unique indexes upgrade_schema could not create because of duplicate rows;
+# writes relying on them check for duplicates themselves instead
+missing_unique_indexes = set()
+
+
+def upgrade_schema():
+    """Bring an existing database file up to date with the models.
+
+    ``db.create_all()`` only creates missing tables, so columns and indexes
+    declared after a database was first created are added here, as well as
+    the SQLite R*Tree of place coordinates and full-text index of places,
+    filled from the existing places.
+    Rating aggregates added to an existing ``places`` table are computed from
+    the reviews, and an empty leaderboard from the aggregates. Indexes in ``OBSOLETE_INDEXES`` are dropped.
+    """
+    inspector = inspect(db.engine)
+    added = set()
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    added.add((table.name, column.name))
+    if ('places', 'rating_sum') in added:
+        from app.persistence.ratings import repair_ratings
+        repair_ratings()
+        db.session.commit()
+    else:
+        # A leaderboard created for an existing database starts empty
+        from app.persistence.leaderboard import leaderboard, rebuild
+        if db.session.execute(select(leaderboard.c.place_id).limit(1)).first() is None:
+            rebuild()
+            db.session.commit()
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+                missing_unique_indexes.discard(index.name)
+            except IntegrityError:
+                # Existing rows break a unique index: keep serving, flag it
+                missing_unique_indexes.add(index.name)
+                current_app.logger.warning("Index %s not created, %s holds duplicates",
+                                           index.name, table.name)
+    with db.engine.begin() as connection:
+        for name in OBSOLETE_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    if db.engine.dialect.name == 'sqlite':
+        indexes = (('places_rtree', PLACES_RTREE_DDL, REBUILD_PLACES_RTREE),
+                   ('places_fts', PLACES_FTS_DDL, REBUILD_PLACES_FTS))
+        for name, ddl, rebuild in indexes:
+            backfill = not inspect(db.engine).has_table(name)
+            with db.engine.begin() as connection:
+                for statement in ddl:
+                    connection.exec_driver_sql(statement)
+                if backfill:
+                    for statement in rebuild:
+                        connection.exec_driver_sql(statement)
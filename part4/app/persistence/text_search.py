@@ -0,0 +1,78 @@
+"""Full-text search of places with an SQLite FTS5 index.
+
+``places_fts`` is an external-content FTS5 table: it stores only the
+inverted index of the ``title`` and ``description`` of ``places`` and reads
+the text back from ``places`` by rowid. Triggers on ``places`` keep it in
+sync. Prefix indexes on 2 and 3 characters make ``cas*`` queries cheap.
+"""
+import html
+import re
+from sqlalchemy import Column, Float, Integer, MetaData, Table, Text, func, literal_column
+
+# Not part of db.metadata: create_all cannot create virtual tables
+places_fts = Table(
+    'places_fts', MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('title', Text),
+    Column('description', Text)
+)
+
+PLACES_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(title, description, "
+    "content='places', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', "
+    "prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS places_fts_insert AFTER INSERT ON places BEGIN "
+    "INSERT INTO places_fts(rowid, title, description) "
+    "VALUES (new.rowid, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS places_fts_update AFTER UPDATE OF title, description "
+    "ON places BEGIN INSERT INTO places_fts(places_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "INSERT INTO places_fts(rowid, title, description) "
+    "VALUES (new.rowid, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS places_fts_delete AFTER DELETE ON places BEGIN "
+    "INSERT INTO places_fts(places_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); END",
+)
+
+# Fills the index from places; like the R*Tree, run it after a VACUUM
+REBUILD_PLACES_FTS = (
+    "INSERT INTO places_fts(places_fts) VALUES ('rebuild')",
+)
+
+# Title matches weigh ten times as much as description matches
+RANK = func.bm25(literal_column('places_fts'), 10.0, 1.0)
+RANK_KEY = literal_column('rank', Float)
+
+# Control characters cannot appear in the tokens, so they safely delimit
+# the matches until the text has been HTML-escaped
+_OPEN, _CLOSE = '\x02', '\x03'
+TITLE_HIGHLIGHT = func.highlight(literal_column('places_fts'), 0, _OPEN, _CLOSE)
+DESCRIPTION_SNIPPET = func.snippet(literal_column('places_fts'), 1, _OPEN, _CLOSE, '…', 16)
+
+_TERM = re.compile(r'(\w+)(\*?)')
+MAX_TERMS = 16
+
+
+def match_expression(text, column=None):
+    """Turn free text into an FTS5 query matching all of its words.
+
+    Each word is quoted, so FTS5 operators typed by the user are taken
+    literally; a word ending with ``*`` matches as a prefix. With ``column``,
+    only that column is searched. Raises ValueError when there is no word.
+    """
+    terms = [f'"{word}"{star}' for word, star in _TERM.findall(text or '')][:MAX_TERMS]
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    expression = ' '.join(terms)
+    return f'{column} : ({expression})' if column else expression
+
+
+def matches(expression):
+    return literal_column('places_fts').op('MATCH')(expression)
+
+
+def highlighted(text):
+    """HTML-escape a highlight or snippet and wrap its matches in <mark>."""
+    if text is None:
+        return None
+    return html.escape(text).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
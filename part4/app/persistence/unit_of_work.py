@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from flask import g, has_app_context, jsonify, request
+from app import db
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def in_unit_of_work():
+    return has_app_context() and g.get('unit_of_work', False)
+
+
+def commit():
+    """Commit the session, or only flush it when a unit of work is open.
+
+    Repositories call this instead of ``db.session.commit()`` so that a
+    request doing several writes reaches the database file once.
+    """
+    if in_unit_of_work():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+
+def rollback():
+    # The entity cache drops the entries this transaction wrote or stored,
+    # which may hold rows that were flushed but never committed
+    db.session.rollback()
+
+
+@contextmanager
+def unit_of_work():
+    """Run the block as a single transaction, committed at the end."""
+    if in_unit_of_work():
+        yield
+        return
+    g.unit_of_work = True
+    try:
+        yield
+        db.session.commit()
+    except Exception:
+        rollback()
+        raise
+    finally:
+        g.unit_of_work = False
+
+
+@contextmanager
+def outside_unit_of_work():
+    """Run the block outside the unit of work of the request, if one is open.
+
+    What the request wrote so far is committed first; in the block, each
+    ``unit_of_work()`` and repository write commits on its own again.
+    """
+    if not in_unit_of_work():
+        yield
+        return
+    db.session.commit()
+    g.unit_of_work = False
+    try:
+        yield
+    finally:
+        g.unit_of_work = True
+
+
+def init_app(app):
+    """Wrap every write request in a unit of work when UNIT_OF_WORK_ENABLED is set.
+
+    The transaction is committed after the view returned a non-error status
+    and rolled back on error responses and exceptions.
+    """
+    if not app.config.get('UNIT_OF_WORK_ENABLED', True):
+        return
+
+    @app.before_request
+    def begin_unit_of_work():
+        if request.method in WRITE_METHODS:
+            g.unit_of_work = True
+
+    @app.after_request
+    def finish_unit_of_work(response):
+        if not in_unit_of_work():
+            return response
+        g.unit_of_work = False
+        if response.status_code >= 400:
+            rollback()
+            return response
+        try:
+            db.session.commit()
+        except Exception as e:
+            rollback()
+            response = jsonify({'error': f'Internal server error: {str(e)}'})
+            response.status_code = 500
+        return response
+
+    @app.teardown_request
+    def abort_unit_of_work(exc):
+        if in_unit_of_work():
+            g.unit_of_work = False
+            rollback()
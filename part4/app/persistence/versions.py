@@ -0,0 +1,69 @@
+"""Per-table version counters, the validators of list responses.
+
+``table_versions`` holds one counter per table, incremented in the same
+transaction as every flush that inserts, updates or deletes rows of that
+table. A list endpoint can then tell whether anything it shows changed by
+reading a few counters, instead of scanning the rows for max(updated_at).
+
+Changing only a relationship, such as the amenities of a place, bumps the
+``updated_at`` of the parent so that per-entity validators see it as well.
+"""
+from datetime import datetime
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models.base_model import BaseModel
+
+table_versions = db.Table(
+    'table_versions',
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0)
+)
+
+
+@event.listens_for(table_versions, 'after_create')
+def _seed_versions(target, connection, **kw):
+    # Rows exist up front, so concurrent writers only ever UPDATE them
+    connection.execute(insert(table_versions),
+                       [{'name': table.name, 'version': 0} for table in db.metadata.sorted_tables])
+
+
+def bump(session, names):
+    """Increment the versions of the ``names`` tables."""
+    connection = session.connection()
+    for name in sorted(names):
+        result = connection.execute(update(table_versions)
+                                    .where(table_versions.c.name == name)
+                                    .values(version=table_versions.c.version + 1))
+        if result.rowcount == 0:
+            connection.execute(insert(table_versions).values(name=name, version=1))
+
+
+def get_versions(session, names):
+    """Return the current versions of the ``names`` tables, in that order."""
+    rows = dict(session.execute(select(table_versions.c.name, table_versions.c.version)
+                                .where(table_versions.c.name.in_(names))).all())
+    return tuple(rows.get(name, 0) for name in names)
+
+
+def _touch_relationship_changes(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, BaseModel) and session.is_modified(obj) \
+                and not session.is_modified(obj, include_collections=False):
+            obj.updated_at = datetime.utcnow()
+
+
+def _bump_flushed_tables(session, flush_context):
+    names = {obj.__table__.name for obj in (*session.new, *session.deleted)
+             if isinstance(obj, BaseModel)}
+    names.update(obj.__table__.name for obj in session.dirty
+                 if isinstance(obj, BaseModel) and session.is_modified(obj))
+    if names:
+        bump(session, names)
+
+
+def init_app(app):
+    """Listen to every session, the async facade's included."""
+    if not event.contains(Session, 'after_flush', _bump_flushed_tables):
+        event.listen(Session, 'before_flush', _touch_relationship_changes)
+        event.listen(Session, 'after_flush', _bump_flushed_tables)
@@ -0,0 +1,357 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import selectinload
+from app import bcrypt, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.persistence.async_repository import (
+    AsyncSQLAlchemyRepository, after_commit, async_database_uri, async_session_factory,
+    async_unit_of_work
+)
+from app.persistence.repository import DEFAULT_CHUNK_SIZE
+from app.persistence.response_cache import response_cache
+from app.services.facade import amenity_tags, place_tags, review_refusal, user_tags
+from app.services.repositories.review_repository import (
+    record_unique_insert, unique_insert, unique_insert_of
+)
+
+
+class AsyncHBnBFacade:
+    """Asyncio variant of HBnBFacade with the same methods, as coroutines.
+
+    Database calls go through AsyncSession and aiosqlite, and bcrypt runs in
+    worker threads, so a coroutine waiting on either does not block the event
+    loop. Meant to be served by an ASGI application; the Flask API keeps
+    using the synchronous facade. Writes drop the same entity cache entries
+    and response cache tags as their synchronous counterparts.
+
+    Only the entity methods of HBnBFacade are mirrored: create, get, get_all,
+    pages, lookups by attribute, update, delete and the bulk writes of users,
+    places, reviews and amenities. The other methods of HBnBFacade are
+    synchronous only.
+    """
+
+    def __init__(self, database_uri, pepper='', **engine_options):
+        self.engine = create_async_engine(async_database_uri(database_uri), **engine_options)
+        self.session_factory = async_session_factory(self.engine)
+        self.pepper = pepper
+        self.user_repo = AsyncSQLAlchemyRepository(User, self.session_factory)
+        self.place_repo = AsyncSQLAlchemyRepository(Place, self.session_factory,
+                                                    options=[selectinload(Place.amenities)])
+        self.review_repo = AsyncSQLAlchemyRepository(Review, self.session_factory)
+        self.amenity_repo = AsyncSQLAlchemyRepository(Amenity, self.session_factory)
+
+    @classmethod
+    def from_config(cls, config, **engine_options):
+        return cls(config['SQLALCHEMY_DATABASE_URI'], config.get('PEPPER', ''), **engine_options)
+
+    def unit_of_work(self):
+        return async_unit_of_work(self.session_factory)
+
+    async def create_all(self):
+        async with self.engine.begin() as connection:
+            await connection.run_sync(db.metadata.create_all)
+
+    async def dispose(self):
+        await self.engine.dispose()
+
+    @staticmethod
+    def _purge(session, *tags):
+        # As response_cache.purge does for db.session: now, and again once
+        # committed, so a response cached from the old rows in between goes too
+        response_cache.purge_now(*tags)
+        after_commit(session, lambda: response_cache.purge_now(*tags))
+
+    async def hash_password(self, password):
+        hashed = await asyncio.to_thread(bcrypt.generate_password_hash, password + self.pepper)
+        return hashed.decode('utf-8')
+
+    async def verify_password(self, user, password):
+        if not user.password:
+            return False
+        return await asyncio.to_thread(bcrypt.check_password_hash, user.password,
+                                       password + self.pepper)
+
+    async def _new_user(self, user_data):
+        user = User(
+            first_name=user_data['first_name'],
+            last_name=user_data['last_name'],
+            email=user_data['email'],
+            is_admin=user_data.get('is_admin', False)
+        )
+        if user_data.get('password'):
+            user.password = await self.hash_password(user_data['password'])
+        return user
+
+    async def create_user(self, user_data):
+        return await self.user_repo.add(await self._new_user(user_data))
+
+    async def get_user(self, user_id):
+        return await self.user_repo.get(user_id)
+
+    async def get_all_users(self):
+        return await self.user_repo.get_all()
+
+    async def get_users_page(self, limit, cursor=None, columns=None):
+        return await self.user_repo.get_page(limit, cursor, columns)
+
+    async def get_user_by_email(self, email):
+        return await self.user_repo.get_by_attribute('email', email)
+
+    async def update_user(self, user_id, user_data):
+        async with self.unit_of_work() as session:
+            user = await self.user_repo.update(user_id, user_data)
+            self._purge(session, *user_tags([user_id]))
+        return user
+
+    async def delete_user(self, user_id):
+        async with self.unit_of_work() as session:
+            deleted = await self.user_repo.delete(user_id)
+            self._purge(session, *user_tags([user_id], deleted=True))
+        return deleted
+
+    async def bulk_create_users(self, users_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Hashes are computed concurrently on the default thread pool
+        users = await asyncio.gather(*[self._new_user(user_data) for user_data in users_data])
+        return await self.user_repo.add_many(users, chunk_size)
+
+    async def bulk_update_users(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        async with self.unit_of_work() as session:
+            users = await self.user_repo.update_many(updates, chunk_size)
+            self._purge(session, *user_tags(updates))
+        return users
+
+    async def bulk_delete_users(self, user_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        user_ids = list(user_ids)
+        async with self.unit_of_work() as session:
+            deleted = await self.user_repo.delete_many(user_ids, chunk_size)
+            self._purge(session, *user_tags(user_ids, deleted=True))
+        return deleted
+
+    async def create_place(self, place_data):
+        place_data_copy = place_data.copy()
+        amenity_ids = place_data_copy.pop('amenities', [])
+
+        place = Place(**place_data_copy)
+
+        async with self.unit_of_work() as session:
+            amenities = await self.amenity_repo.get_many(amenity_ids)
+            place.amenities = [amenities[amenity_id] for amenity_id in amenity_ids
+                               if amenity_id in amenities]
+            place = await self.place_repo.add(place)
+            self._purge(session, *place_tags())
+        return place
+
+    async def get_place(self, place_id):
+        return await self.place_repo.get(place_id)
+
+    async def get_all_places(self):
+        return await self.place_repo.get_all()
+
+    async def get_places_page(self, limit, cursor=None, columns=None):
+        return await self.place_repo.get_page(limit, cursor, columns)
+
+    async def update_place(self, place_id, place_data):
+        place_data_copy = place_data.copy()
+        amenity_ids = place_data_copy.pop('amenities', None)
+
+        async with self.unit_of_work() as session:
+            place = await self.place_repo.update(place_id, place_data_copy)
+
+            if place and amenity_ids is not None:
+                amenities = await self.amenity_repo.get_many(amenity_ids)
+                place.amenities = [amenities[amenity_id] for amenity_id in amenity_ids
+                                   if amenity_id in amenities]
+            self._purge(session, *place_tags([place_id]))
+
+        return place
+
+    async def delete_place(self, place_id):
+        async with self.unit_of_work() as session:
+            deleted = await self.place_repo.delete(place_id)
+            self._purge(session, *place_tags([place_id]))
+        return deleted
+
+    async def bulk_create_places(self, places_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        places_data = [place_data.copy() for place_data in places_data]
+        amenity_ids = {amenity_id for place_data in places_data
+                       for amenity_id in place_data.get('amenities', [])}
+
+        async with self.unit_of_work() as session:
+            amenities = await self.amenity_repo.get_many(amenity_ids)
+            places = []
+            for place_data in places_data:
+                ids = place_data.pop('amenities', [])
+                place = Place(**place_data)
+                place.amenities = [amenities[amenity_id] for amenity_id in ids
+                                   if amenity_id in amenities]
+                places.append(place)
+            places = await self.place_repo.add_many(places, chunk_size)
+            self._purge(session, *place_tags())
+        return places
+
+    async def bulk_update_places(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        async with self.unit_of_work() as session:
+            places = await self.place_repo.update_many(updates, chunk_size)
+            self._purge(session, *place_tags(updates))
+        return places
+
+    async def bulk_delete_places(self, place_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        place_ids = list(place_ids)
+        async with self.unit_of_work() as session:
+            deleted = await self.place_repo.delete_many(place_ids, chunk_size)
+            self._purge(session, *place_tags(place_ids))
+        return deleted
+
+    async def get_places_by_owner(self, owner_id):
+        return await self.place_repo.get_by_attribute('owner_id', owner_id)
+
+    async def create_review(self, review_data):
+        """Create a review with one INSERT, as ``ReviewRepository.insert_unique`` does.
+
+        Raises ValueError if the place is unknown or owned by the author, and
+        ConflictError if the author already reviewed it.
+        """
+        review = Review(**review_data)
+        make_insert = unique_insert_of(self.engine.dialect.name)
+        async with self.unit_of_work() as session:
+            if make_insert is None:
+                inserted = await self._add_unique(session, review)
+            else:
+                inserted = (await session.scalars(unique_insert(review, make_insert))).first()
+                if inserted is not None:
+                    await session.run_sync(record_unique_insert, inserted)
+            if inserted is None:
+                raise review_refusal(await self.place_repo.get(review.place_id),
+                                     review.user_id)
+            self._purge(session, *place_tags([review.place_id]))
+        return inserted
+
+    @staticmethod
+    async def _add_unique(session, review):
+        # As ReviewRepository._add_unique
+        place = await session.get(Place, review.place_id)
+        if place is None or place.owner_id == review.user_id:
+            return None
+        existing = select(Review.id).filter_by(user_id=review.user_id, place_id=review.place_id)
+        if (await session.execute(existing.limit(1))).first() is not None:
+            return None
+        try:
+            async with session.begin_nested():
+                session.add(review)
+        except IntegrityError:
+            return None
+        return review
+
+    async def update_review(self, review_id, review_data):
+        async with self.unit_of_work() as session:
+            review = await self.review_repo.get(review_id)
+            if not review:
+                return None
+            place_id = review.place_id
+            review = await self.review_repo.update(review_id, review_data)
+            self._purge(session, *place_tags({place_id, review.place_id}))
+        return review
+
+    async def delete_review(self, review_id):
+        async with self.unit_of_work() as session:
+            review = await self.review_repo.get(review_id)
+            if not review:
+                return False
+            deleted = await self.review_repo.delete(review_id)
+            self._purge(session, *place_tags([review.place_id]))
+        return deleted
+
+    async def bulk_create_reviews(self, reviews_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        reviews = [Review(**review_data) for review_data in reviews_data]
+        async with self.unit_of_work() as session:
+            reviews = await self.review_repo.add_many(reviews, chunk_size)
+            self._purge(session, *place_tags({review.place_id for review in reviews}))
+        return reviews
+
+    async def bulk_update_reviews(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        async with self.unit_of_work() as session:
+            place_ids = {review.place_id
+                         for review in (await self.review_repo.get_many(updates)).values()}
+            reviews = await self.review_repo.update_many(updates, chunk_size)
+            self._purge(session, *place_tags(place_ids | {review.place_id
+                                                          for review in reviews}))
+        return reviews
+
+    async def bulk_delete_reviews(self, review_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        review_ids = list(review_ids)
+        async with self.unit_of_work() as session:
+            place_ids = {review.place_id
+                         for review in (await self.review_repo.get_many(review_ids)).values()}
+            deleted = await self.review_repo.delete_many(review_ids, chunk_size)
+            self._purge(session, *place_tags(place_ids))
+        return deleted
+
+    async def get_review(self, review_id):
+        return await self.review_repo.get(review_id)
+
+    async def get_all_reviews(self):
+        return await self.review_repo.get_all()
+
+    async def get_reviews_page(self, limit, cursor=None, columns=None):
+        return await self.review_repo.get_page(limit, cursor, columns)
+
+    async def get_reviews_by_place(self, place_id):
+        return await self.review_repo.get_all_by_attribute('place_id', place_id)
+
+    async def get_reviews_by_user(self, user_id):
+        return await self.review_repo.get_all_by_attribute('user_id', user_id)
+
+    async def create_amenity(self, amenity_data):
+        async with self.unit_of_work() as session:
+            amenity = await self.amenity_repo.add(Amenity(**amenity_data))
+            self._purge(session, *amenity_tags())
+        return amenity
+
+    async def update_amenity(self, amenity_id, amenity_data):
+        async with self.unit_of_work() as session:
+            amenity = await self.amenity_repo.update(amenity_id, amenity_data)
+            self._purge(session, *amenity_tags([amenity_id]))
+        return amenity
+
+    async def delete_amenity(self, amenity_id):
+        async with self.unit_of_work() as session:
+            deleted = await self.amenity_repo.delete(amenity_id)
+            self._purge(session, *amenity_tags([amenity_id]))
+        return deleted
+
+    async def bulk_create_amenities(self, amenities_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        amenities = [Amenity(**amenity_data) for amenity_data in amenities_data]
+        async with self.unit_of_work() as session:
+            amenities = await self.amenity_repo.add_many(amenities, chunk_size)
+            self._purge(session, *amenity_tags())
+        return amenities
+
+    async def bulk_update_amenities(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        async with self.unit_of_work() as session:
+            amenities = await self.amenity_repo.update_many(updates, chunk_size)
+            self._purge(session, *amenity_tags(updates))
+        return amenities
+
+    async def bulk_delete_amenities(self, amenity_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        amenity_ids = list(amenity_ids)
+        async with self.unit_of_work() as session:
+            deleted = await self.amenity_repo.delete_many(amenity_ids, chunk_size)
+            self._purge(session, *amenity_tags(amenity_ids))
+        return deleted
+
+    async def get_amenity(self, amenity_id):
+        return await self.amenity_repo.get(amenity_id)
+
+    async def get_all_amenities(self):
+        return await self.amenity_repo.get_all()
+
+    async def get_amenities_page(self, limit, cursor=None, columns=None):
+        return await self.amenity_repo.get_page(limit, cursor, columns)
+
+    async def get_amenity_by_name(self, name):
+        return await self.amenity_repo.get_by_attribute('name', name)
@@ -2,14 +2,105 @@ from app.models.user import User
 from app.models.place import Place
 from app.models.review import Review
 from app.models.amenity import Amenity
-from app.persistence.repository import SQLAlchemyRepository
+import math
+import uuid
+from sqlalchemy.exc import SQLAlchemyError
+from app.persistence.repository import DEFAULT_CHUNK_SIZE, ConflictError, chunked
+from app.persistence.unit_of_work import outside_unit_of_work, unit_of_work
+from app.persistence.response_cache import response_cache
+from app.persistence.versions import get_versions
+from app.services.repositories.user_repository import UserRepository
+from app.services.repositories.place_repository import DETAIL_EMBEDS, PlaceRepository
+from app.services.repositories.review_repository import ReviewRepository
+from app.services.repositories.amenity_repository import AmenityRepository
+
+# Fields a row of a place import may carry
+IMPORT_FIELDS = ('title', 'description', 'price', 'latitude', 'longitude', 'owner_id', 'amenities')
+
+# Prices are stored as Numeric(10, 2)
+MAX_IMPORT_PRICE = 10 ** 8
+
+
+def _import_number(data, name):
+    value = data.get(name)
+    if value is None or value == '':
+        raise ValueError(f"{name} is required")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    # nan and inf pass the range checks of the validators but not the database or JSON
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+def _import_row(data, owner_id, any_owner):
+    """Validate one import row, returning the place column values and its amenity ids."""
+    if isinstance(data, Exception):
+        raise data
+    if not isinstance(data, dict):
+        raise ValueError("Row must be an object")
+    unknown = [str(name) for name in data if name not in IMPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    owner = data.get('owner_id') or owner_id
+    if owner != owner_id and not any_owner:
+        raise ValueError("Only admins can import places of other owners")
+    amenity_ids = data.get('amenities') or []
+    if not isinstance(amenity_ids, list) or not all(isinstance(i, str) for i in amenity_ids):
+        raise ValueError("amenities must be a list of amenity ids")
+    if not isinstance(data.get('title'), (str, type(None))):
+        raise ValueError("title must be a string")
+    price = _import_number(data, 'price')
+    if price >= MAX_IMPORT_PRICE:
+        raise ValueError(f"price must be less than {MAX_IMPORT_PRICE}")
+    # A transient Place runs the model validators, it is never added to the session
+    place = Place(title=data.get('title'),
+                  description=str(data.get('description') or ''),
+                  price=price,
+                  latitude=_import_number(data, 'latitude'),
+                  longitude=_import_number(data, 'longitude'),
+                  owner_id=owner)
+    values = {'id': str(uuid.uuid4()), 'title': place.title, 'description': place.description,
+              'price': place.price, 'latitude': place.latitude, 'longitude': place.longitude,
+              'owner_id': owner}
+    return values, list(dict.fromkeys(amenity_ids))
+
+
+# Response cache tags made stale by the writes of each kind, shared with the
+# async facade. Cached place details are tagged with their owner and review
+# authors; reviews show in the detail of their place and, through the
+# ratings, in the place list; amenity names show in the amenity list, the
+# place facets and the place details.
+def user_tags(user_ids, deleted=False):
+    # Deleting a user deletes their places and reviews along
+    return (*[f'user:{user_id}' for user_id in user_ids], *(['places'] if deleted else []))
+
+
+def place_tags(place_ids=()):
+    return ('places', *[f'place:{place_id}' for place_id in place_ids])
+
+
+def amenity_tags(amenity_ids=()):
+    return ('amenities', *[f'amenity:{amenity_id}' for amenity_id in amenity_ids])
+
+
+def review_refusal(place, user_id):
+    """The error explaining why a review of ``place`` by ``user_id`` was not inserted."""
+    if place is None:
+        return ValueError("Place not found")
+    if place.owner_id == user_id:
+        return ValueError("You cannot review your own place")
+    return ConflictError("You have already reviewed this place")
+
 
 class HBnBFacade:
     def __init__(self):
-        self.user_repo = SQLAlchemyRepository(User)
-        self.place_repo = SQLAlchemyRepository(Place)
-        self.review_repo = SQLAlchemyRepository(Review)
-        self.amenity_repo = SQLAlchemyRepository(Amenity)
+        self.user_repo = UserRepository()
+        self.place_repo = PlaceRepository()
+        self.review_repo = ReviewRepository()
+        self.amenity_repo = AmenityRepository()
 
     def create_user(self, user_data):
         user_data_copy = user_data.copy()
@@ -30,17 +121,55 @@ class HBnBFacade:
     def get_user(self, user_id):
         return self.user_repo.get(user_id)
 
+    def get_many_users(self, user_ids):
+        return self.user_repo.get_many(user_ids)
+
     def get_all_users(self):
         return self.user_repo.get_all()
 
+    def get_users_page(self, limit, cursor=None, columns=None):
+        return self.user_repo.get_page(limit, cursor, columns)
+
+    def iter_users(self, batch_size=DEFAULT_CHUNK_SIZE, columns=None):
+        return self.user_repo.iter_all(batch_size, columns)
+
     def get_user_by_email(self, email):
         return self.user_repo.get_by_attribute('email', email)
 
     def update_user(self, user_id, user_data):
-        return self.user_repo.update(user_id, user_data)
+        user = self.user_repo.update(user_id, user_data)
+        response_cache.purge(*user_tags([user_id]))
+        return user
 
     def delete_user(self, user_id):
-        return self.user_repo.delete(user_id)
+        deleted = self.user_repo.delete(user_id)
+        response_cache.purge(*user_tags([user_id], deleted=True))
+        return deleted
+
+    def bulk_create_users(self, users_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        users = []
+        for user_data in users_data:
+            user = User(
+                first_name=user_data['first_name'],
+                last_name=user_data['last_name'],
+                email=user_data['email'],
+                is_admin=user_data.get('is_admin', False)
+            )
+            if user_data.get('password'):
+                user.hash_password(user_data['password'])
+            users.append(user)
+        return self.user_repo.add_many(users, chunk_size)
+
+    def bulk_update_users(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        users = self.user_repo.update_many(updates, chunk_size)
+        response_cache.purge(*user_tags(updates))
+        return users
+
+    def bulk_delete_users(self, user_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        user_ids = list(user_ids)
+        deleted = self.user_repo.delete_many(user_ids, chunk_size)
+        response_cache.purge(*user_tags(user_ids, deleted=True))
+        return deleted
 
     def create_place(self, place_data):
         place_data_copy = place_data.copy()
@@ -48,48 +177,210 @@ class HBnBFacade:
         amenity_ids = place_data_copy.pop('amenities', [])
 
         place = Place(**place_data_copy)
+        place.amenities = self._resolve_amenities(amenity_ids)
+        place = self.place_repo.add(place)
+        response_cache.purge(*place_tags())
+        return place
 
-        for amenity_id in amenity_ids:
-            amenity = self.amenity_repo.get(amenity_id)
-            if amenity:
-                place.amenities.append(amenity)
-    
-        return self.place_repo.add(place)
+    def _resolve_amenities(self, amenity_ids):
+        # One IN query for all the ids, unknown ones are skipped
+        amenity_ids = list(dict.fromkeys(amenity_ids))
+        amenities = self.amenity_repo.get_many(amenity_ids)
+        return [amenities[amenity_id] for amenity_id in amenity_ids if amenity_id in amenities]
 
     def get_place(self, place_id):
         return self.place_repo.get(place_id)
 
+    def get_many_places(self, place_ids):
+        return self.place_repo.get_many(place_ids)
+
+    def get_place_details(self, place_id, columns=None, include=DETAIL_EMBEDS):
+        return self.place_repo.get_details(place_id, columns, include)
+
+    def get_place_details_version(self, place_id, include=DETAIL_EMBEDS):
+        return self.place_repo.get_details_version(place_id, include)
+
+    def search_places_text(self, text, limit, cursor=None, columns=None):
+        return self.place_repo.search_text(text, limit, cursor, columns)
+
+    def search_places(self, boxes, origin, limit, cursor=None, radius_km=None, columns=None,
+                      filters=None):
+        return self.place_repo.search_area(boxes, origin, limit, cursor, radius_km, columns,
+                                           filters)
+
     def get_all_places(self):
         return self.place_repo.get_all()
 
+    def get_places_page(self, limit, cursor=None, columns=None, filters=None):
+        return self.place_repo.get_page(limit, cursor, columns, filters)
+
+    def iter_places(self, batch_size=DEFAULT_CHUNK_SIZE, columns=None):
+        return self.place_repo.iter_all(batch_size, columns)
+
+    def get_place_facets(self, filters=None, price_bucket=50):
+        return self.place_repo.get_facets(filters, price_bucket)
+
     def update_place(self, place_id, place_data):
         place_data_copy = place_data.copy()
         amenity_ids = place_data_copy.pop('amenities', None)
 
-        place = self.place_repo.update(place_id, place_data_copy)
-
-        if place and amenity_ids is not None:
-            place.amenities = []
-
-            for amenity_id in amenity_ids:
-                amenity = self.amenity_repo.get(amenity_id)
-                if amenity:
-                    place.amenities.append(amenity)
+        with unit_of_work():
+            place = self.place_repo.update(place_id, place_data_copy)
 
-            from app import db
-            db.session.commit()
+            if place and amenity_ids is not None:
+                place.amenities = self._resolve_amenities(amenity_ids)
 
+        response_cache.purge(*place_tags([place_id]))
         return place
 
     def delete_place(self, place_id):
-        return self.place_repo.delete(place_id)
+        deleted = self.place_repo.delete(place_id)
+        response_cache.purge(*place_tags([place_id]))
+        return deleted
+
+    def bulk_create_places(self, places_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        places_data = [place_data.copy() for place_data in places_data]
+        amenity_ids = {amenity_id for place_data in places_data
+                       for amenity_id in place_data.get('amenities', [])}
+        amenities = self.amenity_repo.get_many(amenity_ids)
+
+        places = []
+        for place_data in places_data:
+            ids = place_data.pop('amenities', [])
+            place = Place(**place_data)
+            place.amenities = [amenities[amenity_id] for amenity_id in ids if amenity_id in amenities]
+            places.append(place)
+        places = self.place_repo.add_many(places, chunk_size)
+        response_cache.purge(*place_tags())
+        return places
+
+    def import_places(self, records, owner_id, any_owner=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Create places from ``records``, an iterable of (line, row) pairs, chunk by chunk.
+
+        Rows are checked with the model validators. The amenities and owners
+        referenced by a chunk are resolved with one IN query each, and its
+        valid rows are inserted with batched INSERTs into places and
+        place_amenity. Invalid rows are skipped. Rows belong to ``owner_id``
+        unless ``any_owner`` lets them name another one. Returns the number
+        of created places and the (line, error) pairs of the rejected rows.
+
+        Each chunk is committed in its own transaction, outside the unit of
+        work of the request: the SQLite write lock is held while a chunk is
+        written, not while the rest of the upload is read and validated. A
+        chunk the database refuses is rolled back alone and its rows are
+        reported as rejected; the chunks committed before it stay imported.
+        """
+        with outside_unit_of_work():
+            created, errors = self._import_chunks(records, owner_id, any_owner, chunk_size)
+        if created:
+            response_cache.purge(*place_tags())
+        return created, sorted(errors, key=lambda error: (error[0] is None, error[0] or 0))
+
+    def _import_chunks(self, records, owner_id, any_owner, chunk_size):
+        created, errors = 0, []
+        for chunk in chunked(records, chunk_size):
+            rows = []
+            for line, data in chunk:
+                try:
+                    rows.append((line, *_import_row(data, owner_id, any_owner)))
+                except ValueError as e:
+                    errors.append((line, str(e)))
+            amenities = self.amenity_repo.existing_ids(
+                amenity_id for _, _, amenity_ids in rows for amenity_id in amenity_ids)
+            owners = self.user_repo.existing_ids(values['owner_id'] for _, values, _ in rows)
+
+            places, links = [], []
+            for line, values, amenity_ids in rows:
+                missing = [amenity_id for amenity_id in amenity_ids if amenity_id not in amenities]
+                if values['owner_id'] not in owners:
+                    errors.append((line, f"Owner not found: {values['owner_id']}"))
+                elif missing:
+                    errors.append((line, f"Amenity not found: {', '.join(missing)}"))
+                else:
+                    places.append((line, values))
+                    links.extend((values['id'], amenity_id) for amenity_id in amenity_ids)
+            try:
+                with unit_of_work():
+                    inserted = self.place_repo.insert_many(
+                        [values for _, values in places], chunk_size)
+                    self.place_repo.link_amenities(links, chunk_size)
+                created += inserted
+            except SQLAlchemyError as e:
+                error = f"Not imported, its chunk failed: {getattr(e, 'orig', None) or e}"
+                errors.extend((line, error) for line, _ in places)
+        return created, errors
+
+    def bulk_update_places(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        places = self.place_repo.update_many(updates, chunk_size)
+        response_cache.purge(*place_tags(updates))
+        return places
+
+    def bulk_delete_places(self, place_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        place_ids = list(place_ids)
+        deleted = self.place_repo.delete_many(place_ids, chunk_size)
+        response_cache.purge(*place_tags(place_ids))
+        return deleted
+
+    def get_top_places(self, limit, amenity_id=None, columns=None):
+        """Best rated places by Bayesian average, see ``app.persistence.leaderboard``."""
+        return self.place_repo.get_top(limit, amenity_id, columns)
 
     def get_places_by_owner(self, owner_id):
         return self.place_repo.get_by_attribute('owner_id', owner_id)
 
+    def _purge_reviewed_places(self, place_ids):
+        response_cache.purge(*place_tags(place_ids))
+
     def create_review(self, review_data):
-        review = Review(**review_data)
-        return self.review_repo.add(review)
+        """Create a review with one INSERT, see ``ReviewRepository.insert_unique``.
+
+        Raises ValueError if the place is unknown or owned by the author, and
+        ConflictError if the author already reviewed it.
+        """
+        review = self.review_repo.insert_unique(Review(**review_data))
+        if review is None:
+            # Nothing inserted: find out why, off the hot path
+            raise review_refusal(self.place_repo.get(review_data['place_id']),
+                                 review_data['user_id'])
+        self._purge_reviewed_places([review_data['place_id']])
+        return review
+
+    def update_review(self, review_id, review_data):
+        review = self.review_repo.get(review_id)
+        if not review:
+            return None
+        place_id = review.place_id
+        review = self.review_repo.update(review_id, review_data)
+        self._purge_reviewed_places({place_id, review.place_id})
+        return review
+
+    def delete_review(self, review_id):
+        review = self.review_repo.get(review_id)
+        if not review:
+            return False
+        place_id = review.place_id
+        deleted = self.review_repo.delete(review_id)
+        self._purge_reviewed_places([place_id])
+        return deleted
+
+    def bulk_create_reviews(self, reviews_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        reviews = [Review(**review_data) for review_data in reviews_data]
+        reviews = self.review_repo.add_many(reviews, chunk_size)
+        self._purge_reviewed_places({review.place_id for review in reviews})
+        return reviews
+
+    def bulk_update_reviews(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        place_ids = {review.place_id for review in self.review_repo.get_many(updates).values()}
+        reviews = self.review_repo.update_many(updates, chunk_size)
+        self._purge_reviewed_places(place_ids | {review.place_id for review in reviews})
+        return reviews
+
+    def bulk_delete_reviews(self, review_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        review_ids = list(review_ids)
+        place_ids = {review.place_id for review in self.review_repo.get_many(review_ids).values()}
+        deleted = self.review_repo.delete_many(review_ids, chunk_size)
+        self._purge_reviewed_places(place_ids)
+        return deleted
 
     def get_review(self, review_id):
         return self.review_repo.get(review_id)
@@ -97,23 +388,75 @@ class HBnBFacade:
     def get_all_reviews(self):
         return self.review_repo.get_all()
 
+    def get_reviews_page(self, limit, cursor=None, columns=None, include=()):
+        return self.review_repo.get_page(limit, cursor, columns, include)
+
+    def iter_reviews(self, batch_size=DEFAULT_CHUNK_SIZE, columns=None):
+        return self.review_repo.iter_all(batch_size, columns)
+
+    def get_place_reviews_page(self, place_id, limit, cursor=None, sort='newest', columns=None,
+                               include=()):
+        return self.review_repo.get_place_page(place_id, limit, cursor, sort, columns, include)
+
     def get_reviews_by_place(self, place_id):
-        return self.review_repo.get_by_attribute('place_id', place_id)
+        return self.review_repo.get_reviews_by_place(place_id)
 
     def get_reviews_by_user(self, user_id):
-        return self.review_repo.get_by_attribute('user_id', user_id)
+        return self.review_repo.get_reviews_by_user(user_id)
 
     def create_amenity(self, amenity_data):
         amenity = Amenity(**amenity_data)
-        return self.amenity_repo.add(amenity)
+        amenity = self.amenity_repo.add(amenity)
+        response_cache.purge(*amenity_tags())
+        return amenity
+
+    def update_amenity(self, amenity_id, amenity_data):
+        amenity = self.amenity_repo.update(amenity_id, amenity_data)
+        response_cache.purge(*amenity_tags([amenity_id]))
+        return amenity
+
+    def delete_amenity(self, amenity_id):
+        deleted = self.amenity_repo.delete(amenity_id)
+        response_cache.purge(*amenity_tags([amenity_id]))
+        return deleted
+
+    def bulk_create_amenities(self, amenities_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        amenities = [Amenity(**amenity_data) for amenity_data in amenities_data]
+        amenities = self.amenity_repo.add_many(amenities, chunk_size)
+        response_cache.purge(*amenity_tags())
+        return amenities
+
+    def bulk_update_amenities(self, updates, chunk_size=DEFAULT_CHUNK_SIZE):
+        amenities = self.amenity_repo.update_many(updates, chunk_size)
+        response_cache.purge(*amenity_tags(updates))
+        return amenities
+
+    def bulk_delete_amenities(self, amenity_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        amenity_ids = list(amenity_ids)
+        deleted = self.amenity_repo.delete_many(amenity_ids, chunk_size)
+        response_cache.purge(*amenity_tags(amenity_ids))
+        return deleted
 
     def get_amenity(self, amenity_id):
         return self.amenity_repo.get(amenity_id)
 
+    def get_many_amenities(self, amenity_ids):
+        return self.amenity_repo.get_many(amenity_ids)
+
     def get_all_amenities(self):
         return self.amenity_repo.get_all()
 
+    def get_amenities_page(self, limit, cursor=None, columns=None):
+        return self.amenity_repo.get_page(limit, cursor, columns)
+
+    def iter_amenities(self, batch_size=DEFAULT_CHUNK_SIZE, columns=None):
+        return self.amenity_repo.iter_all(batch_size, columns)
+
     def get_amenity_by_name(self, name):
         return self.amenity_repo.get_by_attribute('name', name)
 
-facade = HBnBFacade()
\ No newline at end of file
+    def get_table_versions(self, *names):
+        # Validators of the list endpoints, see app.persistence.versions
+        return get_versions(self.place_repo.read_session(), names)
+
+facade = HBnBFacade()
@@ -1,9 +1,9 @@
 from app.models.amenity import Amenity
-from app.persistence.repository import SQLAlchemyRepository
+from app.persistence.repository import CachedSQLAlchemyRepository
 
-class AmenityRepository(SQLAlchemyRepository):
+class AmenityRepository(CachedSQLAlchemyRepository):
     def __init__(self):
         super().__init__(Amenity)
 
     def get_by_name(self, name):
-        return self.model.query.filter_by(name=name).first()
\ No newline at end of file
+        return self.query().filter_by(name=name).first()
\ No newline at end of file
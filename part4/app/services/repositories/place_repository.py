@@ -1,12 +1,268 @@
+from sqlalchemy import (Float, Integer, and_, cast, func, insert, literal, literal_column, null,
+                        or_, select, tuple_, union_all)
+from sqlalchemy.orm import aliased, joinedload, load_only, selectinload
+from app.models.amenity import Amenity
+from app.models.association import place_amenity
 from app.models.place import Place
-from app.persistence.repository import SQLAlchemyRepository
+from app.models.review import Review
+from app.models.user import User
+from app.persistence.geo import distance_km, places_rtree
+from app.persistence.leaderboard import ALL_PLACES, leaderboard
+from app import db
+from app.persistence.repository import (DEFAULT_CHUNK_SIZE, CachedSQLAlchemyRepository, chunked,
+                                        decode_cursor, encode_cursor)
+from app.persistence.unit_of_work import commit, rollback
+from app.persistence.text_search import (DESCRIPTION_SNIPPET, RANK, RANK_KEY, TITLE_HIGHLIGHT,
+                                         highlighted, match_expression, matches, places_fts)
 
-class PlaceRepository(SQLAlchemyRepository):
+# Relationships the place detail can embed
+DETAIL_EMBEDS = ('owner', 'amenities', 'reviews')
+
+# Sort key of the geographic search, typed for decode_cursor
+DISTANCE = literal_column('distance_km', Float)
+
+class PlaceRepository(CachedSQLAlchemyRepository):
     def __init__(self):
         super().__init__(Place)
 
     def get_places_by_owner(self, owner_id):
-        return self.model.query.filter_by(owner_id=owner_id).all()
+        return self.query().filter_by(owner_id=owner_id).all()
+
+    def link_amenities(self, links, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Insert (place_id, amenity_id) pairs into place_amenity, one batched INSERT per chunk."""
+        try:
+            for chunk in chunked(links, chunk_size):
+                db.session.execute(insert(place_amenity), [
+                    {'place_id': place_id, 'amenity_id': amenity_id}
+                    for place_id, amenity_id in chunk
+                ])
+            commit()
+        except Exception:
+            rollback()
+            raise
+
+    def _has_fts(self):
+        return self.read_session().get_bind().dialect.name == 'sqlite'
+
+    def _join_fts(self, query):
+        return query.join(places_fts, places_fts.c.rowid == literal_column('places.rowid'))
 
     def search_places_by_title(self, title):
-        return self.model.query.filter(Place.title.ilike(f'%{title}%')).all()
+        """Places whose title holds every word of ``title``, best match first."""
+        if not self._has_fts():
+            return self.query().filter(Place.title.ilike(f'%{title}%')).all()
+        try:
+            expression = match_expression(title, column='title')
+        except ValueError:
+            return []
+        return self._join_fts(self.query()).filter(matches(expression)).order_by(RANK).all()
+
+    def search_text(self, text, limit, cursor=None, columns=None):
+        """Full-text search of titles and descriptions, best bm25 rank first.
+
+        Only SQLite, through the ``places_fts`` index (see
+        ``app.persistence.text_search``). Returns (place, rank, title, snippet)
+        tuples, where title and snippet are HTML with the matches in <mark>,
+        and the next cursor; pages are keyed on (rank, id). Ranks depend on
+        the statistics of the whole index, so a page fetched after places
+        changed may repeat or skip a result.
+        """
+        expression = match_expression(text)
+        rank = RANK.label('rank')
+        query = self._join_fts(self.project(columns).add_columns(
+            rank, TITLE_HIGHLIGHT.label('title_html'), DESCRIPTION_SNIPPET.label('snippet')
+        )).filter(matches(expression))
+        if cursor:
+            after = decode_cursor(cursor, [RANK_KEY, Place.id])
+            query = query.filter(tuple_(RANK, Place.id) > tuple_(*after))
+        rows = query.order_by(rank, Place.id).limit(limit + 1).all()
+
+        results = [(row if columns else row[0], row.rank, highlighted(row.title_html),
+                    highlighted(row.snippet)) for row in rows]
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            place, rank, _, _ = results[-1]
+            next_cursor = encode_cursor([rank, place.id])
+        return results, next_cursor
+
+    def get_page(self, limit, cursor=None, columns=None, filters=None):
+        """Return a page of places matching ``filters``, see ``apply_filters``."""
+        keys = [(Place.created_at, False), (Place.id, False)]
+        return self.paginate(self.apply_filters(self.project(columns), filters), keys, limit, cursor)
+
+    @staticmethod
+    def apply_filters(query, filters):
+        """Restrict a query or select on places to the given criteria.
+
+        ``filters`` may hold ``min_price``, ``max_price``, ``amenities`` (ids
+        that must all be present) and ``min_rating`` (average review rating).
+        Every criterion is evaluated by the database, on indexed columns.
+        """
+        filters = filters or {}
+        if filters.get('min_price') is not None:
+            query = query.filter(Place.price >= filters['min_price'])
+        if filters.get('max_price') is not None:
+            query = query.filter(Place.price <= filters['max_price'])
+        amenity_ids = set(filters.get('amenities') or ())
+        if amenity_ids:
+            with_all = select(place_amenity.c.place_id) \
+                .where(place_amenity.c.amenity_id.in_(amenity_ids)) \
+                .group_by(place_amenity.c.place_id) \
+                .having(func.count() == len(amenity_ids))
+            query = query.filter(Place.id.in_(with_all))
+        if filters.get('min_rating') is not None:
+            # Compares the stored aggregates, without dividing by a zero count
+            query = query.filter(Place.review_count > 0,
+                                 Place.rating_sum >= filters['min_rating'] * Place.review_count)
+        return query
+
+    def get_facets(self, filters=None, price_bucket=50):
+        """Count the places matching ``filters`` per amenity and per price bucket.
+
+        Both facets come from one UNION ALL aggregate query. Amenity counts
+        apply every filter, so each tells how many results remain if that
+        amenity is added. The price histogram ignores the price bounds, so it
+        still shows the prices outside the current range.
+        """
+        filters = filters or {}
+        matching = self.apply_filters(select(Place.id), filters).subquery()
+        unpriced = {key: value for key, value in filters.items()
+                    if key not in ('min_price', 'max_price')}
+        priced = self.apply_filters(select(Place.price), unpriced).subquery()
+        bucket = cast(priced.c.price / price_bucket, Integer) * price_bucket
+
+        amenities = select(
+            literal('amenity').label('facet'), place_amenity.c.amenity_id.label('value'),
+            Amenity.name.label('label'), func.count().label('count')
+        ).join(matching, matching.c.id == place_amenity.c.place_id) \
+            .join(Amenity, Amenity.id == place_amenity.c.amenity_id) \
+            .group_by(place_amenity.c.amenity_id, Amenity.name)
+        prices = select(
+            literal('price').label('facet'), bucket.label('value'),
+            null().label('label'), func.count().label('count')
+        ).group_by(bucket)
+
+        facets = {'amenities': [], 'price': []}
+        for row in self.read_session().execute(union_all(amenities, prices)):
+            if row.facet == 'amenity':
+                facets['amenities'].append({'id': row.value, 'name': row.label, 'count': row.count})
+            else:
+                low = int(row.value)
+                facets['price'].append({'min': low, 'max': low + price_bucket, 'count': row.count})
+        facets['amenities'].sort(key=lambda facet: (-facet['count'], facet['name']))
+        facets['price'].sort(key=lambda facet: facet['min'])
+        return facets
+
+    def get_top(self, limit, amenity_id=None, columns=None):
+        """The ``limit`` best ranked places, of those having ``amenity_id`` if given.
+
+        Reads the first ``limit`` entries of the scope in the leaderboard
+        index, highest Bayesian average first, and joins them to their
+        places: the cost does not grow with the number of places or reviews.
+        Returns (place, score) pairs.
+        """
+        scope = ALL_PLACES if amenity_id is None else amenity_id
+        rows = self.project(columns).add_columns(leaderboard.c.score) \
+            .join(leaderboard, leaderboard.c.place_id == Place.id) \
+            .filter(leaderboard.c.scope == scope) \
+            .order_by(leaderboard.c.score.desc(), leaderboard.c.place_id.desc()) \
+            .limit(limit).all()
+        return [(row if columns else row[0], row.score) for row in rows]
+
+    def get_details(self, place_id, columns=None, include=DETAIL_EMBEDS):
+        """Load a place with the relationships named in ``include``.
+
+        With everything included it takes three queries whatever the number
+        of reviews: the place joined to its owner, then one SELECT ... IN for
+        the amenities and one for the reviews joined to their authors. The
+        relationships left out are neither joined nor loaded, and with
+        ``columns`` only those columns of the place are read.
+        """
+        options = []
+        if columns:
+            options.append(load_only(*[getattr(Place, name)
+                                       for name in dict.fromkeys(['id', *columns])]))
+        if 'owner' in include:
+            options.append(joinedload(Place.owner))
+        if 'amenities' in include:
+            options.append(selectinload(Place.amenities))
+        if 'reviews' in include:
+            options.append(selectinload(Place.reviews).joinedload(Review.author))
+        return self.query().options(*options).filter(Place.id == place_id).first()
+
+    def get_details_version(self, place_id, include=DETAIL_EMBEDS):
+        """Return what ``get_details`` depends on, in one single-row query, or None.
+
+        That is the place ``updated_at`` and rating aggregates and, for the
+        relationships in ``include``, the owner ``updated_at``, the latest
+        ``updated_at`` of its reviews and their authors, and the number and
+        latest ``updated_at`` of its amenities. Any edit of those rows yields
+        a new, later timestamp, so the tuple changes whenever the details do.
+        """
+        owner, author = aliased(User), aliased(User)
+        of_place = Review.place_id == Place.id
+        linked = place_amenity.c.place_id == Place.id
+        columns = [Place.updated_at, Place.review_count, Place.rating_sum]
+        if 'owner' in include:
+            columns.append(select(owner.updated_at).where(owner.id == Place.owner_id)
+                           .scalar_subquery())
+        if 'reviews' in include:
+            columns += [
+                select(func.max(Review.updated_at)).where(of_place).scalar_subquery(),
+                select(func.max(author.updated_at)).join(Review, Review.user_id == author.id)
+                .where(of_place).scalar_subquery()
+            ]
+        if 'amenities' in include:
+            columns += [
+                select(func.count()).select_from(place_amenity).where(linked).scalar_subquery(),
+                select(func.max(Amenity.updated_at))
+                .join(place_amenity, place_amenity.c.amenity_id == Amenity.id)
+                .where(linked).scalar_subquery()
+            ]
+        row = self.read_session().execute(select(*columns).where(Place.id == place_id)).first()
+        return tuple(row) if row else None
+
+    def search_area(self, boxes, origin, limit, cursor=None, radius_km=None, columns=None,
+                    filters=None):
+        """Return places inside ``boxes``, nearest to ``origin`` first, and the next cursor.
+
+        ``boxes`` are (min_lat, max_lat, min_lon, max_lon) tuples, see
+        ``app.persistence.geo``. On SQLite the candidates come from the
+        ``places_rtree`` index, so the cost follows the number of places in
+        the boxes rather than the size of the catalog. With ``radius_km``,
+        places farther than that from ``origin`` are left out. Returns
+        (place, distance_km) pairs; pages are keyed on (distance, id), and
+        the distance order, the cursor and the limit are all applied by the
+        database. ``filters`` are applied as in ``apply_filters``.
+        """
+        dialect = self.read_session().get_bind().dialect.name
+        distance = distance_km(dialect, *origin, Place.latitude, Place.longitude)
+        in_boxes = [and_(Place.latitude.between(min_lat, max_lat),
+                         Place.longitude.between(min_lon, max_lon))
+                    for min_lat, max_lat, min_lon, max_lon in boxes]
+        query = self.apply_filters(self.project(columns), filters) \
+            .add_columns(distance.label('distance_km')).filter(or_(*in_boxes))
+        if dialect == 'sqlite':
+            # One R*Tree lookup per box; the box test on places then drops the
+            # neighbours let in by the 32-bit float coordinates of the index
+            query = query.filter(Place.id.in_(union_all(*[
+                select(places_rtree.c.place_id).where(
+                    places_rtree.c.max_lat >= min_lat, places_rtree.c.min_lat <= max_lat,
+                    places_rtree.c.max_lon >= min_lon, places_rtree.c.min_lon <= max_lon)
+                for min_lat, max_lat, min_lon, max_lon in boxes
+            ])))
+        if radius_km is not None:
+            query = query.filter(distance <= radius_km)
+        if cursor:
+            after = decode_cursor(cursor, [DISTANCE, Place.id])
+            query = query.filter(tuple_(distance, Place.id) > tuple_(*after))
+        rows = query.order_by(DISTANCE, Place.id).limit(limit + 1).all()
+
+        results = [(row if columns else row[0], row.distance_km) for row in rows]
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            place, distance_value = results[-1]
+            next_cursor = encode_cursor([distance_value, place.id])
+        return results, next_cursor
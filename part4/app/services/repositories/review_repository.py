@@ -1,19 +1,154 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.place import Place
 from app.models.review import Review
-from app.persistence.repository import SQLAlchemyRepository
+from app.models.user import User
+from app.persistence.ratings import record_inserted_review
+from app.persistence.repository import CachedSQLAlchemyRepository
+from app.persistence.schema import missing_unique_indexes
+from app.persistence.unit_of_work import commit, rollback
+from app.persistence.versions import bump
 
-class ReviewRepository(SQLAlchemyRepository):
+# INSERT constructs supporting ON CONFLICT DO NOTHING
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+# The unique index ON CONFLICT relies on to refuse a second review of a place
+REVIEW_UNIQUE_INDEX = 'uq_reviews_user_id_place_id'
+
+
+def unique_insert_of(dialect_name):
+    """The ``UPSERT_INSERTS`` entry of a dialect, or None if duplicates must be checked.
+
+    None as well when upgrade_schema could not create the unique index, as
+    ON CONFLICT would then never see a conflict.
+    """
+    if REVIEW_UNIQUE_INDEX in missing_unique_indexes:
+        return None
+    return UPSERT_INSERTS.get(dialect_name)
+
+# Orders of the reviews of a place, each the key of an index after place_id
+REVIEW_SORTS = {
+    'newest': ('created_at', 'id'),
+    'rating': ('rating', 'id'),
+}
+
+
+def unique_insert(review, make_insert):
+    """The INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING statement of ``insert_unique``.
+
+    Shared with the async facade; ``make_insert`` is the dialect's entry of
+    ``UPSERT_INSERTS``.
+    """
+    table = Review.__table__
+    now = datetime.utcnow()
+    values = {'id': review.id or str(uuid.uuid4()), 'text': review.text,
+              'rating': review.rating, 'user_id': review.user_id,
+              'place_id': review.place_id, 'created_at': now, 'updated_at': now}
+    source = select(*[Place.id if name == 'place_id' else literal(value, table.c[name].type)
+                      for name, value in values.items()]) \
+        .where(Place.id == review.place_id, Place.owner_id != review.user_id)
+    return make_insert(Review).from_select(list(values), source) \
+        .on_conflict_do_nothing().returning(Review)
+
+
+def record_unique_insert(session, review):
+    # Core inserts are not seen by the flush hooks
+    record_inserted_review(session, review.place_id, review.rating)
+    bump(session, ['reviews'])
+
+
+class ReviewRepository(CachedSQLAlchemyRepository):
     def __init__(self):
         super().__init__(Review)
 
+    def get_page(self, limit, cursor=None, columns=None, include=()):
+        """Return a page of reviews as in ``get_page`` of the base repository.
+
+        With ``'author'`` in ``include``, each row also carries the
+        ``author_first_name`` and ``author_last_name`` of its author, read by
+        the same query through a join.
+        """
+        keys = [(Review.created_at, False), (Review.id, False)]
+        return self.paginate(self._select(columns, include), keys, limit, cursor)
+
+    def insert_unique(self, review):
+        """Insert ``review`` unless its author owns the place or already reviewed it.
+
+        A single INSERT ... SELECT FROM places ... ON CONFLICT DO NOTHING
+        RETURNING statement: the place must exist and belong to someone else,
+        and the (user_id, place_id) unique index turns a concurrent duplicate
+        into no row rather than an error. Returns the inserted Review, or None
+        when nothing was inserted. ``review`` is a transient Review whose
+        validators already ran.
+        """
+        make_insert = unique_insert_of(db.session.get_bind().dialect.name)
+        if make_insert is None:
+            return self._add_unique(review)
+        statement = unique_insert(review, make_insert)
+        try:
+            inserted = db.session.execute(statement).scalars().first()
+            if inserted is not None:
+                record_unique_insert(db.session, inserted)
+            commit()
+        except Exception:
+            rollback()
+            raise
+        return inserted
+
+    def _add_unique(self, review):
+        # Without ON CONFLICT: check the place and an existing review, then
+        # let the unique index, if any, reject a concurrent duplicate inside
+        # a savepoint
+        place = db.session.get(Place, review.place_id)
+        if place is None or place.owner_id == review.user_id:
+            return None
+        if db.session.query(Review.id).filter_by(user_id=review.user_id,
+                                                 place_id=review.place_id).first():
+            return None
+        try:
+            with db.session.begin_nested():
+                db.session.add(review)
+        except IntegrityError:
+            return None
+        commit()
+        return review
+
+    def get_place_page(self, place_id, limit, cursor=None, sort='newest', columns=None,
+                       include=()):
+        """Return a page of the reviews of a place in ``sort`` order, and the next cursor.
+
+        Both orders are seeks on a (place_id, sort key, id) index, so a deep
+        page of a place with many reviews costs the same as the first one.
+        ``columns`` and ``include`` work as in ``get_page``.
+        """
+        if sort not in REVIEW_SORTS:
+            raise ValueError(f"sort must be one of: {', '.join(REVIEW_SORTS)}")
+        keys = [(getattr(Review, name), True) for name in REVIEW_SORTS[sort]]
+        query = self._select(columns, include).filter(Review.place_id == place_id)
+        return self.paginate(query, keys, limit, cursor)
+
+    def _select(self, columns, include):
+        query = self.project(columns)
+        if 'author' in include:
+            if not columns:
+                query = self.project([column.key for column in Review.__table__.columns])
+            query = query.join(User, User.id == Review.user_id).add_columns(
+                User.first_name.label('author_first_name'),
+                User.last_name.label('author_last_name'))
+        return query
+
     def get_reviews_by_user(self, user_id):
-        return self.model.query.filter_by(user_id=user_id).all()
+        return self.query().filter_by(user_id=user_id).all()
 
     def get_reviews_by_place(self, place_id):
-        return self.model.query.filter_by(place_id=place_id).all()
+        return self.query().filter_by(place_id=place_id).all()
 
     def get_average_rating(self, place_id):
-        from sqlalchemy import func
-        result = self.model.query.with_entities(
-            func.avg(Review.rating)
-        ).filter_by(place_id=place_id).scalar()
-        return float(result) if result else 0.0
+        # Read from the aggregates stored on the place, see app.persistence.ratings
+        result = self.read_session().query(Place.rating_sum, Place.review_count) \
+            .filter_by(id=place_id).first()
+        return result.rating_sum / result.review_count if result and result.review_count else 0.0
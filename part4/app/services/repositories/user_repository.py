@@ -1,15 +1,15 @@
 from app.models.user import User
-from app.persistence.repository import SQLAlchemyRepository
+from app.persistence.repository import CachedSQLAlchemyRepository
 
-class UserRepository(SQLAlchemyRepository):
+class UserRepository(CachedSQLAlchemyRepository):
     def __init__(self):
         super().__init__(User)
 
     def get_user_by_email(self, email):
-        return self.model.query.filter_by(email=email).first()
+        return self.query().filter_by(email=email).first()
 
     def email_exists(self, email):
-        return self.model.query.filter_by(email=email).first() is not None
+        return self.query().filter_by(email=email).first() is not None
 
     def get_admin_users(self):
-        return self.model.query.filter_by(is_admin=True).all()
+        return self.query().filter_by(is_admin=True).all()
@@ -0,0 +1,169 @@
+"""Write-behind ingestion of reviews.
+
+With ``REVIEW_QUEUE_ENABLED``, a submitted review is validated, journaled
+in a local SQLite job queue (see app.persistence.job_queue) and answered
+at once; a writer thread drains the journal in batches, writing each
+batch of reviews in one transaction instead of one per request.
+
+A job's id is the id of the review it creates, so a batch replayed after
+a crash finds its reviews already written rather than failing them as
+duplicates.
+"""
+import os
+import threading
+import time
+import uuid
+from app.models.review import Review
+from app.persistence.job_queue import JobQueue
+from app.persistence.repository import ConflictError
+from app.persistence.unit_of_work import unit_of_work
+from app.services import facade
+
+
+class ReviewQueue:
+    """Journal of submitted reviews and the writer draining it."""
+
+    # Seconds before a claimed batch whose writer died is claimed again
+    lease = 60
+    # Claims of a job before it fails for good on unexpected errors
+    max_attempts = 3
+    # Seconds the status of a finished job stays readable
+    retention = 24 * 3600
+
+    def __init__(self):
+        self.app = None
+        self.journal = None
+        self.batch_size = 200
+        self.interval = 0.5
+        self._writer = None
+        self._writer_pid = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._pruned_at = 0
+
+    def init_app(self, app):
+        self.stop()
+        self.app = app
+        if not app.config.get('REVIEW_QUEUE_ENABLED'):
+            self.journal = None
+            return
+        path = app.config.get('REVIEW_QUEUE_PATH', 'review_queue.db')
+        if not os.path.isabs(path):
+            os.makedirs(app.instance_path, exist_ok=True)
+            path = os.path.join(app.instance_path, path)
+        self.journal = JobQueue(path)
+        self.batch_size = app.config.get('REVIEW_QUEUE_BATCH_SIZE', 200)
+        self.interval = app.config.get('REVIEW_QUEUE_INTERVAL', 0.5)
+        # Jobs left by a previous run are written without waiting for a new one
+        self.start()
+
+    @property
+    def enabled(self):
+        return self.journal is not None
+
+    def submit(self, review_data):
+        """Validate a review and journal it, returning the id it will be written under.
+
+        The fields go through the model validators and the place is looked
+        up, so an invalid review is refused now with a ValueError. A second
+        review of the same place is only detected by the writer.
+        """
+        review = Review(**review_data, id=str(uuid.uuid4()))
+        place = facade.get_place(review.place_id)
+        if place is None:
+            raise ValueError("Place not found")
+        if place.owner_id == review.user_id:
+            raise ValueError("You cannot review your own place")
+        self.journal.enqueue(review.id, {'text': review.text, 'rating': review.rating,
+                                         'user_id': review.user_id,
+                                         'place_id': review.place_id})
+        self.start()
+        self._wake.set()
+        return review.id
+
+    def get(self, review_id):
+        """The status of a submitted review, see ``JobQueue.get``."""
+        return self.journal.get(review_id)
+
+    def drain(self):
+        """Write one batch of queued reviews in one transaction, returning its size.
+
+        Reviews refused by the facade (duplicate, place deleted since) fail
+        alone; an unexpected error rolls the batch back and puts its jobs
+        back in the queue, up to ``max_attempts`` claims each. Must run in
+        an application context.
+        """
+        jobs = self.journal.claim(self.batch_size, self.lease)
+        if not jobs:
+            self._prune()
+            return 0
+        done, failed = [], {}
+        try:
+            with unit_of_work():
+                for review_id, data, attempts in jobs:
+                    try:
+                        facade.create_review({**data, 'id': review_id})
+                        done.append(review_id)
+                    except ConflictError as e:
+                        # Written by an earlier claim of this job, before a crash
+                        if attempts > 1 and facade.get_review(review_id) is not None:
+                            done.append(review_id)
+                        else:
+                            failed[review_id] = str(e)
+                    except ValueError as e:
+                        failed[review_id] = str(e)
+        except Exception as e:
+            self.journal.release([review_id for review_id, _, _ in jobs], str(e),
+                                 self.max_attempts)
+            raise
+        self.journal.finish(done, failed)
+        return len(jobs)
+
+    def _prune(self):
+        if time.time() - self._pruned_at > 60:
+            self._pruned_at = time.time()
+            self.journal.prune(self.retention)
+
+    def start(self):
+        """Start the writer thread of this process unless it runs already.
+
+        Nothing is started without ``REVIEW_QUEUE_WRITER``, for deployments
+        where another process drains the journal.
+        """
+        if not self.enabled or not self.app.config.get('REVIEW_QUEUE_WRITER', True):
+            return
+        # A forked worker does not inherit the thread of its parent
+        if self._writer is not None and self._writer.is_alive() \
+                and self._writer_pid == os.getpid():
+            return
+        self._stopping.clear()
+        self._writer = threading.Thread(target=self._run, name='review-queue-writer',
+                                        daemon=True)
+        self._writer_pid = os.getpid()
+        self._writer.start()
+
+    def stop(self, timeout=5):
+        """Stop the writer after its current batch; queued jobs stay journaled."""
+        if self._writer is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        if self._writer is not threading.current_thread():
+            self._writer.join(timeout)
+        self._writer = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    written = self.drain()
+            except Exception as e:
+                print(f"⚠️ Review queue writer: {e}")
+                written = 0
+            # A full batch suggests more are waiting
+            if written < self.batch_size:
+                self._wake.wait(self.interval)
+
+
+review_queue = ReviewQueue()
@@ -6,7 +6,8 @@ from app.models.amenity import Amenity
 import sqlalchemy as sa
 import uuid
 
-app = create_app()
+# An in-memory database: running the tests must not write to instance/hbnb_dev.db
+app = create_app('config.TestingConfig')
 
 with app.app_context():
     print("🎯 TEST COMPLET DES 4 MODÈLES SQLALCHEMY")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Tests for the asyncio repository and facade"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.persistence.cache import entity_cache
+from app.persistence.repository import ConflictError
+from app.persistence.response_cache import MemoryBackend, response_cache
+from app.services.async_facade import AsyncHBnBFacade
+from app.services.facade import HBnBFacade
+
+# The methods of HBnBFacade the async facade mirrors, see its docstring
+ENTITY_METHOD = re.compile(r'((bulk_)?(create|update|delete)|get(_all)?)_'
+                           r'(user|place|review|amenity|amenitie)s?(_page)?$|get_\w+_by_\w+$')
+
+
+class TestAsyncFacade(unittest.IsolatedAsyncioTestCase):
+
+    def test_mirrors_the_entity_methods(self):
+        public = {name for name in dir(AsyncHBnBFacade) if not name.startswith('_')}
+        mirrored = {name for name in public if ENTITY_METHOD.match(name)}
+        self.assertEqual(mirrored, {name for name in dir(HBnBFacade)
+                                    if ENTITY_METHOD.match(name)})
+        self.assertTrue(all(asyncio.iscoroutinefunction(getattr(AsyncHBnBFacade, name))
+                            for name in mirrored))
+        self.assertEqual(public - mirrored, {'from_config', 'unit_of_work', 'create_all',
+                                             'dispose', 'hash_password', 'verify_password'})
+
+    async def asyncSetUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.facade = AsyncHBnBFacade(f'sqlite:///{self.path}', pepper='pepper')
+        await self.facade.create_all()
+
+    async def asyncTearDown(self):
+        await self.facade.dispose()
+        os.remove(self.path)
+
+    async def _user(self, email='owner@example.com'):
+        return await self.facade.create_user({
+            'first_name': 'Owner', 'last_name': 'Test', 'email': email, 'password': 'secret'
+        })
+
+    async def _place(self, owner, title='Flat', amenities=()):
+        return await self.facade.create_place({
+            'title': title, 'description': 'desc', 'price': 10.0, 'latitude': 1.0,
+            'longitude': 2.0, 'owner_id': owner.id, 'amenities': list(amenities)
+        })
+
+    async def test_password_hashed_off_the_event_loop(self):
+        user = await self._user()
+        self.assertNotEqual(user.password, 'secret')
+        self.assertTrue(await self.facade.verify_password(user, 'secret'))
+        self.assertFalse(await self.facade.verify_password(user, 'wrong'))
+        found = await self.facade.get_user_by_email('owner@example.com')
+        self.assertEqual(found.id, user.id)
+
+    async def test_place_amenities_loaded_with_place(self):
+        owner = await self._user()
+        wifi = await self.facade.create_amenity({'name': 'Wifi'})
+        pool = await self.facade.create_amenity({'name': 'Pool'})
+        place = await self._place(owner, amenities=[wifi.id, pool.id])
+
+        # The session is closed: amenities must already be loaded
+        loaded = await self.facade.get_place(place.id)
+        self.assertEqual(sorted(amenity.name for amenity in loaded.amenities), ['Pool', 'Wifi'])
+
+        updated = await self.facade.update_place(place.id, {'title': 'Loft', 'amenities': [pool.id]})
+        self.assertEqual(updated.title, 'Loft')
+        loaded = await self.facade.get_place(place.id)
+        self.assertEqual([amenity.id for amenity in loaded.amenities], [pool.id])
+
+    async def test_keyset_pages_and_projection(self):
+        owner = await self._user()
+        for i in range(5):
+            await self._place(owner, title=f'Place {i}')
+
+        first, cursor = await self.facade.get_places_page(3)
+        self.assertEqual([place.title for place in first], ['Place 0', 'Place 1', 'Place 2'])
+        second, cursor = await self.facade.get_places_page(3, cursor, columns=['title'])
+        self.assertEqual([row.title for row in second], ['Place 3', 'Place 4'])
+        self.assertIsNone(cursor)
+
+    async def test_unit_of_work_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            async with self.facade.unit_of_work():
+                await self.facade.create_amenity({'name': 'Sauna'})
+                raise RuntimeError('boom')
+        self.assertIsNone(await self.facade.get_amenity_by_name('Sauna'))
+
+    async def test_delete_user_cascades_to_places(self):
+        owner = await self._user()
+        place = await self._place(owner)
+        self.assertTrue(await self.facade.delete_user(owner.id))
+        self.assertIsNone(await self.facade.get_place(place.id))
+
+    async def test_reviews_by_place_and_user_return_them_all(self):
+        owner = await self._user()
+        guests = [await self._user(f'guest{i}@example.com') for i in range(2)]
+        flat, loft = await self._place(owner), await self._place(owner, title='Loft')
+        for guest in guests:
+            await self.facade.create_review({'text': 'Nice', 'rating': 4,
+                                             'user_id': guest.id, 'place_id': flat.id})
+        await self.facade.create_review({'text': 'Fine', 'rating': 3,
+                                         'user_id': guests[0].id, 'place_id': loft.id})
+        self.assertEqual(len(await self.facade.get_reviews_by_place(flat.id)), 2)
+        self.assertEqual(len(await self.facade.get_reviews_by_user(guests[0].id)), 2)
+
+    async def test_create_review_refuses_duplicates_and_own_places(self):
+        owner, guest = await self._user(), await self._user('guest@example.com')
+        place = await self._place(owner)
+        review = {'text': 'Nice', 'rating': 4, 'user_id': guest.id, 'place_id': place.id}
+        await self.facade.create_review(review)
+        with self.assertRaises(ConflictError):
+            await self.facade.create_review({**review, 'rating': 2})
+        with self.assertRaises(ValueError):
+            await self.facade.create_review({**review, 'user_id': owner.id})
+        with self.assertRaises(ValueError):
+            await self.facade.create_review({**review, 'place_id': 'missing'})
+        # The aggregates counted the one inserted review
+        place = await self.facade.get_place(place.id)
+        self.assertEqual((place.review_count, place.rating_sum), (1, 4))
+
+    async def test_writes_drop_cached_entries(self):
+        owner = await self._user()
+        place = await self._place(owner)
+        backend, response_cache.backend = response_cache.backend, MemoryBackend()
+        entity_cache.configure(100, 60)
+        try:
+            response_cache.backend.set('/places/detail', ['{}', {}], {f'place:{place.id}'}, 60)
+            response_cache.backend.set('/amenities', ['[]', {}], {'amenities'}, 60)
+            entity_cache.put(('Place', place.id), {'title': 'Flat'})
+            await self.facade.update_place(place.id, {'title': 'Loft'})
+            self.assertIsNone(response_cache.backend.get('/places/detail'))
+            self.assertIsNone(entity_cache.get(('Place', place.id)))
+            self.assertIsNotNone(response_cache.backend.get('/amenities'))
+            await self.facade.create_amenity({'name': 'Wifi'})
+            self.assertIsNone(response_cache.backend.get('/amenities'))
+        finally:
+            response_cache.backend = backend
+            entity_cache.configure(100, 60, enabled=False)
+
+    async def test_nested_write_invalidates_on_outer_commit(self):
+        owner = await self._user()
+        place = await self._place(owner)
+        key = ('Place', place.id)
+        entity_cache.configure(100, 60)
+        try:
+            async with self.facade.unit_of_work():
+                await self.facade.update_place(place.id, {'title': 'Loft'})
+                # What a reader would cache from the still committed row
+                entity_cache.put(key, {'title': 'Flat'})
+            self.assertIsNone(entity_cache.get(key))
+        finally:
+            entity_cache.configure(100, 60, enabled=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Tests for the bulk repository and facade methods"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.models.place import Place
+from app.models.review import Review
+from app.services.facade import facade
+
+
+class TestBulkWrites(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.statements = []
+        self.commits = 0
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        event.listen(db.engine, 'commit', self._on_commit)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        event.remove(db.engine, 'commit', self._on_commit)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split()[0].upper())
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def _owner(self):
+        return facade.create_user({'first_name': "Owner", 'last_name': "One",
+                                   'email': "owner@example.com", 'password': "secret"})
+
+    def test_add_many_batches_inserts_in_one_transaction(self):
+        """Test 50 rows in chunks of 20 cost 3 INSERTs and 1 commit"""
+        facade.bulk_create_amenities([{'name': f"Amenity {i}"} for i in range(50)], chunk_size=20)
+        self.assertEqual(self.statements.count('INSERT'), 3)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(Amenity.query.count(), 50)
+
+    def test_add_many_rolls_back_the_whole_batch(self):
+        """Test a failing chunk leaves no row of the batch behind"""
+        data = [{'name': f"Amenity {i}"} for i in range(10)] + [{'name': "Amenity 0"}]
+        with self.assertRaises(Exception):
+            facade.bulk_create_amenities(data, chunk_size=5)
+        self.assertEqual(Amenity.query.count(), 0)
+
+    def test_bulk_create_places_resolves_amenities_at_once(self):
+        """Test places get their amenities and unknown ids are skipped"""
+        owner = self._owner()
+        wifi, pool = facade.bulk_create_amenities([{'name': "Wifi"}, {'name': "Pool"}])
+        places = facade.bulk_create_places([{
+            'title': f"Place {i}", 'description': "", 'price': 10 + i,
+            'latitude': 0, 'longitude': 0, 'owner_id': owner.id,
+            'amenities': [wifi.id, pool.id, "unknown"]
+        } for i in range(3)])
+        self.assertEqual(len(places), 3)
+        for place in Place.query.all():
+            self.assertEqual({a.name for a in place.amenities}, {"Wifi", "Pool"})
+
+    def test_update_many_validates_and_commits_once(self):
+        """Test bulk updates run the validators inside one transaction"""
+        amenities = facade.bulk_create_amenities([{'name': f"Amenity {i}"} for i in range(4)])
+        self.commits = 0
+        facade.bulk_update_amenities({a.id: {'name': f"  Renamed {i}  "}
+                                      for i, a in enumerate(amenities)}, chunk_size=2)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(sorted(a.name for a in Amenity.query), [f"Renamed {i}" for i in range(4)])
+
+    def test_delete_many_cascades(self):
+        """Test bulk place deletion also removes the places' reviews"""
+        owner = self._owner()
+        reviewer = facade.create_user({'first_name': "Guest", 'last_name': "Two",
+                                       'email': "guest@example.com", 'password': "secret"})
+        places = facade.bulk_create_places([{
+            'title': f"Place {i}", 'description': "", 'price': 10,
+            'latitude': 0, 'longitude': 0, 'owner_id': owner.id
+        } for i in range(3)])
+        facade.bulk_create_reviews([{'text': "Nice", 'rating': 4, 'user_id': reviewer.id,
+                                     'place_id': place.id} for place in places])
+        self.commits = 0
+        deleted = facade.bulk_delete_places([place.id for place in places] + ["unknown"])
+        self.assertEqual(deleted, 3)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(Place.query.count(), 0)
+        self.assertEqual(Review.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Tests for the entity cache and the cached repository"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.persistence.cache import EntityCache, entity_cache
+from app.persistence.unit_of_work import unit_of_work
+from app.services.facade import facade
+
+
+class TestEntityCache(unittest.TestCase):
+
+    def test_hits_and_misses_are_counted(self):
+        """Test get counts a miss before put and a hit after"""
+        cache = EntityCache(maxsize=4, ttl=60, enabled=True)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_entries_expire(self):
+        """Test an entry older than the TTL is a miss"""
+        cache = EntityCache(maxsize=4, ttl=0.01, enabled=True)
+        cache.put('a', 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+
+    def test_admission_prefers_frequent_keys(self):
+        """Test a cold key does not evict a key requested more often"""
+        cache = EntityCache(maxsize=2, ttl=60, enabled=True)
+        for key in ('a', 'b'):
+            cache.put(key, key)
+            cache.get(key)
+            cache.get(key)
+        cache.put('cold', 'cold')
+        self.assertIsNone(cache.get('cold'))
+        self.assertEqual(cache.stats()['rejections'], 1)
+        for _ in range(5):
+            cache.get('hot')
+        cache.put('hot', 'hot')
+        self.assertEqual(cache.get('hot'), 'hot')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_disabled_cache_is_a_no_op(self):
+        """Test nothing is stored while the cache is disabled"""
+        cache = EntityCache(maxsize=4, ttl=60, enabled=False)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class TestCachedRepository(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        entity_cache.configure(maxsize=100, ttl=60, enabled=True)
+        self.queries = 0
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+        self.user = facade.create_user({'first_name': "Jane", 'last_name': "Doe",
+                                        'email': "jane@example.com", 'password': "secret"})
+        self.user_id = self.user.id
+        db.session.remove()
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._count)
+        entity_cache.configure(maxsize=100, ttl=60, enabled=False)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def test_get_is_served_from_cache(self):
+        """Test a second get in a new session runs no query"""
+        facade.get_user(self.user_id)
+        db.session.remove()
+        self.queries = 0
+        user = facade.get_user(self.user_id)
+        self.assertEqual(self.queries, 0)
+        self.assertEqual(user.email, "jane@example.com")
+        self.assertIn(user, db.session)
+
+    def test_get_by_attribute_is_served_from_cache(self):
+        """Test a repeated email lookup runs no query"""
+        facade.get_user_by_email("jane@example.com")
+        db.session.remove()
+        self.queries = 0
+        self.assertEqual(facade.get_user_by_email("jane@example.com").id, self.user_id)
+        self.assertEqual(self.queries, 0)
+
+    def test_get_many_loads_only_uncached_ids(self):
+        """Test get_many serves cached users and loads the others with one query"""
+        other_id = facade.create_user({'first_name': "John", 'last_name': "Doe",
+                                       'email': "john@example.com", 'password': "secret"}).id
+        facade.get_user(self.user_id)
+        db.session.remove()
+        self.queries = 0
+        users = facade.get_many_users([self.user_id, other_id, "missing"])
+        self.assertEqual(set(users), {self.user_id, other_id})
+        self.assertEqual(self.queries, 1)
+        db.session.remove()
+        self.queries = 0
+        facade.get_many_users([self.user_id, other_id])
+        self.assertEqual(self.queries, 0)
+
+    def test_update_invalidates(self):
+        """Test an update is visible through the cache"""
+        facade.get_user(self.user_id)
+        facade.update_user(self.user_id, {'first_name': "Janet"})
+        db.session.remove()
+        self.assertEqual(facade.get_user(self.user_id).first_name, "Janet")
+
+    def test_changed_attribute_is_not_served(self):
+        """Test a cached email lookup does not return a user whose email changed"""
+        facade.get_user_by_email("jane@example.com")
+        facade.update_user(self.user_id, {'email': "janet@example.com"})
+        db.session.remove()
+        self.assertIsNone(facade.get_user_by_email("jane@example.com"))
+
+    def test_delete_invalidates(self):
+        """Test a deleted entity is no longer returned"""
+        facade.get_user(self.user_id)
+        facade.delete_user(self.user_id)
+        db.session.remove()
+        self.assertIsNone(facade.get_user(self.user_id))
+
+    def test_restored_instance_can_be_updated(self):
+        """Test an instance rebuilt from a snapshot is persisted on update"""
+        facade.get_user(self.user_id)
+        db.session.remove()
+        user = facade.get_user(self.user_id)
+        user.last_name = "Smith"
+        db.session.commit()
+        db.session.remove()
+        entity_cache.clear()
+        self.assertEqual(facade.get_user(self.user_id).last_name, "Smith")
+
+    def test_write_is_invalidated_again_on_commit(self):
+        """Test a stale row cached by another reader before the commit is dropped"""
+        key = ('User', self.user_id)
+        snapshot = facade.get_user(self.user_id).to_dict()
+        with unit_of_work():
+            facade.update_user(self.user_id, {'first_name': "Janet"})
+            self.assertIsNone(entity_cache.get(key))
+            # What a reader on another thread would cache before the commit
+            entity_cache.put(key, snapshot)
+        self.assertIsNone(entity_cache.get(key))
+
+    def test_flushed_rows_are_not_cached(self):
+        """Test a row written but not committed is not shared through the cache"""
+        with unit_of_work():
+            user_id = facade.create_user({'first_name': "John", 'last_name': "Doe",
+                                          'email': "john@example.com", 'password': "x"}).id
+            self.assertEqual(facade.get_user_by_email("john@example.com").id, user_id)
+            self.assertIsNone(entity_cache.get(('User', user_id)))
+
+    def test_rollback_drops_only_its_keys(self):
+        """Test a failed write leaves the entries it did not touch in the cache"""
+        facade.get_user(self.user_id)
+        db.session.remove()
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                user_id = facade.create_user({'first_name': "John", 'last_name': "Doe",
+                                              'email': "john@example.com", 'password': "x"}).id
+                facade.get_user_by_email("john@example.com")
+                raise ValueError("refused")
+        self.assertIsNotNone(entity_cache.get(('User', self.user_id)))
+        self.assertIsNone(entity_cache.get(('User', 'email', "john@example.com")))
+        self.assertIsNone(entity_cache.get(('User', user_id)))
+
+
+if __name__ == '__main__':
+    unittest.main()
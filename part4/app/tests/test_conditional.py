@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Tests for the ETags and conditional GET of the read endpoints"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.review import Review
+from app.models.user import User
+from app.services.facade import facade
+
+
+class TestConditionalGet(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="One", email="owner@example.com")
+        self.guest = User(first_name="Guest", last_name="Two", email="guest@example.com")
+        for user in (self.owner, self.guest):
+            user.password = "not-a-hash"
+        db.session.add_all([self.owner, self.guest])
+        db.session.commit()
+        self.owner_id, self.guest_id = self.owner.id, self.guest.id
+        self.wifi = facade.create_amenity({'name': "Wifi"})
+        self.place_id = facade.create_place({
+            'title': "Loft", 'description': "Bright", 'price': 80, 'latitude': 0,
+            'longitude': 0, 'owner_id': self.owner_id, 'amenities': [self.wifi.id]
+        }).id
+        self.client = self.app.test_client()
+        self.queries = 0
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+
+    def _revalidate(self, url, etag):
+        return self.client.get(url, headers={'If-None-Match': etag})
+
+    def _assert_changes(self, url, change):
+        """GET url, check a 304 on revalidation, then that ``change`` yields a new tag"""
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertEqual(self._revalidate(url, etag).status_code, 304)
+        change()
+        db.session.remove()
+        second = self._revalidate(url, etag)
+        self.assertEqual(second.status_code, 200, url)
+        self.assertNotEqual(second.headers['ETag'], etag)
+
+    def test_not_modified_has_no_body(self):
+        """Test a matching If-None-Match answers 304 with the tag and no body"""
+        url = f'/api/v1/places/{self.place_id}'
+        etag = self.client.get(url).headers['ETag']
+        self.assertTrue(etag.startswith('"'))
+        response = self._revalidate(url, f'"other", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data, b'')
+
+    def test_not_modified_skips_the_payload_queries(self):
+        """Test the 304 of a place detail costs one validator query"""
+        url = f'/api/v1/places/{self.place_id}'
+        etag = self.client.get(url).headers['ETag']
+        self.queries = 0
+        self.assertEqual(self._revalidate(url, etag).status_code, 304)
+        self.assertEqual(self.queries, 1)
+
+    def test_detail_tag_follows_reviews(self):
+        """Test a new review changes the place detail tag"""
+        self._assert_changes(f'/api/v1/places/{self.place_id}', lambda: facade.create_review(
+            {'text': "Nice", 'rating': 5, 'user_id': self.guest_id, 'place_id': self.place_id}))
+
+    def test_detail_tag_follows_amenities_and_owner(self):
+        """Test relinked amenities and a renamed owner change the detail tag"""
+        url = f'/api/v1/places/{self.place_id}'
+        pool = facade.create_amenity({'name': "Pool"})
+        self._assert_changes(url, lambda: facade.update_place(self.place_id,
+                                                              {'amenities': [pool.id]}))
+        self._assert_changes(url, lambda: facade.update_user(self.owner_id,
+                                                             {'first_name': "Olga"}))
+
+    def test_list_tags_follow_table_versions(self):
+        """Test list tags change with writes to the tables they show"""
+        self._assert_changes('/api/v1/amenities/', lambda: facade.create_amenity({'name': "Gym"}))
+        self._assert_changes('/api/v1/places/', lambda: facade.update_place(
+            self.place_id, {'price': 95}))
+        self._assert_changes('/api/v1/places/', lambda: db.session.add(Review(
+            text="Fine", rating=3, user_id=self.guest_id, place_id=self.place_id))
+            or db.session.commit())
+
+    def test_query_string_is_part_of_the_tag(self):
+        """Test two pages of the same list never share a tag"""
+        first = self.client.get('/api/v1/amenities/?limit=1').headers['ETag']
+        second = self.client.get('/api/v1/amenities/?limit=2').headers['ETag']
+        self.assertNotEqual(first, second)
+        self.assertEqual(self._revalidate('/api/v1/amenities/?limit=2', first).status_code, 200)
+
+    def test_cors_exposes_the_tag(self):
+        """Test browsers may read ETag and send If-None-Match cross-origin"""
+        response = self.client.get('/api/v1/amenities/', headers={'Origin': 'http://example.com'})
+        self.assertIn('ETag', response.headers['Access-Control-Expose-Headers'])
+
+
+if __name__ == '__main__':
+    unittest.main()
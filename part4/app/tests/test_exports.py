@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Tests for the streaming iteration and the NDJSON export endpoints"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.api.v1.exports import ndjson_lines
+from app.models.user import User
+from app.services.facade import facade
+
+
+class TestExports(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        facade.create_user({'first_name': "Admin", 'last_name': "Root",
+                            'email': "admin@example.com", 'password': "secret",
+                            'is_admin': True})
+        facade.create_user({'first_name': "Guest", 'last_name': "Two",
+                            'email': "guest@example.com", 'password': "secret"})
+        self.headers = self._login("admin@example.com")
+        owners = [User(first_name="Owner", last_name=str(i), email=f"owner{i}@example.com")
+                  for i in range(5)]
+        for owner in owners:
+            owner.password = "not-a-hash"
+        db.session.add_all(owners)
+        db.session.commit()
+        self.place_ids = [facade.create_place({
+            'title': f"Place {i}", 'description': "", 'price': 80.5, 'latitude': 0,
+            'longitude': 0, 'owner_id': owners[i].id, 'amenities': []
+        }).id for i in range(5)]
+        self.queries = 0
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+
+    def _login(self, email):
+        response = self.client.post('/api/v1/auth/login',
+                                    json={'email': email, 'password': "secret"})
+        return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+    def _export(self, table):
+        response = self.client.get(f'/api/v1/exports/{table}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_iter_all_streams_in_one_query(self):
+        """Test iter_all yields every row in (created_at, id) order from a single SELECT"""
+        rows = facade.iter_places(batch_size=2, columns=('title',))
+        self.assertEqual(self.queries, 0)
+        self.assertEqual([row.id for row in rows], self.place_ids)
+        self.assertEqual(self.queries, 1)
+
+    def test_ndjson_is_written_per_batch(self):
+        """Test the body is produced as one chunk per batch of rows"""
+        chunks = list(ndjson_lines(facade.iter_places(2, ('title',)), ('id', 'title'), 2))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 2, 1])
+
+    def test_users_export_has_no_password(self):
+        """Test every user is exported, without the password hash"""
+        users = self._export('users')
+        self.assertEqual(len(users), 7)
+        self.assertNotIn('password', users[0])
+        self.assertTrue(users[0]['is_admin'])
+
+    def test_places_export_values(self):
+        """Test prices and timestamps are written as JSON numbers and ISO strings"""
+        places = self._export('places')
+        self.assertEqual([place['id'] for place in places], self.place_ids)
+        self.assertEqual(places[0]['price'], 80.5)
+        self.assertIn('T', places[0]['created_at'])
+
+    def test_empty_export(self):
+        """Test an empty table streams an empty body"""
+        self.assertEqual(self._export('reviews'), [])
+
+    def test_exports_are_admin_only(self):
+        """Test non-admins get a 403, anonymous clients a 401 and unknown tables a 404"""
+        guest = self._login("guest@example.com")
+        self.assertEqual(self.client.get('/api/v1/exports/users', headers=guest).status_code, 403)
+        self.assertEqual(self.client.get('/api/v1/exports/users').status_code, 401)
+        response = self.client.get('/api/v1/exports/passwords', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
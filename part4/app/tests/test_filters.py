@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests for the server-side filters and facets of the place list"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.services.facade import facade
+
+
+class TestPlaceFilters(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="One", email="owner@example.com")
+        owner.password = "not-a-hash"
+        # A user reviews a place at most once
+        guests = [User(first_name="Guest", last_name=str(i), email=f"guest{i}@example.com")
+                  for i in range(2)]
+        for guest in guests:
+            guest.password = "not-a-hash"
+        db.session.add_all([owner, *guests])
+        self.wifi, self.pool, self.gym = facade.bulk_create_amenities(
+            [{'name': "Wifi"}, {'name': "Pool"}, {'name': "Gym"}])
+        # title: (price, amenities, ratings)
+        catalogue = {
+            'Cabin': (40, [self.wifi], [5, 4]),
+            'Loft': (90, [self.wifi, self.pool], [3]),
+            'Villa': (240, [self.wifi, self.pool, self.gym], [5]),
+            'Tent': (15, [], []),
+        }
+        for title, (price, amenities, ratings) in catalogue.items():
+            place = Place(title=title, description="", price=price, latitude=0, longitude=0)
+            place.owner = owner
+            place.amenities = amenities
+            db.session.add(place)
+            db.session.flush()
+            for guest, rating in zip(guests, ratings):
+                db.session.add(Review(text="Stay", rating=rating, user_id=guest.id,
+                                      place_id=place.id))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _page(self, query=''):
+        response = self.client.get(f'/api/v1/places/?{query}')
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()
+
+    def _titles(self, query):
+        return sorted(item['title'] for item in self._page(query)['items'])
+
+    def test_price_range(self):
+        """Test min_price and max_price bound the price, both included"""
+        self.assertEqual(self._titles('max_price=90'), ['Cabin', 'Loft', 'Tent'])
+        self.assertEqual(self._titles('min_price=40&max_price=90'), ['Cabin', 'Loft'])
+
+    def test_places_must_have_all_amenities(self):
+        """Test amenities= keeps places having every listed amenity"""
+        self.assertEqual(self._titles(f'amenities={self.wifi.id},{self.pool.id}'),
+                         ['Loft', 'Villa'])
+        self.assertEqual(self._titles(f'amenities={self.gym.id}'), ['Villa'])
+
+    def test_min_rating_uses_average(self):
+        """Test min_rating compares the average rating, unrated places excluded"""
+        self.assertEqual(self._titles('min_rating=4.5'), ['Cabin', 'Villa'])
+        self.assertEqual(self._titles(f'min_rating=4&amenities={self.pool.id}'), ['Villa'])
+
+    def test_facets(self):
+        """Test amenity counts follow every filter, the histogram ignores the price"""
+        facets = self._page(f'max_price=100&amenities={self.wifi.id}')['facets']
+        self.assertEqual([(f['name'], f['count']) for f in facets['amenities']],
+                         [("Wifi", 2), ("Pool", 1)])
+        self.assertEqual([(f['min'], f['max'], f['count']) for f in facets['price']],
+                         [(0, 50, 1), (50, 100, 1), (200, 250, 1)])
+
+    def test_facets_only_on_first_page(self):
+        """Test the facets come with the first page and not with the next ones"""
+        first = self._page('limit=2')
+        self.assertIn('facets', first)
+        following = self._page(f"limit=2&cursor={first['next_cursor']}")
+        self.assertNotIn('facets', following)
+
+    def test_facets_in_one_query(self):
+        """Test both facets are computed by a single statement"""
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', on_execute)
+        try:
+            facets = facade.get_place_facets({'min_rating': 3})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', on_execute)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(sum(f['count'] for f in facets['price']), 3)
+
+    def test_invalid_filters(self):
+        """Test malformed filter values return 400"""
+        for query in ('min_price=cheap', 'max_price=-5', 'min_price=100&max_price=50',
+                      'min_rating=6', 'min_rating=0', 'min_price=nan', 'max_price=inf',
+                      'min_rating=nan'):
+            response = self.client.get(f'/api/v1/places/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Tests for the bounding-box and radius search of places"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.persistence.geo import boxes_around, haversine_km
+from app.services.facade import facade
+
+CITIES = {
+    'Paris': (48.8566, 2.3522),
+    'London': (51.5074, -0.1278),
+    'Brussels': (50.8503, 4.3517),
+    'New York': (40.7128, -74.0060),
+    'Suva': (-18.1248, 178.4501),
+    'Apia': (-13.8333, -171.7500),
+}
+
+
+class TestGeoSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="One", email="owner@example.com")
+        owner.password = "not-a-hash"
+        db.session.add(owner)
+        db.session.commit()
+        self.places = {}
+        for name, (lat, lon) in CITIES.items():
+            self.places[name] = facade.create_place({
+                'title': name, 'description': "", 'price': 100,
+                'latitude': lat, 'longitude': lon, 'owner_id': owner.id
+            }).id
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _titles(self, query):
+        response = self.client.get(f'/api/v1/places/?{query}')
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return [item['title'] for item in response.get_json()['items']]
+
+    def test_haversine(self):
+        """Test the great-circle distance between Paris and London"""
+        self.assertAlmostEqual(haversine_km(*CITIES['Paris'], *CITIES['London']), 343.5, delta=1)
+
+    def test_bbox_sorted_by_distance_to_center(self):
+        """Test a bbox around Western Europe, nearest to its center first"""
+        self.assertEqual(self._titles('bbox=-1,48,5,52'), ['Paris', 'Brussels', 'London'])
+
+    def test_near_within_radius(self):
+        """Test places within the radius only, nearest first, with their distance"""
+        self.assertEqual(self._titles('near=48.8566,2.3522&radius_km=300'), ['Paris', 'Brussels'])
+        response = self.client.get('/api/v1/places/?near=48.8566,2.3522&radius_km=400')
+        distances = [item['distance_km'] for item in response.get_json()['items']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(len(distances), 3)
+
+    def test_bbox_across_the_antimeridian(self):
+        """Test a bbox from 170E to 170W finds places on both sides"""
+        self.assertEqual(sorted(self._titles('bbox=170,-25,-170,-10')), ['Apia', 'Suva'])
+
+    def test_radius_across_the_antimeridian(self):
+        """Test a circle around Suva reaching past 180 degrees"""
+        self.assertEqual(len(boxes_around(-18, 179.5, 200)), 2)
+        self.assertEqual(self._titles('near=-18.1248,178.4501&radius_km=1200'), ['Suva', 'Apia'])
+
+    def test_paginates_by_distance(self):
+        """Test the cursor continues after the last distance of the page"""
+        response = self.client.get('/api/v1/places/?near=48.8566,2.3522&radius_km=20000&limit=4')
+        first = response.get_json()
+        self.assertEqual(len(first['items']), 4)
+        response = self.client.get(f"/api/v1/places/?near=48.8566,2.3522&radius_km=20000"
+                                   f"&limit=4&cursor={first['next_cursor']}")
+        second = response.get_json()
+        self.assertIsNone(second['next_cursor'])
+        titles = [item['title'] for item in first['items'] + second['items']]
+        self.assertEqual(sorted(titles), sorted(CITIES))
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the triggers keep the R*Tree in sync with the places table"""
+        facade.update_place(self.places['Paris'], {'latitude': 40.7, 'longitude': -74.0})
+        self.assertEqual(self._titles('bbox=-1,48,5,52'), ['Brussels', 'London'])
+        self.assertIn('Paris', self._titles('near=40.7128,-74.0060&radius_km=10'))
+        facade.delete_place(self.places['London'])
+        self.assertEqual(self._titles('bbox=-1,48,5,52'), ['Brussels'])
+        count = db.session.execute(db.text("SELECT count(*) FROM places_rtree")).scalar()
+        self.assertEqual(count, len(CITIES) - 1)
+
+    def test_search_uses_the_rtree(self):
+        """Test SQLite answers the box constraint from the R*Tree index"""
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT places.id FROM places JOIN places_rtree "
+            "ON places_rtree.place_id = places.id WHERE places_rtree.max_lat >= 1 "
+            "AND places_rtree.min_lat <= 2 AND places_rtree.max_lon >= 1 "
+            "AND places_rtree.min_lon <= 2")).all()
+        self.assertIn('VIRTUAL TABLE INDEX', ' '.join(row[-1] for row in plan))
+
+    def test_distance_order_and_page_run_in_sql(self):
+        """Test the distance order, radius, cursor and limit are left to the query"""
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', on_execute)
+        try:
+            first, cursor = facade.search_places([(-90, 90, -180, 180)], CITIES['Paris'], 2,
+                                                 radius_km=20000, columns=['title'])
+            second, _ = facade.search_places([(-90, 90, -180, 180)], CITIES['Paris'], 2,
+                                             cursor, radius_km=20000, columns=['title'])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', on_execute)
+        self.assertEqual([place.title for place, _ in first + second],
+                         ['Paris', 'Brussels', 'London', 'New York'])
+        self.assertAlmostEqual(first[1][1], haversine_km(*CITIES['Paris'], *CITIES['Brussels']))
+        for statement in statements:
+            self.assertIn('haversine_km(', statement)
+            self.assertIn('ORDER BY distance_km', statement)
+            self.assertIn('LIMIT', statement)
+
+    def test_invalid_area_parameters(self):
+        """Test malformed or conflicting area parameters return 400"""
+        for query in ('bbox=1,2,3', 'bbox=0,60,10,50', 'near=48,2', 'near=100,2&radius_km=5',
+                      'near=48,2&radius_km=-1', 'near=48,2&radius_km=nan',
+                      'near=48,2&radius_km=inf', 'bbox=-1,48,5,52&near=48,2&radius_km=5'):
+            response = self.client.get(f'/api/v1/places/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
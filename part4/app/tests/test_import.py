@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Tests for the bulk place import"""
+
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from flask import g
+from sqlalchemy import event
+from app import create_app, db
+from app.api.v1.imports import read_csv, read_ndjson
+from app.models.place import Place
+from app.services.facade import facade
+
+
+class TestPlaceImport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.admin_id = facade.create_user({'first_name': "Admin", 'last_name': "Root",
+                                            'email': "admin@example.com", 'password': "secret",
+                                            'is_admin': True}).id
+        self.host_id = facade.create_user({'first_name': "Host", 'last_name': "One",
+                                           'email': "host@example.com",
+                                           'password': "secret"}).id
+        self.wifi_id, self.pool_id = [amenity.id for amenity in facade.bulk_create_amenities(
+            [{'name': "Wifi"}, {'name': "Pool"}])]
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _post(self, email, body, content_type):
+        login = self.client.post('/api/v1/auth/login',
+                                 json={'email': email, 'password': "secret"})
+        headers = {'Authorization': f"Bearer {login.json['access_token']}"}
+        return self.client.post('/api/v1/places/import', data=body, headers=headers,
+                                content_type=content_type)
+
+    def _row(self, i, **extra):
+        return {'title': f"Place {i}", 'description': "Imported", 'price': 50 + i,
+                'latitude': 10, 'longitude': 20, **extra}
+
+    def test_ndjson_import(self):
+        """Test valid rows are created with their amenities and invalid ones reported"""
+        rows = [self._row(i, amenities=[self.wifi_id]) for i in range(5)]
+        rows[1]['price'] = -3
+        rows[3]['amenities'] = ["missing"]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\n{broken\n'
+        response = self._post("host@example.com", body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        report = response.get_json()
+        self.assertEqual((report['created'], report['failed']), (3, 3))
+        self.assertEqual([error['line'] for error in report['errors']], [2, 4, 6])
+        self.assertIn("negative", report['errors'][0]['error'])
+        self.assertIn("missing", report['errors'][1]['error'])
+
+        db.session.remove()
+        places = Place.query.order_by(Place.price).all()
+        self.assertEqual([float(place.price) for place in places], [50, 52, 54])
+        self.assertTrue(all(place.owner_id == self.host_id for place in places))
+        self.assertEqual([[a.name for a in place.amenities] for place in places], [["Wifi"]] * 3)
+        # The places are indexed for the text search by the triggers
+        results, _ = facade.search_places_text("imported", 10)
+        self.assertEqual(len(results), 3)
+
+    def test_csv_import(self):
+        """Test CSV rows are read with semicolon-separated amenities"""
+        body = ("title,description,price,latitude,longitude,amenities\n"
+                f"Loft,Bright,80,1,2,{self.wifi_id};{self.pool_id}\n"
+                "Barn,,abc,1,2,\n"
+                "Hut,,30,1,2,\n")
+        report = self._post("host@example.com", body, 'text/csv').get_json()
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['errors'], [{'line': 3, 'error': "price must be a number"}])
+        loft = Place.query.filter_by(title="Loft").one()
+        self.assertEqual({a.name for a in loft.amenities}, {"Wifi", "Pool"})
+
+    def test_chunk_resolves_amenities_with_one_query(self):
+        """Test a chunk costs one amenity lookup and batched inserts, not one per row"""
+        rows = [(i, self._row(i, amenities=[self.wifi_id, self.pool_id])) for i in range(50)]
+        self.statements = []
+        created, errors = facade.import_places(rows, self.host_id)
+        self.assertEqual((created, errors), (50, []))
+        lookups = [s for s in self.statements if s.startswith('SELECT amenities.id')]
+        inserts = [s for s in self.statements if s.startswith('INSERT INTO places')]
+        self.assertEqual(len(lookups), 1)
+        self.assertLessEqual(len(inserts), 2)
+        self.assertEqual(db.session.query(Place).count(), 50)
+
+    def test_non_finite_and_oversized_numbers_are_rejected(self):
+        """Test nan, inf and prices beyond Numeric(10, 2) are row errors, not failures"""
+        rows = [self._row(0), self._row(1, price="nan"), self._row(2, latitude="inf"),
+                self._row(3, price="1e30"), self._row(4, longitude="-inf")]
+        body = '\n'.join(json.dumps(row) for row in rows)
+        response = self._post("host@example.com", body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        report = response.get_json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [
+            {'line': 2, 'error': "price must be a finite number"},
+            {'line': 3, 'error': "latitude must be a finite number"},
+            {'line': 4, 'error': "price must be less than 100000000"},
+            {'line': 5, 'error': "longitude must be a finite number"},
+        ])
+        self.assertEqual(self.client.get('/api/v1/places/').status_code, 200)
+
+    def test_chunks_commit_alone(self):
+        """Test each chunk commits apart from the request and a failed chunk fails alone"""
+        db.session.execute(db.text(
+            "CREATE TRIGGER refuse_boom BEFORE INSERT ON places WHEN new.title = 'Boom' "
+            "BEGIN SELECT RAISE(ABORT, 'boom refused'); END"))
+        db.session.commit()
+        rows = [(i, self._row(i)) for i in range(6)]
+        rows[3][1]['title'] = "Boom"
+        commits = []
+
+        def on_commit(conn):
+            commits.append(conn)
+        event.listen(db.engine, 'commit', on_commit)
+        try:
+            # As in a write request, whose unit of work only commits at the end
+            with self.app.test_request_context(method='POST'):
+                g.unit_of_work = True
+                created, errors = facade.import_places(rows, self.host_id, chunk_size=2)
+                self.assertTrue(g.unit_of_work)
+        finally:
+            event.remove(db.engine, 'commit', on_commit)
+        self.assertEqual(created, 4)
+        self.assertEqual([line for line, _ in errors], [2, 3])
+        self.assertIn("boom refused", errors[0][1])
+        # The two chunks written, each as soon as it was read
+        self.assertEqual(len(commits), 2)
+        db.session.remove()
+        self.assertEqual(sorted(place.title for place in Place.query),
+                         ["Place 0", "Place 1", "Place 4", "Place 5"])
+
+    def test_owner_is_checked(self):
+        """Test only admins may import places of other, existing, owners"""
+        body = json.dumps(self._row(1, owner_id=self.admin_id))
+        report = self._post("host@example.com", body, 'application/x-ndjson').get_json()
+        self.assertIn("Only admins", report['errors'][0]['error'])
+        body = '\n'.join([json.dumps(self._row(1, owner_id=self.host_id)),
+                          json.dumps(self._row(2, owner_id="ghost"))])
+        report = self._post("admin@example.com", body, 'application/x-ndjson').get_json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [{'line': 2, 'error': "Owner not found: ghost"}])
+
+    def test_unsupported_content_type(self):
+        """Test a JSON array body is refused with 415"""
+        response = self._post("host@example.com", '[]', 'application/json')
+        self.assertEqual(response.status_code, 415)
+
+    def test_readers_report_unreadable_lines(self):
+        """Test the readers yield errors for extra CSV cells and non-JSON lines"""
+        csv_rows = list(read_csv(io.BytesIO(b"title,price\nA,1,extra\n")))
+        self.assertIsInstance(csv_rows[0][1], ValueError)
+        ndjson_rows = list(read_ndjson(io.BytesIO(b'{"title": "A"}\n\nnope\n')))
+        self.assertEqual([line for line, _ in ndjson_rows], [1, 3])
+        self.assertIsInstance(ndjson_rows[1][1], ValueError)
+
+
+if __name__ == '__main__':
+    unittest.main()
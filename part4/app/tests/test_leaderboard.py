@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Tests for the leaderboard of top rated places"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event, select
+from app import create_app, db
+from app.models.place import Place
+from app.models.user import User
+from app.persistence.leaderboard import leaderboard, rebuild
+from app.services.facade import facade
+
+
+class TestLeaderboard(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        users = [User(first_name="User", last_name=str(i), email=f"user{i}@example.com")
+                 for i in range(11)]
+        for user in users:
+            user.password = "not-a-hash"
+        db.session.add_all(users)
+        db.session.commit()
+        self.owner_id, self.guest_ids = users[0].id, [user.id for user in users[1:]]
+        self.wifi_id = facade.create_amenity({'name': "Wifi"}).id
+        self.place_ids = {title: facade.create_place({
+            'title': title, 'description': "", 'price': 80, 'latitude': 0, 'longitude': 0,
+            'owner_id': self.owner_id, 'amenities': amenities
+        }).id for title, amenities in (("Loft", [self.wifi_id]), ("Barn", []),
+                                       ("Hut", [self.wifi_id]), ("Tent", []))}
+        # Ten fives, a single five, and three fours; Tent has no review
+        self.review_ids = {}
+        for title, ratings in (("Loft", [5] * 10), ("Barn", [5]), ("Hut", [4] * 3)):
+            for guest_id, rating in zip(self.guest_ids, ratings):
+                review = facade.create_review({'text': "Stay", 'rating': rating,
+                                               'user_id': guest_id,
+                                               'place_id': self.place_ids[title]})
+                self.review_ids.setdefault(title, []).append(review.id)
+        db.session.remove()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def _top(self, query=''):
+        response = self.client.get(f'/api/v1/places/top?{query}')
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return [(item['title'], item['score']) for item in response.get_json()['items']]
+
+    def test_bayesian_ranking(self):
+        """Test places are ranked by Bayesian average and unreviewed ones left out"""
+        # (3 * 5 + sum) / (5 + count) with the default prior
+        self.assertEqual(self._top(), [("Loft", round(65 / 15, 4)), ("Hut", 27 / 8),
+                                       ("Barn", round(20 / 6, 4))])
+        self.assertEqual([title for title, _ in self._top('limit=2')], ["Loft", "Hut"])
+
+    def test_review_changes_update_the_ranking(self):
+        """Test updating and deleting reviews moves their place in the leaderboard"""
+        barn_review = self.review_ids["Barn"][0]
+        facade.update_review(barn_review, {'rating': 1})
+        self.assertEqual([title for title, _ in self._top()], ["Loft", "Hut", "Barn"])
+        self.assertEqual(self._top()[2][1], round(16 / 6, 4))
+        facade.delete_review(barn_review)
+        self.assertEqual([title for title, _ in self._top()], ["Loft", "Hut"])
+        facade.delete_place(self.place_ids["Loft"])
+        self.assertEqual([title for title, _ in self._top()], ["Hut"])
+
+    def test_per_amenity(self):
+        """Test the amenity scope follows the amenities of the places"""
+        self.assertEqual([title for title, _ in self._top(f'amenity_id={self.wifi_id}')],
+                         ["Loft", "Hut"])
+        facade.update_place(self.place_ids["Barn"], {'amenities': [self.wifi_id]})
+        facade.update_place(self.place_ids["Loft"], {'amenities': []})
+        self.assertEqual([title for title, _ in self._top(f'amenity_id={self.wifi_id}')],
+                         ["Hut", "Barn"])
+        response = self.client.get('/api/v1/places/top?amenity_id=missing')
+        self.assertEqual(response.status_code, 404)
+
+    def test_top_k_reads_the_index(self):
+        """Test the top places are read in index order, without sorting"""
+        facade.get_top_places(2, self.wifi_id, ('id', 'title'))
+        statement, parameters = self.statements[-1]
+        plan = ' '.join(row[-1] for row in db.session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters))
+        self.assertIn('idx_leaderboard_scope_score_place_id', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_rebuild_matches_incremental_rows(self):
+        """Test a rebuild yields the rows maintained incrementally"""
+        facade.update_review(self.review_ids["Hut"][0], {'rating': 2})
+        query = select(leaderboard).order_by(leaderboard.c.scope, leaderboard.c.place_id)
+        incremental = db.session.execute(query).all()
+        self.assertEqual(rebuild(), 5)
+        db.session.commit()
+        self.assertEqual(db.session.execute(query).all(), incremental)
+
+    def test_etag(self):
+        """Test the top list revalidates until a review changes it"""
+        etag = self.client.get('/api/v1/places/top').headers['ETag']
+        response = self.client.get('/api/v1/places/top', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        facade.create_review({'text': "Stay", 'rating': 1, 'user_id': self.guest_ids[0],
+                              'place_id': self.place_ids["Tent"]})
+        response = self.client.get('/api/v1/places/top', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Tent", [item['title'] for item in response.get_json()['items']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Tests for the multi-get of places, users and amenities by ids"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.api.v1.pagination import MAX_IDS
+from app.services.facade import facade
+
+
+class TestMultiGet(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner_id = facade.create_user({'first_name': "Owner", 'last_name': "One",
+                                            'email': "owner@example.com",
+                                            'password': "secret"}).id
+        self.amenity_ids = [amenity.id for amenity in facade.bulk_create_amenities(
+            [{'name': name} for name in ("Wifi", "Pool", "Gym")])]
+        self.place_ids = [facade.create_place({
+            'title': title, 'description': "", 'price': 80, 'latitude': 0, 'longitude': 0,
+            'owner_id': self.owner_id, 'amenities': self.amenity_ids
+        }).id for title in ("Loft", "Barn", "Hut")]
+        db.session.remove()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_places_by_ids_in_one_query(self):
+        """Test the places are keyed by id, missing ids listed, with a single IN query"""
+        ids = [self.place_ids[2], "missing", self.place_ids[0]]
+        response = self.client.get('/api/v1/places/?ids=' + ','.join(ids))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(list(data['items']), [self.place_ids[2], self.place_ids[0]])
+        self.assertEqual(data['items'][self.place_ids[0]]['title'], "Loft")
+        self.assertEqual(data['missing'], ["missing"])
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(' IN ', self.statements[0])
+        etag = response.headers['ETag']
+        again = self.client.get('/api/v1/places/?ids=' + ','.join(ids),
+                                headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+
+    def test_amenities_and_users_by_ids(self):
+        """Test the amenity and user lists answer multi-gets as well"""
+        data = self.client.get(f'/api/v1/amenities/?ids={self.amenity_ids[1]}').get_json()
+        self.assertEqual(data, {'items': {self.amenity_ids[1]: {'id': self.amenity_ids[1],
+                                                                'name': "Pool"}},
+                                'missing': []})
+        login = self.client.post('/api/v1/auth/login',
+                                 json={'email': "owner@example.com", 'password': "secret"})
+        headers = {'Authorization': f"Bearer {login.json['access_token']}"}
+        data = self.client.get(f'/api/v1/users/?ids={self.owner_id},nobody',
+                               headers=headers).get_json()
+        self.assertEqual(data['items'][self.owner_id]['email'], "owner@example.com")
+        self.assertEqual(data['missing'], ["nobody"])
+
+    def test_ids_are_bounded(self):
+        """Test an empty or oversized ids list answers 400"""
+        for ids in ('', ','.join(str(i) for i in range(MAX_IDS + 1))):
+            response = self.client.get(f'/api/v1/amenities/?ids={ids}')
+            self.assertEqual(response.status_code, 400, ids[:10])
+
+    def test_place_amenities_resolved_in_one_query(self):
+        """Test creating a place looks its amenities up with one query"""
+        self.statements = []
+        facade.create_place({'title': "Tent", 'description': "", 'price': 10, 'latitude': 0,
+                             'longitude': 0, 'owner_id': self.owner_id,
+                             'amenities': self.amenity_ids + ["missing"]})
+        lookups = [s for s in self.statements if 'FROM amenities' in s]
+        self.assertEqual(len(lookups), 1)
+        place = facade.get_place_details(self.place_ids[0])
+        self.assertEqual(len(place.amenities), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Tests for keyset pagination of the list endpoints"""
+
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.persistence.repository import encode_cursor
+from app.services.facade import facade
+
+
+class TestKeysetPagination(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _create_amenities(self, count, same_timestamp=False):
+        start = datetime(2025, 1, 1)
+        for i in range(count):
+            created_at = start if same_timestamp else start + timedelta(seconds=i)
+            db.session.add(Amenity(name=f"Amenity {i:03d}", created_at=created_at))
+        db.session.commit()
+
+    def _walk(self, limit):
+        names, cursor = [], None
+        while True:
+            query = f'/api/v1/amenities/?limit={limit}'
+            if cursor:
+                query += f'&cursor={cursor}'
+            response = self.client.get(query)
+            self.assertEqual(response.status_code, 200)
+            names.extend(item['name'] for item in response.json['items'])
+            cursor = response.json['next_cursor']
+            if not cursor:
+                return names
+
+    def test_pages_cover_every_row_once_in_order(self):
+        """Test following next_cursor returns each row exactly once"""
+        self._create_amenities(25)
+        names = self._walk(10)
+        self.assertEqual(names, [f"Amenity {i:03d}" for i in range(25)])
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        """Test rows sharing a timestamp are neither skipped nor repeated"""
+        self._create_amenities(12, same_timestamp=True)
+        names = self._walk(5)
+        self.assertEqual(sorted(names), [f"Amenity {i:03d}" for i in range(12)])
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_last_page_has_no_next_cursor(self):
+        """Test the page holding the last row returns a null cursor"""
+        self._create_amenities(3)
+        response = self.client.get('/api/v1/amenities/?limit=3')
+        self.assertEqual(len(response.json['items']), 3)
+        self.assertIsNone(response.json['next_cursor'])
+
+    def test_repository_seeks_past_cursor(self):
+        """Test get_page starts right after the row encoded in the cursor"""
+        self._create_amenities(5)
+        first, _ = facade.get_amenities_page(2)
+        cursor = encode_cursor([first[-1].created_at, first[-1].id])
+        second, _ = facade.get_amenities_page(2, cursor)
+        self.assertEqual([a.name for a in second], ["Amenity 002", "Amenity 003"])
+
+    def test_projected_page_returns_rows(self):
+        """Test a projected page holds named rows and no ORM instance"""
+        self._create_amenities(3)
+        db.session.remove()
+        rows, _ = facade.get_amenities_page(2, columns=('id', 'name'))
+        self.assertEqual([row.name for row in rows], ["Amenity 000", "Amenity 001"])
+        self.assertEqual(len(db.session.identity_map), 0)
+
+    def test_place_list_does_not_read_description(self):
+        """Test the place list query leaves the description column out"""
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            self.client.get('/api/v1/places/')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertTrue(any('FROM places' in statement for statement in statements))
+        self.assertFalse(any('description' in statement for statement in statements))
+
+    def test_invalid_parameters_are_rejected(self):
+        """Test malformed cursor and out of range limit return 400"""
+        self.assertEqual(self.client.get('/api/v1/places/?cursor=not-a-cursor').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/places/?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/reviews/?limit=abc').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
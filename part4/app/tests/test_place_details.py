@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Tests for the eager-loaded place detail"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.services.facade import facade
+
+
+class TestPlaceDetails(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.queries = 0
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+
+    def _user(self, i):
+        user = User(first_name="User", last_name=str(i), email=f"user{i}@example.com")
+        # Hashing hundreds of passwords would only slow the test down
+        user.password = "not-a-hash"
+        return user
+
+    def _place_with_reviews(self, count):
+        """Create a place with two amenities and ``count`` reviews by distinct authors"""
+        owner = self._user('owner')
+        db.session.add(owner)
+        wifi, pool = facade.bulk_create_amenities([{'name': "Wifi"}, {'name': "Pool"}])
+        place = Place(title="Loft", description="", price=50, latitude=0, longitude=0)
+        place.owner = owner
+        place.amenities = [wifi, pool]
+        authors = [self._user(i) for i in range(count)]
+        db.session.add_all([place, *authors])
+        db.session.flush()
+        db.session.add_all([Review(text="Nice", rating=1 + i % 5, user_id=author.id,
+                                   place_id=place.id) for i, author in enumerate(authors)])
+        db.session.commit()
+        place_id = place.id
+        # Start from an empty identity map, as a new request would
+        db.session.remove()
+        return place_id
+
+    def _count_detail_queries(self, review_count):
+        place_id = self._place_with_reviews(review_count)
+        self.queries = 0
+        place = facade.get_place_details(place_id)
+        self.assertEqual(place.owner.first_name, "User")
+        self.assertEqual(len(place.amenities), 2)
+        self.assertEqual(len({review.author.id for review in place.reviews}), review_count)
+        return self.queries
+
+    def test_query_count_does_not_grow_with_reviews(self):
+        """Test the detail costs the same number of queries for 3 and 300 reviews"""
+        few = self._count_detail_queries(3)
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        many = self._count_detail_queries(300)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 3)
+
+    def test_endpoint_uses_fixed_query_budget(self):
+        """Test the place endpoint returns the reviews without one query per author"""
+        place_id = self._place_with_reviews(40)
+        client = self.app.test_client()
+        self.queries = 0
+        response = client.get(f'/api/v1/places/{place_id}')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data['reviews']), 40)
+        self.assertEqual(data['owner']['first_name'], "User")
+        self.assertEqual({a['name'] for a in data['amenities']}, {"Wifi", "Pool"})
+        self.assertTrue(all(review['user_name'].startswith("User ") for review in data['reviews']))
+        # The three detail queries and the single-row ETag validator query
+        self.assertLessEqual(self.queries, 4)
+
+    def test_unknown_place(self):
+        """Test an unknown place id returns None and a 404"""
+        self.assertIsNone(facade.get_place_details("missing"))
+        response = self.app.test_client().get('/api/v1/places/missing')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests for the paginated and sortable reviews of a place"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.services.facade import facade
+
+
+class TestPlaceReviews(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        users = [User(first_name="User", last_name=str(i), email=f"user{i}@example.com")
+                 for i in range(26)]
+        for user in users:
+            user.password = "not-a-hash"
+        db.session.add_all(users)
+        db.session.flush()
+        place = Place(title="Loft", description="", price=50, latitude=0, longitude=0,
+                      owner_id=users[0].id)
+        other = Place(title="Barn", description="", price=50, latitude=0, longitude=0,
+                      owner_id=users[0].id)
+        db.session.add_all([place, other])
+        db.session.flush()
+        db.session.add_all([Review(text=f"Review {i}", rating=1 + i * 7 % 5, user_id=user.id,
+                                   place_id=place.id) for i, user in enumerate(users[1:])])
+        db.session.add(Review(text="Elsewhere", rating=5, user_id=users[1].id,
+                              place_id=other.id))
+        db.session.commit()
+        self.place_id = place.id
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def _pages(self, query):
+        """Follow next_cursor from the first page, returning every item"""
+        items, cursor = [], None
+        while True:
+            url = f'/api/v1/places/{self.place_id}/reviews?limit=10&{query}'
+            response = self.client.get(url + (f'&cursor={cursor}' if cursor else ''))
+            self.assertEqual(response.status_code, 200, response.get_json())
+            page = response.get_json()
+            items += page['items']
+            cursor = page['next_cursor']
+            if not cursor:
+                return items
+
+    def test_newest_first(self):
+        """Test the pages hold every review of the place once, newest first"""
+        items = self._pages('sort=newest')
+        self.assertEqual(len(items), 25)
+        keys = [(item['created_at'], item['id']) for item in items]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertNotIn("Elsewhere", [item['text'] for item in items])
+
+    def test_best_rated_first(self):
+        """Test sort=rating orders on (rating, id), highest first"""
+        items = self._pages('sort=rating')
+        keys = [(item['rating'], item['id']) for item in items]
+        self.assertEqual(len(set(keys)), 25)
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_deep_pages_seek_the_index(self):
+        """Test a next page is an index seek, with no sort of the place's reviews"""
+        for sort, index in (('newest', 'idx_reviews_place_id_created_at_id'),
+                            ('rating', 'idx_reviews_place_id_rating_id')):
+            _, cursor = facade.get_place_reviews_page(self.place_id, 10, sort=sort)
+            self.statements = []
+            facade.get_place_reviews_page(self.place_id, 10, cursor, sort, ('id', 'rating'))
+            statement, parameters = self.statements[-1]
+            plan = ' '.join(row[-1] for row in db.session.connection().exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + statement, parameters))
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_authors_are_embedded_on_request(self):
+        """Test include=author adds the author names from the same query"""
+        self.statements = []
+        page = self.client.get(f'/api/v1/places/{self.place_id}/reviews?include=author').get_json()
+        self.assertTrue(all(item['author']['first_name'] == "User" for item in page['items']))
+        self.assertEqual(len(self.statements), 2)
+
+    def test_both_routes_agree(self):
+        """Test the reviews namespace route serves the same page"""
+        first = self.client.get(f'/api/v1/places/{self.place_id}/reviews').get_json()
+        second = self.client.get(f'/api/v1/reviews/places/{self.place_id}/reviews').get_json()
+        self.assertEqual(first, second)
+        self.assertEqual(len(first['items']), 20)
+
+    def test_errors(self):
+        """Test an unknown place answers 404 and an unknown sort 400"""
+        self.assertEqual(self.client.get('/api/v1/places/missing/reviews').status_code, 404)
+        response = self.client.get(f'/api/v1/places/{self.place_id}/reviews?sort=oldest')
+        self.assertEqual(response.status_code, 400)
+
+    def test_reviews_by_place_returns_them_all(self):
+        """Test get_reviews_by_place returns every review, not the first one"""
+        self.assertEqual(len(facade.get_reviews_by_place(self.place_id)), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
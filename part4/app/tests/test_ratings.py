@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Tests for the rating aggregates stored on places"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.place import Place
+from app.models.user import User
+from app.persistence.cache import entity_cache
+from app.persistence.ratings import repair_ratings
+from app.persistence.unit_of_work import unit_of_work
+from app.services.facade import facade
+
+
+class TestRatingAggregates(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.users = []
+        for i in range(4):
+            user = User(first_name="User", last_name=str(i), email=f"user{i}@example.com")
+            user.password = "not-a-hash"
+            self.users.append(user)
+        db.session.add_all(self.users)
+        db.session.commit()
+        self.place_id, self.other_id = [facade.create_place({
+            'title': title, 'description': "", 'price': 80, 'latitude': 0, 'longitude': 0,
+            'owner_id': self.users[0].id
+        }).id for title in ("Loft", "Barn")]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _review(self, user, rating, place_id=None):
+        return facade.create_review({'text': "Stay", 'rating': rating, 'user_id': user.id,
+                                     'place_id': place_id or self.place_id})
+
+    def _aggregates(self, place_id=None):
+        place = db.session.get(Place, place_id or self.place_id)
+        return place.review_count, place.rating_sum, place.rating_histogram
+
+    def test_create_update_delete(self):
+        """Test the aggregates follow each review write"""
+        first = self._review(self.users[1], 5)
+        self._review(self.users[2], 3)
+        self.assertEqual(self._aggregates(),
+                         (2, 8, {'1': 0, '2': 0, '3': 1, '4': 0, '5': 1}))
+        facade.review_repo.update(first.id, {'rating': 1})
+        self.assertEqual(self._aggregates(),
+                         (2, 4, {'1': 1, '2': 0, '3': 1, '4': 0, '5': 0}))
+        facade.review_repo.delete(first.id)
+        self.assertEqual(self._aggregates()[:2], (1, 3))
+        self.assertEqual(db.session.get(Place, self.place_id).average_rating, 3.0)
+
+    def test_moving_a_review_to_another_place(self):
+        """Test changing place_id moves the rating between the two places"""
+        review = self._review(self.users[1], 4)
+        facade.review_repo.update(review.id, {'place_id': self.other_id})
+        self.assertEqual(self._aggregates()[:2], (0, 0))
+        self.assertEqual(self._aggregates(self.other_id)[:2], (1, 4))
+
+    def test_bulk_writes(self):
+        """Test batched inserts and deletes apply their deltas in one statement"""
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', on_execute)
+        try:
+            reviews = facade.bulk_create_reviews([
+                {'text': "Stay", 'rating': 1 + i, 'user_id': user.id,
+                 'place_id': self.place_id if i % 2 else self.other_id}
+                for i, user in enumerate(self.users)])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', on_execute)
+        self.assertEqual(sum(s.startswith('UPDATE places') for s in statements), 1)
+        self.assertEqual(self._aggregates()[:2], (2, 6))
+        self.assertEqual(self._aggregates(self.other_id)[:2], (2, 4))
+        facade.bulk_delete_reviews([review.id for review in reviews])
+        self.assertEqual(self._aggregates()[:2], (0, 0))
+
+    def test_failed_transaction_leaves_aggregates(self):
+        """Test the deltas are rolled back with the review"""
+        db.session.add(facade.review_repo.model(text="Stay", rating=5, user_id=self.users[1].id,
+                                                place_id=self.place_id))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self._aggregates()[:2], (0, 0))
+
+    def test_cached_place_is_dropped_on_commit(self):
+        """Test a place cached before the review commits does not keep the old aggregates"""
+        entity_cache.configure(maxsize=100, ttl=60, enabled=True)
+        try:
+            key = ('Place', self.place_id)
+            with unit_of_work():
+                self._review(self.users[1], 5)
+                # What a reader on another thread would cache before the commit
+                entity_cache.put(key, {'review_count': 0})
+            self.assertIsNone(entity_cache.get(key))
+        finally:
+            entity_cache.configure(maxsize=100, ttl=60, enabled=False)
+
+    def test_repair(self):
+        """Test repair_ratings recomputes drifted aggregates"""
+        self._review(self.users[1], 2)
+        self._review(self.users[2], 4)
+        db.session.execute(Place.__table__.update().values(rating_sum=0, review_count=9))
+        db.session.commit()
+        self.assertEqual(repair_ratings(), 2)
+        db.session.commit()
+        db.session.expire_all()
+        self.assertEqual(self._aggregates(),
+                         (2, 6, {'1': 0, '2': 1, '3': 0, '4': 1, '5': 0}))
+
+    def test_repair_command(self):
+        """Test the flask repair-ratings command"""
+        self._review(self.users[1], 5)
+        db.session.execute(Place.__table__.update().values(rating_sum=0, review_count=0))
+        db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['repair-ratings'])
+        self.assertIn("2 places", result.output)
+        db.session.expire_all()
+        self.assertEqual(self._aggregates()[:2], (1, 5))
+
+    def test_payloads(self):
+        """Test the list and detail payloads carry the aggregates"""
+        self._review(self.users[1], 4)
+        self._review(self.users[2], 5)
+        client = self.app.test_client()
+        items = {item['title']: item for item in client.get('/api/v1/places/').get_json()['items']}
+        self.assertEqual((items['Loft']['average_rating'], items['Loft']['review_count']), (4.5, 2))
+        self.assertIsNone(items['Barn']['average_rating'])
+        detail = client.get(f'/api/v1/places/{self.place_id}').get_json()
+        self.assertEqual(detail['rating_histogram']['5'], 1)
+        self.assertEqual(detail['average_rating'], 4.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
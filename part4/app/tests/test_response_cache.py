@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Tests for the response cache of hot GET endpoints"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app import create_app, db
+from app.models.user import User
+from app.persistence.response_cache import MemoryBackend, SQLiteBackend, response_cache
+from app.persistence.unit_of_work import unit_of_work
+from app.services.facade import facade
+from config import TestingConfig
+
+
+class TestBackends(unittest.TestCase):
+
+    def _check_tags(self, backend):
+        backend.set('/places/?', ['places'], {'places'}, 60)
+        backend.set('/places/1?', ['one'], {'place:1', 'user:u'}, 60)
+        backend.set('/places/2?', ['two'], {'place:2', 'user:u'}, 60)
+        backend.purge(['place:1'])
+        self.assertIsNone(backend.get('/places/1?'))
+        self.assertEqual(backend.get('/places/2?'), ['two'])
+        backend.purge(['user:u', 'unknown'])
+        self.assertIsNone(backend.get('/places/2?'))
+        self.assertEqual(backend.get('/places/?'), ['places'])
+
+    def test_memory_purges_by_tag(self):
+        """Test the memory backend drops exactly the entries of the purged tags"""
+        self._check_tags(MemoryBackend())
+
+    def test_memory_evicts_least_recently_used(self):
+        """Test the memory backend keeps maxsize entries, the most recently used"""
+        backend = MemoryBackend(maxsize=2)
+        backend.set('a', 1, {'t'}, 60)
+        backend.set('b', 2, {'t'}, 60)
+        backend.get('a')
+        backend.set('c', 3, {'t'}, 60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual((backend.get('a'), backend.get('c')), (1, 3))
+
+    def test_entries_expire(self):
+        """Test entries are not served after their TTL"""
+        backend = MemoryBackend()
+        backend.set('a', 1, set(), 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(backend.get('a'))
+
+    def test_sqlite_is_shared_between_workers(self):
+        """Test two SQLite backends on one file see each other's stores and purges"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            self._check_tags(SQLiteBackend(path))
+            first, second = SQLiteBackend(path), SQLiteBackend(path)
+            first.set('/amenities/?', {'items': []}, {'amenities'}, 60)
+            self.assertEqual(second.get('/amenities/?'), {'items': []})
+            second.purge(['amenities'])
+            self.assertIsNone(first.get('/amenities/?'))
+
+    def test_sqlite_prunes_beyond_maxsize(self):
+        """Test pruning keeps the entries expiring last"""
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SQLiteBackend(os.path.join(directory, 'cache.db'), maxsize=2)
+            for i, ttl in enumerate((30, 60, 90)):
+                backend.set(str(i), i, {'t'}, ttl)
+            backend.prune()
+            self.assertEqual([backend.get(key) for key in '012'], [None, 1, 2])
+
+
+class TestResponseCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        class CachedConfig(TestingConfig):
+            RESPONSE_CACHE_BACKEND = 'memory'
+
+        cls.app = create_app(CachedConfig)
+
+    @classmethod
+    def tearDownClass(cls):
+        response_cache.init_app(create_app('config.TestingConfig'))
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="One", email="owner@example.com")
+        guest = User(first_name="Guest", last_name="Two", email="guest@example.com")
+        for user in (owner, guest):
+            user.password = "not-a-hash"
+        db.session.add_all([owner, guest])
+        db.session.commit()
+        self.owner_id, self.guest_id = owner.id, guest.id
+        self.wifi_id = facade.create_amenity({'name': "Wifi"}).id
+        self.place_ids = [facade.create_place({
+            'title': title, 'description': "", 'price': 80, 'latitude': 0, 'longitude': 0,
+            'owner_id': self.owner_id, 'amenities': [self.wifi_id]
+        }).id for title in ("Loft", "Barn")]
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        response_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.headers.get('X-Cache'), response.get_json()
+
+    def _assert_purged(self, url, write, *unaffected):
+        """Warm url and the unaffected urls, write, then check only url was dropped"""
+        for warm in (url, *unaffected):
+            self._get(warm)
+            self.assertEqual(self._get(warm)[0], 'HIT', warm)
+        write()
+        db.session.remove()
+        self.assertIsNone(self._get(url)[0], url)
+        for other in unaffected:
+            self.assertEqual(self._get(other)[0], 'HIT', other)
+
+    def test_query_string_is_normalized(self):
+        """Test the order of the query parameters does not split the cache"""
+        self._get('/api/v1/places/?limit=5&max_price=100')
+        cache, data = self._get('/api/v1/places/?max_price=100&limit=5')
+        self.assertEqual(cache, 'HIT')
+        self.assertEqual(len(data['items']), 2)
+
+    def test_place_write_purges_its_entries(self):
+        """Test a place update drops the list and its detail, not the other detail"""
+        first, second = self.place_ids
+        self._assert_purged(f'/api/v1/places/{first}',
+                            lambda: facade.update_place(first, {'title': "New loft"}),
+                            f'/api/v1/places/{second}', '/api/v1/amenities/')
+        self.assertEqual(self._get(f'/api/v1/places/{first}')[1]['title'], "New loft")
+        self.assertIsNone(self._get('/api/v1/places/')[0])
+
+    def test_review_purges_its_place(self):
+        """Test a review drops the detail of its place and the list with the ratings"""
+        first, second = self.place_ids
+        self._assert_purged('/api/v1/places/', lambda: facade.create_review({
+            'text': "Nice", 'rating': 4, 'user_id': self.guest_id, 'place_id': first
+        }), f'/api/v1/places/{second}')
+        self.assertEqual(self._get(f'/api/v1/places/{first}')[1]['review_count'], 1)
+
+    def test_user_and_amenity_writes_purge_the_details_showing_them(self):
+        """Test renaming the owner or an amenity drops the details that display them"""
+        first = self.place_ids[0]
+        self._assert_purged(f'/api/v1/places/{first}',
+                            lambda: facade.update_user(self.owner_id, {'first_name': "Olga"}),
+                            '/api/v1/amenities/')
+        self.assertEqual(self._get(f'/api/v1/places/{first}')[1]['owner']['first_name'], "Olga")
+        self._assert_purged(f'/api/v1/places/{first}',
+                            lambda: facade.update_amenity(self.wifi_id, {'name': "Fiber"}))
+        self.assertIsNone(self._get('/api/v1/amenities/')[0])
+
+    def test_purge_is_repeated_after_commit(self):
+        """Test a response cached while the write was uncommitted is dropped at commit"""
+        place_id = self.place_ids[0]
+        key = f'/api/v1/places/{place_id}?'
+        with self.app.test_request_context('/', method='PUT'):
+            with unit_of_work():
+                facade.update_place(place_id, {'title': "Renamed"})
+                # Another worker caching the old row before the commit
+                response_cache.backend.set(key, ['{}', {}], {f'place:{place_id}'}, 60)
+            self.assertIsNone(response_cache.backend.get(key))
+
+    def test_conditional_hit(self):
+        """Test a cached response answers If-None-Match with 304"""
+        etag = self.client.get('/api/v1/amenities/').headers['ETag']
+        response = self.client.get('/api/v1/amenities/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+
+    def test_errors_are_not_cached(self):
+        """Test a 404 is computed again on the next request"""
+        self.assertEqual(self.client.get('/api/v1/places/missing').status_code, 404)
+        response = self.client.get('/api/v1/places/missing')
+        self.assertNotIn('X-Cache', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Tests for the write-behind review queue"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.services.facade import facade
+from app.services.review_queue import review_queue
+from config import TestingConfig
+
+QUEUE_DIR = tempfile.mkdtemp()
+
+
+class QueueConfig(TestingConfig):
+    REVIEW_QUEUE_ENABLED = True
+    # The tests drain the queue themselves
+    REVIEW_QUEUE_WRITER = False
+    REVIEW_QUEUE_PATH = os.path.join(QUEUE_DIR, 'review_queue.db')
+    REVIEW_QUEUE_BATCH_SIZE = 50
+
+
+class WriterConfig(QueueConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(QUEUE_DIR, 'hbnb.db')}"
+    REVIEW_QUEUE_WRITER = True
+    REVIEW_QUEUE_PATH = os.path.join(QUEUE_DIR, 'writer_queue.db')
+    REVIEW_QUEUE_INTERVAL = 0.05
+
+
+class TestReviewQueue(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app(QueueConfig)
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        review_queue.journal.clear()
+        self.owner_id, self.guest_id = [facade.create_user({
+            'first_name': name, 'last_name': "User", 'email': f"{name.lower()}@example.com",
+            'password': "secret"}).id for name in ("Owner", "Guest")]
+        self.place_id = facade.create_place({
+            'title': "Loft", 'description': "", 'price': 80, 'latitude': 0, 'longitude': 0,
+            'owner_id': self.owner_id}).id
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _headers(self, email):
+        login = self.client.post('/api/v1/auth/login',
+                                 json={'email': email, 'password': "secret"})
+        return {'Authorization': f"Bearer {login.json['access_token']}"}
+
+    def _review(self, rating=4, user_id=None):
+        return {'text': "Nice", 'rating': rating, 'place_id': self.place_id,
+                'user_id': user_id or self.guest_id}
+
+    def test_post_is_queued_then_written(self):
+        """Test a review is answered 202 with a status URL and written by a drain"""
+        headers = self._headers("guest@example.com")
+        response = self.client.post('/api/v1/reviews/', headers=headers,
+                                    json={'text': "Nice", 'rating': 4,
+                                          'place_id': self.place_id})
+        self.assertEqual(response.status_code, 202)
+        data = response.get_json()
+        self.assertEqual(data['status'], 'pending')
+        self.assertEqual(response.headers['Location'], data['status_url'])
+        self.assertEqual(Review.query.count(), 0)
+
+        self.assertEqual(review_queue.drain(), 1)
+        status = self.client.get(data['status_url'], headers=headers).get_json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['review_url'], f"/api/v1/reviews/{data['id']}")
+        db.session.remove()
+        self.assertEqual(facade.get_review(data['id']).rating, 4)
+        self.assertEqual(db.session.get(Place, self.place_id).review_count, 1)
+
+    def test_batch_is_one_transaction(self):
+        """Test a drain writes its whole batch with a single commit"""
+        users = [User(first_name="User", last_name=str(i), email=f"user{i}@example.com")
+                 for i in range(20)]
+        for user in users:
+            user.password = "not-a-hash"
+        db.session.add_all(users)
+        db.session.commit()
+        for user in users:
+            review_queue.submit(self._review(1 + len(user.last_name) % 5, user.id))
+        commits = []
+
+        def on_commit(conn):
+            commits.append(conn)
+        event.listen(db.engine, 'commit', on_commit)
+        try:
+            self.assertEqual(review_queue.drain(), 20)
+        finally:
+            event.remove(db.engine, 'commit', on_commit)
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(Review.query.count(), 20)
+        self.assertEqual(review_queue.drain(), 0)
+
+    def test_invalid_reviews_are_refused_or_failed(self):
+        """Test bad input is refused at once and a duplicate fails alone in its batch"""
+        headers = self._headers("guest@example.com")
+        bad = self.client.post('/api/v1/reviews/', headers=headers,
+                               json={'text': "Nice", 'rating': 9, 'place_id': self.place_id})
+        self.assertEqual(bad.status_code, 400)
+        missing = self.client.post('/api/v1/reviews/', headers=headers,
+                                   json={'text': "Nice", 'rating': 4, 'place_id': "missing"})
+        self.assertEqual(missing.status_code, 404)
+
+        first = review_queue.submit(self._review())
+        second = review_queue.submit(self._review(rating=2))
+        self.assertEqual(review_queue.drain(), 2)
+        self.assertEqual(review_queue.get(first)['status'], 'done')
+        self.assertEqual(review_queue.get(second)['status'], 'failed')
+        self.assertIn("already reviewed", review_queue.get(second)['error'])
+        self.assertEqual(Review.query.count(), 1)
+
+    def test_replayed_job_is_not_a_duplicate(self):
+        """Test a job written before a crash, then claimed again, ends done"""
+        review_id = review_queue.submit(self._review())
+        review_queue.journal.claim(10, lease=0)
+        db.session.add(Review(id=review_id, **self._review()))
+        db.session.commit()
+        # The lease of the crashed claim is over
+        review_queue.lease = 0
+        try:
+            self.assertEqual(review_queue.drain(), 1)
+        finally:
+            del review_queue.lease
+        self.assertEqual(review_queue.get(review_id)['status'], 'done')
+
+    def test_status_is_private(self):
+        """Test another user cannot read a submission and unknown ids are 404"""
+        review_id = review_queue.submit(self._review())
+        headers = self._headers("owner@example.com")
+        url = f'/api/v1/reviews/submissions/{review_id}'
+        self.assertEqual(self.client.get(url, headers=headers).status_code, 403)
+        response = self.client.get('/api/v1/reviews/submissions/missing', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestReviewQueueWriter(unittest.TestCase):
+
+    def test_writer_thread_drains_the_queue(self):
+        """Test the writer thread writes a submitted review without a manual drain"""
+        app = create_app(WriterConfig)
+        with app.app_context():
+            try:
+                owner, guest = [User(first_name=name, last_name="User",
+                                     email=f"{name}@example.com") for name in ("o", "g")]
+                owner.password = guest.password = "not-a-hash"
+                db.session.add_all([owner, guest])
+                db.session.flush()
+                place = Place(title="Loft", description="", price=80, latitude=0,
+                              longitude=0, owner_id=owner.id)
+                db.session.add(place)
+                db.session.commit()
+                review_id = review_queue.submit({'text': "Nice", 'rating': 5,
+                                                 'place_id': place.id, 'user_id': guest.id})
+                deadline = time.time() + 5
+                while review_queue.get(review_id)['status'] != 'done' \
+                        and time.time() < deadline:
+                    time.sleep(0.05)
+                self.assertEqual(review_queue.get(review_id)['status'], 'done')
+                db.session.remove()
+                self.assertIsNotNone(db.session.get(Review, review_id))
+            finally:
+                review_queue.stop()
+                db.session.remove()
+                db.drop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
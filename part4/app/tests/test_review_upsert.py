@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Tests for the single-statement review creation and its unique constraint"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from app import create_app, db
+from app.models.place import Place
+from app.models.review import Review
+from app.persistence.repository import ConflictError
+from app.persistence.schema import missing_unique_indexes, upgrade_schema
+from app.services.facade import facade
+
+
+class TestReviewUpsert(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner_id, self.guest_id = [facade.create_user({
+            'first_name': name, 'last_name': "User", 'email': f"{name.lower()}@example.com",
+            'password': "secret"}).id for name in ("Owner", "Guest")]
+        self.place_id = facade.create_place({
+            'title': "Loft", 'description': "", 'price': 80, 'latitude': 0, 'longitude': 0,
+            'owner_id': self.owner_id}).id
+        db.session.remove()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _data(self, rating=4, place_id=None, user_id=None):
+        return {'text': "Nice", 'rating': rating, 'place_id': place_id or self.place_id,
+                'user_id': user_id or self.guest_id}
+
+    def _post(self, email, payload):
+        login = self.client.post('/api/v1/auth/login',
+                                 json={'email': email, 'password': "secret"})
+        headers = {'Authorization': f"Bearer {login.json['access_token']}"}
+        return self.client.post('/api/v1/reviews/', json=payload, headers=headers)
+
+    def test_creation_is_a_single_insert(self):
+        """Test a review is created without reading the place first"""
+        review = facade.create_review(self._data())
+        statements = list(self.statements)
+        self.assertFalse([s for s in statements if s.startswith('SELECT')])
+        self.assertTrue(statements[0].startswith('INSERT INTO reviews'))
+        self.assertIn('ON CONFLICT DO NOTHING', statements[0])
+        self.assertEqual(review.to_dict()['rating'], 4)
+        db.session.remove()
+        self.assertEqual(db.session.get(Place, self.place_id).review_count, 1)
+
+    def test_second_review_conflicts(self):
+        """Test the API answers 409 to a second review and keeps the aggregates"""
+        payload = {'text': "Nice", 'rating': 5, 'place_id': self.place_id}
+        self.assertEqual(self._post("guest@example.com", payload).status_code, 201)
+        response = self._post("guest@example.com", {**payload, 'rating': 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('error', response.get_json())
+        db.session.remove()
+        place = db.session.get(Place, self.place_id)
+        self.assertEqual((place.review_count, place.rating_sum), (1, 5))
+
+    def test_concurrent_duplicate_is_rejected(self):
+        """Test a review written by another request in between yields ConflictError"""
+        db.session.add(Review(**self._data(rating=2)))
+        db.session.commit()
+        with self.assertRaises(ConflictError):
+            facade.create_review(self._data())
+        self.assertEqual(Review.query.count(), 1)
+
+    def test_own_or_unknown_place(self):
+        """Test reviewing one's own place answers 400 and an unknown place 404"""
+        own = self._post("owner@example.com", {'text': "Mine", 'rating': 5,
+                                                'place_id': self.place_id})
+        self.assertEqual(own.status_code, 400)
+        unknown = self._post("guest@example.com", {'text': "Where", 'rating': 5,
+                                                    'place_id': "missing"})
+        self.assertEqual(unknown.status_code, 404)
+        self.assertEqual(Review.query.count(), 0)
+
+    def test_model_declares_the_constraint(self):
+        """Test the unique index rejects a duplicate added through the ORM"""
+        db.session.add_all([Review(**self._data()), Review(**self._data(rating=3))])
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_duplicates_left_by_an_old_database(self):
+        """Test duplicates keeping the index out are logged and checked for on create"""
+        db.session.execute(db.text("DROP INDEX uq_reviews_user_id_place_id"))
+        db.session.add_all([Review(**self._data()), Review(**self._data(rating=3))])
+        db.session.commit()
+        try:
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                upgrade_schema()
+            self.assertIn("uq_reviews_user_id_place_id not created", logs.output[0])
+            self.assertIn('uq_reviews_user_id_place_id', missing_unique_indexes)
+            with self.assertRaises(ConflictError):
+                facade.create_review(self._data(rating=1))
+            self.assertEqual(Review.query.count(), 2)
+        finally:
+            missing_unique_indexes.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Tests for routing repository reads to read replicas"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import object_session
+from app import create_app, db
+from app.persistence.routing import read_router
+from app.services.facade import facade
+from config import TestingConfig
+
+
+class TestReadRouting(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+
+        class RoutingConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{cls.path}'
+            # The primary file itself, through query-only connections
+            SQLALCHEMY_READ_REPLICAS = [f'sqlite:///{cls.path}']
+
+        cls.app = create_app(RoutingConfig)
+
+    @classmethod
+    def tearDownClass(cls):
+        read_router.init_app(create_app('config.TestingConfig'))
+        os.remove(cls.path)
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = facade.create_user({'first_name': 'Ada', 'last_name': 'Lovelace',
+                                        'email': 'ada@example.com', 'password': 'secret'})
+        self.user_id = self.user.id
+
+    def tearDown(self):
+        read_router.remove()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_get_request_reads_from_replica(self):
+        with self.app.test_request_context('/', method='GET'):
+            user = facade.get_user(self.user_id)
+            session = object_session(user)
+            self.assertIsNot(session, db.session())
+            self.assertIn(session.bind, read_router.engines)
+            self.assertEqual(facade.get_user_by_email('ada@example.com').id, self.user_id)
+
+    def test_write_request_reads_primary(self):
+        with self.app.test_request_context('/', method='PUT'):
+            user = facade.get_user(self.user_id)
+            self.assertIs(object_session(user), db.session())
+
+    def test_request_reads_its_own_writes(self):
+        with self.app.test_request_context('/', method='GET'):
+            amenity = facade.create_amenity({'name': 'Sauna'})
+            found = facade.get_amenity_by_name('Sauna')
+            self.assertIs(found, amenity)
+            self.assertIs(object_session(found), db.session())
+
+    def test_outside_request_reads_primary(self):
+        self.assertIs(object_session(facade.get_user(self.user_id)), db.session())
+
+    def test_replica_is_read_only(self):
+        with self.app.test_request_context('/', method='GET'):
+            with self.assertRaises(OperationalError):
+                read_router.read_session().execute(text('DELETE FROM users'))
+
+    def test_list_endpoint_served_from_replica(self):
+        amenity_id = facade.create_amenity({'name': 'Wifi'}).id
+        client = self.app.test_client()
+        response = client.get('/api/v1/amenities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([amenity['id'] for amenity in response.get_json()['items']], [amenity_id])
+        response = client.get(f'/api/v1/amenities/{amenity_id}')
+        self.assertEqual(response.get_json()['name'], 'Wifi')
+
+
+if __name__ == '__main__':
+    unittest.main()
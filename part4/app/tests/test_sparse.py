@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Tests for the fields and include parameters of the place detail and reviews"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.review import Review
+from app.models.user import User
+from app.services.facade import facade
+
+
+class TestSparseFieldsets(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="One", email="owner@example.com")
+        guest = User(first_name="Guest", last_name="Two", email="guest@example.com")
+        for user in (owner, guest):
+            user.password = "not-a-hash"
+        db.session.add_all([owner, guest])
+        db.session.commit()
+        wifi = facade.create_amenity({'name': "Wifi"})
+        self.place_id = facade.create_place({
+            'title': "Loft", 'description': "Bright", 'price': 80, 'latitude': 0,
+            'longitude': 0, 'owner_id': owner.id, 'amenities': [wifi.id]
+        }).id
+        db.session.add(Review(text="Nice", rating=4, user_id=guest.id, place_id=self.place_id))
+        db.session.commit()
+        db.session.remove()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _get(self, url):
+        self.statements = []
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()
+
+    def test_detail_without_embeds_is_one_query(self):
+        """Test fields without include reads only those columns, with no join or load"""
+        data = self._get(f'/api/v1/places/{self.place_id}?fields=title,price&include=')
+        self.assertEqual(data, {'id': self.place_id, 'title': "Loft", 'price': 80.0})
+        # The single-row ETag validator and the place itself
+        self.assertEqual(len(self.statements), 2)
+        self.assertNotIn('description', self.statements[1])
+        self.assertNotIn('JOIN', self.statements[1])
+
+    def test_detail_embeds_only_what_is_included(self):
+        """Test include=owner embeds the owner and loads neither amenities nor reviews"""
+        data = self._get(f'/api/v1/places/{self.place_id}?fields=average_rating&include=owner')
+        self.assertEqual(set(data), {'id', 'average_rating', 'owner'})
+        self.assertEqual(data['owner']['first_name'], "Owner")
+        self.assertEqual(data['average_rating'], 4.0)
+        self.assertEqual(len(self.statements), 2)
+        self.assertFalse(any('reviews' in statement or 'place_amenity' in statement
+                             for statement in self.statements))
+
+    def test_detail_defaults_to_everything(self):
+        """Test the detail without parameters keeps every field and embed"""
+        data = self._get(f'/api/v1/places/{self.place_id}')
+        self.assertEqual(data['description'], "Bright")
+        self.assertEqual(len(data['reviews']), 1)
+        self.assertEqual(data['amenities'][0]['name'], "Wifi")
+        self.assertEqual(data['rating_histogram']['4'], 1)
+
+    def test_unknown_names_are_rejected(self):
+        """Test unknown fields or embeds answer 400"""
+        for url in (f'/api/v1/places/{self.place_id}?fields=title,password',
+                    f'/api/v1/places/{self.place_id}?include=bookings',
+                    '/api/v1/reviews/?include=place'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('error', response.get_json())
+
+    def test_review_fields_and_author(self):
+        """Test the review list projects the fields and joins the author in one query"""
+        data = self._get('/api/v1/reviews/?fields=rating,created_at&include=author')
+        item, = data['items']
+        self.assertEqual(set(item), {'id', 'rating', 'created_at', 'author'})
+        self.assertEqual(item['author'], {'first_name': "Guest", 'last_name': "Two"})
+        page = self.statements[-1]
+        self.assertNotIn('reviews.text', page)
+        self.assertIn('JOIN users', page)
+
+    def test_review_list_tag_follows_authors_when_embedded(self):
+        """Test renaming an author changes the tag of a list embedding authors only"""
+        with_author = self.client.get('/api/v1/reviews/?include=author').headers['ETag']
+        without = self.client.get('/api/v1/reviews/').headers['ETag']
+        guest = facade.get_user_by_email("guest@example.com")
+        facade.update_user(guest.id, {'first_name': "Gina"})
+        db.session.remove()
+        self.assertNotEqual(self.client.get('/api/v1/reviews/?include=author').headers['ETag'],
+                            with_author)
+        self.assertEqual(self.client.get('/api/v1/reviews/').headers['ETag'], without)
+
+
+if __name__ == '__main__':
+    unittest.main()
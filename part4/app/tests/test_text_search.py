@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Tests for the full-text search of places"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app import create_app, db
+from app.models.user import User
+from app.persistence.text_search import match_expression
+from app.services.facade import facade
+
+PLACES = {
+    'Seaside castle': "A castle on the cliffs, with a view over the sea",
+    'Quiet cottage': "Stone cottage next to an old castle",
+    'City loft': "Bright loft near the <b>station</b>",
+    'Château des Îles': "Vieux château au bord de l'eau",
+}
+
+
+class TestTextSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="One", email="owner@example.com")
+        owner.password = "not-a-hash"
+        db.session.add(owner)
+        db.session.commit()
+        self.places = {title: facade.create_place({
+            'title': title, 'description': description, 'price': 100,
+            'latitude': 0, 'longitude': 0, 'owner_id': owner.id
+        }).id for title, description in PLACES.items()}
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _search(self, query):
+        response = self.client.get(f'/api/v1/places/search?{query}')
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()
+
+    def _titles(self, query):
+        return [item['title'] for item in self._search(query)['items']]
+
+    def test_title_matches_rank_first(self):
+        """Test a word in the title outranks the same word in the description"""
+        self.assertEqual(self._titles('q=castle'), ['Seaside castle', 'Quiet cottage'])
+
+    def test_all_words_must_match(self):
+        """Test every word of the query is required"""
+        self.assertEqual(self._titles('q=castle+sea'), ['Seaside castle'])
+        self.assertEqual(self._titles('q=castle+station'), [])
+
+    def test_prefix_and_diacritics(self):
+        """Test prefix queries and accent-insensitive matching"""
+        self.assertEqual(self._titles('q=cott*'), ['Quiet cottage'])
+        self.assertEqual(self._titles('q=chateau'), ['Château des Îles'])
+
+    def test_highlight_and_snippet_are_escaped(self):
+        """Test matches are marked and the stored text is HTML-escaped"""
+        item = self._search('q=station')['items'][0]
+        self.assertEqual(item['title_html'], 'City loft')
+        self.assertIn('&lt;b&gt;<mark>station</mark>&lt;/b&gt;', item['snippet'])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the triggers keep the index in sync with places"""
+        facade.update_place(self.places['City loft'], {'title': "Harbour loft"})
+        self.assertEqual(self._titles('q=harbour'), ['Harbour loft'])
+        self.assertEqual(self._titles('q=city'), [])
+        facade.delete_place(self.places['Seaside castle'])
+        self.assertEqual(self._titles('q=castle'), ['Quiet cottage'])
+
+    def test_paginates_by_rank(self):
+        """Test the cursor continues after the last rank of the page"""
+        first = self._search('q=castle&limit=1')
+        second = self._search(f"q=castle&limit=1&cursor={first['next_cursor']}")
+        self.assertEqual([first['items'][0]['title'], second['items'][0]['title']],
+                         ['Seaside castle', 'Quiet cottage'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_operators_are_taken_literally(self):
+        """Test FTS5 syntax in the query cannot break the statement"""
+        self.assertEqual(match_expression('castle OR "sea'), '"castle" "OR" "sea"')
+        self.assertEqual(self._titles('q=castle+NOT+sea'), [])
+        self.assertEqual(self.client.get('/api/v1/places/search?q=%22*').status_code, 400)
+
+    def test_search_places_by_title(self):
+        """Test the repository title search uses the index and ignores descriptions"""
+        titles = [place.title for place in facade.place_repo.search_places_by_title('castle')]
+        self.assertEqual(titles, ['Seaside castle'])
+
+    def test_search_uses_the_index(self):
+        """Test SQLite answers MATCH from the FTS5 index"""
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT places.id FROM places_fts JOIN places "
+            "ON places.rowid = places_fts.rowid WHERE places_fts MATCH 'castle'")).all()
+        self.assertIn('VIRTUAL TABLE INDEX', ' '.join(row[-1] for row in plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Tests for the request-scoped unit of work"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.persistence.unit_of_work import unit_of_work
+from app.services.facade import facade
+
+
+class TestUnitOfWork(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('config.TestingConfig')
+        cls.client = cls.app.test_client()
+
+        @cls.app.route('/_uow_failing', methods=['POST'])
+        def failing():
+            facade.create_amenity({'name': "Sauna"})
+            return {'error': 'rejected'}, 400
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.admin = facade.create_user({'first_name': "Admin", 'last_name': "Root",
+                                         'email': "admin@example.com", 'password': "secret",
+                                         'is_admin': True})
+        response = self.client.post('/api/v1/auth/login',
+                                    json={'email': "admin@example.com", 'password': "secret"})
+        self.headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+        self.commits = 0
+        event.listen(db.engine, 'commit', self._on_commit)
+
+    def tearDown(self):
+        event.remove(db.engine, 'commit', self._on_commit)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def test_user_creation_commits_once(self):
+        """Test POST /users/ writes the user and its password in one commit"""
+        response = self.client.post('/api/v1/users/', headers=self.headers, json={
+            'first_name': "John", 'last_name': "Doe",
+            'email': "john@example.com", 'password': "secret"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.commits, 1)
+        user = User.query.filter_by(email="john@example.com").one()
+        self.assertTrue(user.verify_password("secret"))
+
+    def test_error_response_rolls_back(self):
+        """Test writes flushed by a request answering 4xx are discarded"""
+        self.assertEqual(self.client.post('/_uow_failing').status_code, 400)
+        db.session.remove()
+        self.assertIsNone(facade.get_amenity_by_name("Sauna"))
+        self.assertEqual(self.commits, 0)
+
+    def test_update_place_commits_once(self):
+        """Test a place update swapping amenities is a single transaction"""
+        wifi = facade.create_amenity({'name': "Wifi"})
+        place = facade.create_place({'title': "Loft", 'description': "", 'price': 50,
+                                     'latitude': 0, 'longitude': 0, 'owner_id': self.admin.id})
+        place_id = place.id
+        self.commits = 0
+        facade.update_place(place_id, {'title': "Big loft", 'amenities': [wifi.id]})
+        self.assertEqual(self.commits, 1)
+        db.session.remove()
+        place = Place.query.get(place_id)
+        self.assertEqual(place.title, "Big loft")
+        self.assertEqual([a.name for a in place.amenities], ["Wifi"])
+
+    def test_exception_rolls_back(self):
+        """Test an exception inside a unit of work discards all of its writes"""
+        with self.assertRaises(RuntimeError):
+            with unit_of_work():
+                facade.create_amenity({'name': "Pool"})
+                raise RuntimeError("boom")
+        self.assertIsNone(facade.get_amenity_by_name("Pool"))
+
+
+if __name__ == '__main__':
+    unittest.main()
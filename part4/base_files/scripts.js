@@ -113,19 +113,49 @@ document.addEventListener('DOMContentLoaded', () => {
     setupReviewForm();
 });
 
+let priceFilterTimer = null;
+
 function filterPlacesByMaxPrice(maxPrice) {
-    const placeCards = document.querySelectorAll('.place-card');
-    
-    placeCards.forEach(card => {
-        const priceText = card.querySelector('.place-price').textContent;
-        const price = parseInt(priceText.match(/\d+/)) || 0;
-        
-        if (price <= parseInt(maxPrice)) {
-            card.style.display = 'flex';
-        } else {
-            card.style.display = 'none';
+    // The API filters on price, wait for the slider to settle before asking
+    clearTimeout(priceFilterTimer);
+    priceFilterTimer = setTimeout(async () => {
+        const places = await fetchPlaces({ max_price: maxPrice });
+        displayPlaces(places);
+    }, 250);
+}
+
+/**
+ * GET a JSON resource, revalidating the last copy instead of downloading it again.
+ * The ETag and body of the last 200 are kept in sessionStorage and sent back as
+ * If-None-Match; on 304 the kept body is reused. Resolves to { ok, status, data }.
+ */
+async function fetchWithETag(url, options = {}) {
+    const key = `etag:${url}`;
+    let cached = null;
+    try {
+        cached = JSON.parse(sessionStorage.getItem(key));
+    } catch (error) {
+        cached = null;
+    }
+
+    const headers = { ...(options.headers || {}) };
+    if (cached) headers['If-None-Match'] = cached.etag;
+    // The validator is handled here, keep the browser cache out of the way
+    const response = await fetch(url, { ...options, method: 'GET', headers, cache: 'no-store' });
+
+    if (response.status === 304 && cached) {
+        return { ok: true, status: 200, data: cached.data };
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        try {
+            sessionStorage.setItem(key, JSON.stringify({ etag, data }));
+        } catch (error) {
+            // Storage full: the next request simply downloads the body again
         }
-    });
+    }
+    return { ok: response.ok, status: response.status, data };
 }
 
 function getCookie(name) {
@@ -160,23 +190,40 @@ async function checkAuth() {
     }
 }
 
-async function fetchPlaces() {
-    /* GET PLACES */
+async function fetchPlaces(filters = {}) {
+    /* GET PLACES, filters are min_price, max_price, amenities and min_rating */
     try {
         const token = getCookie('token');
-        const response = await fetch('http://localhost:5000/api/v1/places/', {
-            method: 'GET',
-            headers: {
-                'Authorization': `Bearer ${token}`,
-                'Content-Type': 'application/json'
+        const places = [];
+        let cursor = null;
+
+        // The API returns places page by page, follow next_cursor until the end
+        do {
+            const url = new URL('http://localhost:5000/api/v1/places/');
+            url.searchParams.set('limit', '100');
+            for (const [name, value] of Object.entries(filters)) {
+                if (value !== undefined && value !== null && value !== '') {
+                    url.searchParams.set(name, Array.isArray(value) ? value.join(',') : value);
+                }
             }
-        });
-        
-        if (!response.ok) {
-            throw new Error('Failed to fetch places');
-        }
-        
-        const places = await response.json();
+            if (cursor) url.searchParams.set('cursor', cursor);
+
+            const response = await fetchWithETag(url.toString(), {
+                headers: {
+                    'Authorization': `Bearer ${token}`,
+                    'Content-Type': 'application/json'
+                }
+            });
+
+            if (!response.ok) {
+                throw new Error('Failed to fetch places');
+            }
+
+            const page = response.data;
+            places.push(...page.items);
+            cursor = page.next_cursor;
+        } while (cursor);
+
         return places;
         
     } catch (error) {
@@ -292,11 +339,11 @@ async function loadPlaceDetails(placeId) {
     console.log("🔄 DEBUT loadPlaceDetails, placeId:", placeId);
     
     try {
-        const response = await fetch(`http://localhost:5000/api/v1/places/${placeId}`);
+        const response = await fetchWithETag(`http://localhost:5000/api/v1/places/${placeId}`);
         
         if (!response.ok) throw new Error('API error');
         
-        const place = await response.json();
+        const place = response.data;
         console.log("✅ DONNÉES COMPLÈTES reçues:", place); // ⬅️ LOG COMPLET
         console.log("🔍 Amenities dans la réponse:", place.amenities); // ⬅️ SPECIFIQUE
         
@@ -312,8 +359,7 @@ async function fetchPlaceDetails(placeId) {
     try {
         const token = getCookie('token');
         
-        const response = await fetch(`http://localhost:5000/api/v1/places/${placeId}`, {
-            method: 'GET',
+        const response = await fetchWithETag(`http://localhost:5000/api/v1/places/${placeId}`, {
             headers: {
                 'Authorization': `Bearer ${token}`,
                 'Content-Type': 'application/json'
@@ -324,7 +370,7 @@ async function fetchPlaceDetails(placeId) {
             throw new Error('Failed to fetch place details');
         }
         
-        const place = await response.json();
+        const place = response.data;
         return place;
         
     } catch (error) {
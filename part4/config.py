@@ -10,12 +10,51 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Read-only engines for reads of GET requests, see app.persistence.routing.
+    # e.g. SQLALCHEMY_READ_REPLICAS=sqlite:///hbnb_dev.db reads the primary
+    # file through separate query-only connections
+    SQLALCHEMY_READ_REPLICAS = [uri for uri in os.getenv('SQLALCHEMY_READ_REPLICAS', '').split(',') if uri]
+
+    # Commit each write request once at its end, see app.persistence.unit_of_work
+    UNIT_OF_WORK_ENABLED = True
+
+    # Read-through cache of user/place/review/amenity rows, see app.persistence.cache
+    ENTITY_CACHE_ENABLED = os.getenv('ENTITY_CACHE_ENABLED', 'false').lower() == 'true'
+    ENTITY_CACHE_SIZE = int(os.getenv('ENTITY_CACHE_SIZE', 10000))
+    ENTITY_CACHE_TTL = int(os.getenv('ENTITY_CACHE_TTL', 60))
+
+    # Cache of hot GET responses, see app.persistence.response_cache: unset
+    # (off), 'memory' (per process) or 'sqlite' (one file shared by the workers)
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND') or None
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', 'response_cache.db')
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+
+    # Write-behind review submissions, see app.services.review_queue: POST
+    # /reviews/ journals the review and answers 202, a writer thread of each
+    # process (unless REVIEW_QUEUE_WRITER is false) writes them in batches
+    REVIEW_QUEUE_ENABLED = os.getenv('REVIEW_QUEUE_ENABLED', 'false').lower() == 'true'
+    REVIEW_QUEUE_WRITER = os.getenv('REVIEW_QUEUE_WRITER', 'true').lower() == 'true'
+    REVIEW_QUEUE_PATH = os.getenv('REVIEW_QUEUE_PATH', 'review_queue.db')
+    REVIEW_QUEUE_BATCH_SIZE = int(os.getenv('REVIEW_QUEUE_BATCH_SIZE', 200))
+    REVIEW_QUEUE_INTERVAL = float(os.getenv('REVIEW_QUEUE_INTERVAL', 0.5))
+
+    # Prior of the Bayesian average ranking the top places, see
+    # app.persistence.leaderboard; run `flask rebuild-leaderboard` after a change
+    LEADERBOARD_PRIOR_MEAN = float(os.getenv('LEADERBOARD_PRIOR_MEAN', 3.0))
+    LEADERBOARD_PRIOR_WEIGHT = int(os.getenv('LEADERBOARD_PRIOR_WEIGHT', 5))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///hbnb_dev.db'
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
 
@@ -24,5 +63,6 @@ class ProductionConfig(Config):
 
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
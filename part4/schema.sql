@@ -22,6 +22,13 @@ CREATE TABLE IF NOT EXISTS places (
     latitude FLOAT NOT NULL,
     longitude FLOAT NOT NULL,
     owner_id CHAR(36) NOT NULL,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
@@ -59,9 +66,73 @@ CREATE TABLE IF NOT EXISTS place_amenity (
     FOREIGN KEY (amenity_id) REFERENCES amenities(id) ON DELETE CASCADE
 );
 
+-- Per-table version counters, the ETag validators of list endpoints
+-- (see app/persistence/versions.py)
+CREATE TABLE IF NOT EXISTS table_versions (
+    name VARCHAR(64) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Top rated places by Bayesian average, overall (scope '') and per amenity,
+-- rewritten with the rating aggregates (see app/persistence/leaderboard.py)
+CREATE TABLE IF NOT EXISTS leaderboard (
+    scope VARCHAR(36) NOT NULL,
+    place_id VARCHAR(36) NOT NULL,
+    score FLOAT NOT NULL,
+    review_count INTEGER NOT NULL,
+    PRIMARY KEY (scope, place_id)
+);
+
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_places_owner_id ON places(owner_id);
 CREATE INDEX IF NOT EXISTS idx_reviews_user_id ON reviews(user_id);
 CREATE INDEX IF NOT EXISTS idx_reviews_place_id ON reviews(place_id);
 CREATE INDEX IF NOT EXISTS idx_place_amenity_place_id ON place_amenity(place_id);
 CREATE INDEX IF NOT EXISTS idx_place_amenity_amenity_id ON place_amenity(amenity_id);
+
+-- Keyset pagination indexes on (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_places_created_at_id ON places(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_reviews_created_at_id ON reviews(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_amenities_created_at_id ON amenities(created_at, id);
+
+-- Faceted filtering of the place list on price, amenities and rating
+CREATE INDEX IF NOT EXISTS idx_places_price ON places(price);
+CREATE INDEX IF NOT EXISTS idx_place_amenity_amenity_id_place_id ON place_amenity(amenity_id, place_id);
+
+-- Reviews of a place, newest or best rated first; the second also serves
+-- the per-place rating counts
+CREATE INDEX IF NOT EXISTS idx_reviews_place_id_created_at_id ON reviews(place_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_reviews_place_id_rating_id ON reviews(place_id, rating, id);
+
+-- The top k of a scope is read from the first k entries of this index
+CREATE INDEX IF NOT EXISTS idx_leaderboard_scope_score_place_id ON leaderboard(scope, score, place_id);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_place_id ON leaderboard(place_id);
+
+-- R*Tree of place coordinates for bounding-box and radius search, kept in
+-- sync with places by triggers (see app/persistence/geo.py)
+CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon, +place_id);
+CREATE TRIGGER IF NOT EXISTS places_rtree_insert AFTER INSERT ON places BEGIN
+    INSERT INTO places_rtree VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude, new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS places_rtree_update AFTER UPDATE OF latitude, longitude ON places BEGIN
+    UPDATE places_rtree SET min_lat = new.latitude, max_lat = new.latitude,
+        min_lon = new.longitude, max_lon = new.longitude WHERE id = new.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS places_rtree_delete AFTER DELETE ON places BEGIN
+    DELETE FROM places_rtree WHERE id = old.rowid;
+END;
+
+-- External-content FTS5 index of place titles and descriptions, kept in sync
+-- with places by triggers (see app/persistence/text_search.py)
+CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(title, description, content='places', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS places_fts_insert AFTER INSERT ON places BEGIN
+    INSERT INTO places_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS places_fts_update AFTER UPDATE OF title, description ON places BEGIN
+    INSERT INTO places_fts(places_fts, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description);
+    INSERT INTO places_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS places_fts_delete AFTER DELETE ON places BEGIN
+    INSERT INTO places_fts(places_fts, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description);
+END;